@@ -4,11 +4,211 @@
 #
 # The full terms of this copyright and license should always be found in the root directory of this software deliverable as "license.txt" and if these terms are not found with this software, please contact the USC Stevens Center for the full license.
 #
+import json
 import logging
 import os
+from threading import Lock
+import time
+from typing import Dict, List
 
 CHECKPOINT_ROOT_DEFAULT = "/app/checkpoint"
 ARCH_DEFAULT = "lstm_v1"
+MANIFEST_FILE_NAME = "manifest.json"
+STAT_INTERVAL_DEFAULT = 5.0
+# prefixes of directories in a checkpoint that aren't mentors
+# (see mentor_classifier.w2v.STEM_TABLE_DIR, which is also the prefix of its temp dirs while it's saved)
+NON_MENTOR_DIR_PREFIXES = ["w2v_stems", "."]
+
+
+def _artifact_sizes(path: str) -> Dict[str, int]:
+    sizes = {}
+    for parent, _, files in os.walk(path):
+        for f in files:
+            p = os.path.join(parent, f)
+            sizes[os.path.relpath(p, path)] = os.path.getsize(p)
+    return sizes
+
+
+def _mentor_ids(checkpoint_dirs: List[str]) -> List[str]:
+    return [
+        d
+        for d in checkpoint_dirs
+        if not any(d.startswith(p) for p in NON_MENTOR_DIR_PREFIXES)
+    ]
+
+
+def write_manifest(checkpoint_path: str) -> Dict[str, Dict[str, int]]:
+    """
+    Writes manifest.json to a checkpoint with the sizes of every mentor's artifacts,
+    so that a CheckpointIndex can list them without walking the checkpoint
+
+    Args:
+        checkpoint_path: (str) path of the checkpoint
+
+    Returns:
+        mentors: (dict) the sizes of the artifacts by path (relative to the mentor's dir) by mentor id
+    """
+    mentors = {
+        m: _artifact_sizes(os.path.join(checkpoint_path, m))
+        for m in _mentor_ids(
+            sorted(e.name for e in os.scandir(checkpoint_path) if e.is_dir())
+        )
+    }
+    manifest_path = os.path.join(checkpoint_path, MANIFEST_FILE_NAME)
+    tmp_path = f"{manifest_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(dict(mentors=mentors), f, indent=2)
+    os.replace(tmp_path, manifest_path)
+    return mentors
+
+
+class CheckpointIndex(object):
+    """
+    In-process index of the archs, checkpoints and mentors under a checkpoint root.
+
+    Each directory listing is cached and is only revalidated (with a single stat of the directory's mtime)
+    once it's older than stat_interval, so most lookups make no filesystem calls at all.
+    A directory is only listed again when its mtime changes.
+
+    Args:
+        checkpoint_root: (str)
+        stat_interval: (float) seconds a listing is trusted before its mtime is checked again
+        clock: (function) returns the current time in seconds
+    """
+
+    def __init__(
+        self,
+        checkpoint_root: str = CHECKPOINT_ROOT_DEFAULT,
+        stat_interval: float = STAT_INTERVAL_DEFAULT,
+        clock=time.monotonic,
+    ):
+        self.checkpoint_root = checkpoint_root
+        self.stat_interval = stat_interval
+        self.clock = clock
+        self.__lock = Lock()
+        self.__listings = {}  # path => (checked at, mtime, sorted subdir names)
+        self.__mentors = {}  # checkpoint path => (mtime, mentors)
+
+    def get_archs(self) -> List[str]:
+        return self.__list_dirs(self.__all_archs_root()) or []
+
+    def get_checkpoints(self, arch: str = ARCH_DEFAULT) -> List[str]:
+        return self.__list_dirs(self.__arch_root(arch)) or []
+
+    def get_mentors(
+        self, arch: str = ARCH_DEFAULT, checkpoint: str = None
+    ) -> Dict[str, Dict[str, int]]:
+        """
+        Args:
+            arch: (str) id for the architecture
+            checkpoint: (str) id for the checkpoint (defaults to the newest)
+
+        Returns:
+            mentors: (dict) the sizes of the artifacts by path (relative to the mentor's dir) by mentor id,
+                read from the checkpoint's manifest.json if it lists the same mentors, otherwise by walking the checkpoint
+        """
+        cp = self.find_checkpoint(arch, checkpoint)
+        if not cp:
+            return {}
+        dirs = self.__list_dirs(cp) or []
+        with self.__lock:
+            mtime = self.__listings[cp][1]
+            cached = self.__mentors.get(cp)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        mentor_ids = _mentor_ids(dirs)
+        mentors = None
+        try:
+            with open(os.path.join(cp, MANIFEST_FILE_NAME)) as f:
+                mentors = json.load(f)["mentors"]
+            if sorted(mentors) != mentor_ids:
+                mentors = None
+        except (OSError, ValueError, KeyError):
+            pass
+        if mentors is None:
+            mentors = {m: _artifact_sizes(os.path.join(cp, m)) for m in mentor_ids}
+        with self.__lock:
+            self.__mentors[cp] = (mtime, mentors)
+        return mentors
+
+    def find_checkpoint(self, arch: str = ARCH_DEFAULT, checkpoint: str = None) -> str:
+        arch_root = self.__arch_root(arch)
+        all = self.__list_dirs(arch_root)
+        if all is None:
+            logging.warning(f"find_checkpoint with non-existent root {arch_root}")
+            return None
+        if not checkpoint:
+            return os.path.join(arch_root, all[-1]) if len(all) >= 1 else None
+        if checkpoint not in all:
+            # may have been created since the listing was cached
+            all = self.__list_dirs(arch_root, force=True) or []
+        cp = os.path.join(arch_root, checkpoint)
+        if checkpoint not in all:
+            logging.warning(f"find_checkpoint but checkpoint does not exist {cp}")
+            return None
+        return cp
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__listings.clear()
+            self.__mentors.clear()
+
+    def __all_archs_root(self) -> str:
+        root_dirs = self.__list_dirs(self.checkpoint_root) or []
+        return (
+            os.path.join(self.checkpoint_root, "classifiers")
+            if "classifiers" in root_dirs
+            else self.checkpoint_root
+        )
+
+    def __arch_root(self, arch: str) -> str:
+        return os.path.abspath(os.path.join(self.__all_archs_root(), arch))
+
+    def __list_dirs(self, path: str, force: bool = False) -> List[str]:
+        """
+        Returns:
+            dirs: (list) sorted names of the subdirectories of path, or None if path is not a directory
+        """
+        now = self.clock()
+        with self.__lock:
+            cached = self.__listings.get(path)
+        if cached and not force and now - cached[0] < self.stat_interval:
+            return cached[2]
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            dirs = (
+                cached[2]
+                if cached and cached[1] == mtime and not force
+                else sorted(e.name for e in os.scandir(path) if e.is_dir())
+            )
+        except (FileNotFoundError, NotADirectoryError):
+            mtime, dirs = None, None
+        with self.__lock:
+            self.__listings[path] = (now, mtime, dirs)
+        return dirs
+
+
+_index_by_root = {}
+_index_lock = Lock()
+
+
+def find_checkpoint_index(
+    checkpoint_root: str = CHECKPOINT_ROOT_DEFAULT,
+) -> CheckpointIndex:
+    """
+        Finds the CheckpointIndex for a checkpoint root, shared by the whole process.
+
+        Args:
+            checkpoint_root: (str)
+
+        Returns:
+            index: (mentor_classifier.checkpoints.CheckpointIndex)
+    """
+    checkpoint_root = os.path.abspath(checkpoint_root)
+    with _index_lock:
+        if checkpoint_root not in _index_by_root:
+            _index_by_root[checkpoint_root] = CheckpointIndex(checkpoint_root)
+        return _index_by_root[checkpoint_root]
 
 
 def find_checkpoint(
@@ -16,26 +216,4 @@ def find_checkpoint(
     arch: str = ARCH_DEFAULT,
     checkpoint: str = None,
 ) -> str:
-    all_archs_root = (
-        os.path.join(checkpoint_root, "classifiers")
-        if os.path.isdir(os.path.join(checkpoint_root, "classifiers"))
-        else checkpoint_root
-    )
-    arch_root = os.path.abspath(os.path.join(all_archs_root, arch))
-    if not os.path.isdir(arch_root):
-        logging.warning(f"find_checkpoint with non-existent root {arch_root}")
-        return None
-    if not checkpoint:
-        all = sorted(
-            [
-                c
-                for c in os.listdir(arch_root)
-                if os.path.isdir(os.path.join(arch_root, c))
-            ]
-        )
-        return os.path.join(arch_root, all[-1]) if len(all) >= 1 else None
-    cp = os.path.join(arch_root, checkpoint)
-    if not os.path.isdir(cp):
-        logging.warning(f"find_checkpoint but checkpoint does not exist {cp}")
-        return None
-    return cp
+    return find_checkpoint_index(checkpoint_root).find_checkpoint(arch, checkpoint)
@@ -41,6 +41,48 @@ class Classifier(ABC):
         """
         return "none", "none", 0.0
 
+    def get_answers(
+        self, questions: List[str], canned_question_match_disabled: bool = False
+    ) -> List[Tuple[str, str, float]]:
+        """
+        Match a list of questions to answers in one batch.
+        Gives the same results as calling get_answer for each question, but faster.
+
+        Args:
+            questions: (list of str) the question texts
+            canned_question_match_disabled: (bool) if true, don't use exact match answers for known questions
+
+        Returns:
+            answers: (list of tuples) an (answer_id, answer_text, confidence) for each question (see get_answer)
+        """
+        return [self.get_answer(q, canned_question_match_disabled) for q in questions]
+
+    def get_answer_candidates(
+        self, question: str, k: int = 1, canned_question_match_disabled: bool = False
+    ) -> List[Tuple[str, str, float]]:
+        """
+        Get the k best answers for a question.
+        Classifiers that can't rank alternate answers return only the answer from get_answer.
+
+        Args:
+            question: (str) the question text
+            k: (int) max number of answers to return
+            canned_question_match_disabled: (bool) if true, don't use exact match answers for known questions
+
+        Returns:
+            candidates: (list of tuples) (answer_id, answer_text, score), best first.
+                A canned (exact match) answer is returned alone with score 1.0
+        """
+        return [self.get_answer(question, canned_question_match_disabled)]
+
+    def estimate_memory_bytes(self) -> int:
+        """
+        Returns:
+            bytes: (int) rough estimate of the memory held by this classifier
+                (not counting resources shared with other classifiers), or 0 if unknown
+        """
+        return 0
+
     @abstractmethod
     def get_classifier_id(self) -> str:
         return "classifier_id_unknown"
@@ -54,7 +96,10 @@ class CheckpointClassifierFactory(ABC):
 
     @abstractmethod
     def create(
-        self, checkpoint: str = None, mentors: Union[str, Mentor, List[str]] = None
+        self,
+        checkpoint: str = None,
+        mentors: Union[str, Mentor, List[str]] = None,
+        **kwargs,
     ) -> Classifier:
         """
         Creates a mentor_classifier.classifiers.Classifier given a checkpoint and mentor[s]
@@ -62,6 +107,7 @@ class CheckpointClassifierFactory(ABC):
         Args:
             checkpoint: id for the checkpoint. Defaults to newest found (alpha by name)
             mentors: mentor[s] used in classifier. Defaults to all found
+            kwargs: options for the arch's classifier (e.g. topic_model_backend for lstm_v1)
 
         Returns:
             classifier: (mentor_classifier.classifiers.Classifier)
@@ -84,17 +130,20 @@ class ClassifierFactory:
         self.checkpoint_classifier_factory = checkpoint_classifier_factory
         self.checkpoint = checkpoint
 
-    def create(self, mentors: Union[str, Mentor, List[str]]) -> Classifier:
+    def create(self, mentors: Union[str, Mentor, List[str]], **kwargs) -> Classifier:
         """
         Creates a mentor_classifier.classifiers.Classifier given mentor[s]
 
         Args:
             mentors: mentor[s] used in classifier. Defaults to all found
+            kwargs: options for the arch's classifier (e.g. topic_model_backend for lstm_v1)
 
         Returns:
             classifier: (mentor_classifier.classifiers.Classifier)
         """
-        return self.checkpoint_classifier_factory.create(self.checkpoint, mentors)
+        return self.checkpoint_classifier_factory.create(
+            self.checkpoint, mentors, **kwargs
+        )
 
 
 _factories_by_arch = {}
@@ -109,6 +158,7 @@ def create_classifier(
     arch: str = ARCH_DEFAULT,
     checkpoint: str = None,
     mentors: Union[str, List[str]] = None,
+    **kwargs,
 ):
     """
         Creates a mentor_classifier.classifiers.Classifier given a checkpoint and mentor[s].
@@ -118,12 +168,13 @@ def create_classifier(
             arch: (str) id for the architecture. If not passed expect to find just one registered
             checkpoint: (str) id for the checkpoint. If not passed looks for newest (alphabetical by name)
             mentors: (str|mentor_classifier.mentor.Mentor|list of mentors/mentor ids) mentor[s] used in classifier
+            kwargs: options for the arch's classifier (e.g. topic_model_backend for lstm_v1)
         Returns:
             classifier: (mentor_classifier.classifiers.Classifier)
     """
     return create_classifier_factory(
         checkpoint_root=checkpoint_root, arch=arch, checkpoint=checkpoint
-    ).create(mentors)
+    ).create(mentors, **kwargs)
 
 
 def register_classifier_factory(arch: str, fac: CheckpointClassifierFactory) -> None:
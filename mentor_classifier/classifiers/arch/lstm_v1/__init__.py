@@ -5,11 +5,11 @@
 # The full terms of this copyright and license should always be found in the root directory of this software deliverable as "license.txt" and if these terms are not found with this software, please contact the USC Stevens Center for the full license.
 #
 import os
-import numpy as np
+import sys
+import time
+from threading import Lock
 
-from tensorflow.keras.models import load_model
-from sklearn.externals import joblib
-from tensorflow.keras.preprocessing.sequence import pad_sequences
+import numpy as np
 
 from mentor_classifier.classifiers import (
     CheckpointClassifierFactory,
@@ -18,11 +18,29 @@ from mentor_classifier.classifiers import (
 )
 from mentor_classifier.mentor import Mentor
 from mentor_classifier.nltk_preprocessor import NLTKPreprocessor
-from mentor_classifier.w2v import W2V
+from .numpy_topic_model import NumpyTopicModel
+from mentor_classifier.w2v import find_stem_table, find_w2v, stem_table_path
 from mentor_classifier.utils import sanitize_string
 
 # store the ARCH because we use it several places
 ARCH = "lstm_v1"
+TOPIC_MODEL_BACKENDS = ["keras", "numpy"]
+TOPIC_MODEL_BACKEND_DEFAULT = "keras"
+
+# answers with a lower confidence are replaced with _OFF_TOPIC_
+OFF_TOPIC_THRESHOLD = -0.88
+
+
+def pad_lstm_vectors(lstm_vectors, maxlen=25):
+    """
+    Same as keras pad_sequences for word vectors with padding and truncating 'post'
+    """
+    padded = np.zeros((len(lstm_vectors), maxlen, 300), dtype="float32")
+    for i, lstm_vector in enumerate(lstm_vectors):
+        lstm_vector = lstm_vector[:maxlen]
+        if len(lstm_vector) > 0:
+            padded[i, : len(lstm_vector)] = lstm_vector
+    return padded
 
 
 # NOTE: classifiers MUST extend abstract base class `mentor_classifier.classifiers.Classifier`
@@ -35,6 +53,23 @@ class LSTMClassifier(Classifier):
             A mentor instance or the id for a mentor to load
         data_path: (str)
             path to the root of model data for this classifier
+        topic_model_backend: (str)
+            'keras' or 'numpy' (runs the topic model without tensorflow).
+            Defaults to env var TOPIC_MODEL_BACKEND or 'keras'
+        fuzzy_match_threshold: (float)
+            if set, a question whose character trigrams are at least this similar (0-1, Jaccard)
+            to a canned question gets the canned answer without running the model
+            (see mentor_classifier.fuzzy_index). Defaults to exact matches only
+        observer: (mentor_classifier.instrumentation.InferenceObserver)
+            if set, receives the duration of each inference stage
+            (sanitize, preprocess, w2v, pad, topic_model and ridge)
+            and counts of questions, canned_hits, fuzzy_hits, off_topic, tokens and oov_tokens.
+            Without one, no timing is done at all
+        w2v_precision: (str)
+            'float32', 'float16' or 'int8' word vectors (see mentor_classifier.w2v.W2V).
+            Defaults to env var W2V_PRECISION or the precision of the checkpoint's stem table
+        w2v_root: (str) directory containing the word2vec binary, if the checkpoint has no stem table.
+            Defaults to env W2V_ROOT or checkpoint/vector_models
     """
 
     @staticmethod
@@ -42,7 +77,16 @@ class LSTMClassifier(Classifier):
         global ARCH
         return ARCH
 
-    def __init__(self, mentor, data_path):
+    def __init__(
+        self,
+        mentor,
+        data_path,
+        topic_model_backend=None,
+        fuzzy_match_threshold=None,
+        observer=None,
+        w2v_precision=None,
+        w2v_root=None,
+    ):
         if isinstance(mentor, str):
             print("loading mentor id {}...".format(mentor))
             mentor = Mentor(mentor)
@@ -54,35 +98,74 @@ class LSTMClassifier(Classifier):
         self.mentor = mentor
         self.__model_path = os.path.join(data_path, mentor.get_id())
         self.name = ARCH
+        self.topic_model_backend = (
+            topic_model_backend
+            or os.getenv("TOPIC_MODEL_BACKEND")
+            or TOPIC_MODEL_BACKEND_DEFAULT
+        )
+        assert (
+            self.topic_model_backend in TOPIC_MODEL_BACKENDS
+        ), f"invalid topic_model_backend {self.topic_model_backend} (expected one of {TOPIC_MODEL_BACKENDS})"
+        self.fuzzy_match_threshold = fuzzy_match_threshold
+        self.observer = observer
+        self.w2v_precision = w2v_precision
+        self.w2v_root = w2v_root
+        self.__match_stats = dict(questions=0, canned_hits=0, fuzzy_hits=0)
+        self.__match_stats_lock = Lock()
+        self.preprocessor = NLTKPreprocessor()
         self.logistic_model, self.topic_model, self.w2v_model = self.__load_model(
             self.get_model_path()
         )
 
     def get_answer(self, question, canned_question_match_disabled=False):
-        if not canned_question_match_disabled:
-            sanitized_question = sanitize_string(question)
-            if sanitized_question in self.mentor.question_ids:
-                answer_id = self.mentor.question_ids[sanitized_question]
-                answer_question = self.mentor.ids_answers[answer_id]
-                return answer_id, answer_question, 1.0
-        preprocessor = NLTKPreprocessor()
-        processed_question = preprocessor.transform(question)
-        w2v_vector, lstm_vector = self.w2v_model.w2v_for_question(processed_question)
-        padded_vector = pad_sequences(
-            [lstm_vector],
-            maxlen=25,
-            dtype="float32",
-            padding="post",
-            truncating="post",
-            value=0.0,
-        )
-        topic_vector = self.__get_topic_vector(padded_vector)
-        predicted_answer = self.__get_prediction(w2v_vector, topic_vector)
-        return predicted_answer
+        return self.get_answers([question], canned_question_match_disabled)[0]
+
+    def get_answers(self, questions, canned_question_match_disabled=False):
+        return [
+            self.__to_answer(candidates[0])
+            for candidates in self.__get_candidates(
+                questions, 1, canned_question_match_disabled, answer_confidence=True
+            )
+        ]
+
+    def get_answer_candidates(
+        self, question, k=1, canned_question_match_disabled=False
+    ):
+        return self.__get_candidates([question], k, canned_question_match_disabled)[0]
 
     def get_arch(self):
         return self.name
 
+    def set_observer(self, observer):
+        self.observer = observer
+
+    def get_match_stats(self):
+        """
+        Returns:
+            stats: (dict) counts of questions, canned_hits (exact), fuzzy_hits and model questions,
+                and model_avoided, the fraction of questions answered without running the model
+        """
+        with self.__match_stats_lock:
+            stats = dict(self.__match_stats)
+        stats["model"] = stats["questions"] - stats["canned_hits"] - stats["fuzzy_hits"]
+        stats["model_avoided"] = (
+            1 - stats["model"] / stats["questions"] if stats["questions"] else 0.0
+        )
+        return stats
+
+    def estimate_memory_bytes(self):
+        # the w2v model is shared by all classifiers so isn't counted
+        n_bytes = self.mentor.estimate_memory_bytes()
+        if isinstance(self.topic_model, NumpyTopicModel):
+            n_bytes += self.topic_model.nbytes
+        elif self.topic_model is not None:
+            # keras holds float32 weights plus roughly as much again in graph/optimizer state
+            n_bytes += 2 * 4 * self.topic_model.count_params()
+        if self.logistic_model is not None:
+            n_bytes += self.logistic_model.coef_.nbytes
+            n_bytes += sum(sys.getsizeof(c) for c in self.logistic_model.classes_)
+        return n_bytes
+
     def get_classifier_id(self):
         return self.get_model_path()
 
@@ -90,6 +173,8 @@ class LSTMClassifier(Classifier):
         return self.__model_path
 
     def __load_model(self, model_path):
+        from sklearn.externals import joblib
+
         logistic_model = None
         topic_model = None
         word2vec = None
@@ -98,7 +183,7 @@ class LSTMClassifier(Classifier):
             print("Local checkpoint {0} does not exist.".format(model_path))
         try:
             path = os.path.join(model_path, "lstm_topic_model.h5")
-            topic_model = load_model(path)
+            topic_model = self.__load_topic_model(path)
         except BaseException:
             print(
                 "Unable to load topic model from {0}. Classifier needs to be retrained before asking questions.".format(
@@ -114,14 +199,24 @@ class LSTMClassifier(Classifier):
                     path
                 )
             )
-        word2vec = W2V()
+        # prefer the checkpoint's compact stem table (see save_stem_table) to the full model
+        word2vec = find_stem_table(
+            stem_table_path(os.path.dirname(model_path)), precision=self.w2v_precision
+        ) or find_w2v(w2v_root=self.w2v_root, precision=self.w2v_precision)
         return logistic_model, topic_model, word2vec
 
-    def __get_topic_vector(self, lstm_vector):
+    def __load_topic_model(self, path):
+        if self.topic_model_backend == "numpy":
+            return NumpyTopicModel.load(path)
+        from tensorflow.keras.models import load_model
+
+        return load_model(path)
+
+    def __get_topic_vectors(self, lstm_vectors):
         model_path = self.get_model_path()
         if self.topic_model is None:
             try:
-                self.topic_model = load_model(
+                self.topic_model = self.__load_topic_model(
                     os.path.join(model_path, "lstm_topic_model.h5")
                 )
             except BaseException:
@@ -131,12 +226,124 @@ class LSTMClassifier(Classifier):
                     )
                 )
 
-        predicted_vector = self.topic_model.predict(lstm_vector)
-        return predicted_vector[0]
+        return self.topic_model.predict(lstm_vectors)
 
-    def __get_prediction(self, w2v_vector, topic_vector):
+    def __get_candidates(
+        self, questions, k, canned_question_match_disabled, answer_confidence=False
+    ):
+        """
+        Args:
+            answer_confidence: (bool) if true, the top candidate of a binary model is scored
+                with the signed decision value (as get_answer always has, so its off-topic threshold still applies)
+                rather than the winning class's score
+        """
+        assert k >= 1, f"k must be at least 1 (got {k})"
+        observer = self.observer
+        started = time.perf_counter() if observer else None
+        candidates = [None] * len(questions)
+        model_indexes = []
+        n_canned_hits = 0
+        n_fuzzy_hits = 0
+        for i, question in enumerate(questions):
+            if not canned_question_match_disabled:
+                sanitized_question = sanitize_string(question)
+                if sanitized_question in self.mentor.question_ids:
+                    answer_id = self.mentor.question_ids[sanitized_question]
+                    answer_question = self.mentor.ids_answers[answer_id]
+                    candidates[i] = [(answer_id, answer_question, 1.0)]
+                    n_canned_hits += 1
+                    continue
+                match = (
+                    self.mentor.get_fuzzy_index().find(
+                        sanitized_question, self.fuzzy_match_threshold
+                    )
+                    if self.fuzzy_match_threshold
+                    else None
+                )
+                if match:
+                    answer_id, similarity = match
+                    candidates[i] = [
+                        (answer_id, self.mentor.ids_answers[answer_id], similarity)
+                    ]
+                    n_fuzzy_hits += 1
+                    continue
+            model_indexes.append(i)
+        with self.__match_stats_lock:
+            self.__match_stats["questions"] += len(questions)
+            self.__match_stats["canned_hits"] += n_canned_hits
+            self.__match_stats["fuzzy_hits"] += n_fuzzy_hits
+        if observer:
+            started = self.__observe_stage("sanitize", started, len(questions))
+            observer.on_count("questions", len(questions))
+            observer.on_count("canned_hits", n_canned_hits)
+            observer.on_count("fuzzy_hits", n_fuzzy_hits)
+        if not model_indexes:
+            return candidates
+        processed_questions = [
+            self.preprocessor.transform(questions[i]) for i in model_indexes
+        ]
+        if observer:
+            started = self.__observe_stage("preprocess", started, len(model_indexes))
+        w2v_vectors = []
+        lstm_vectors = []
+        for processed_question in processed_questions:
+            w2v_vector, lstm_vector = self.w2v_model.w2v_for_question(
+                processed_question
+            )
+            w2v_vectors.append(w2v_vector)
+            lstm_vectors.append(lstm_vector)
+        if observer:
+            started = self.__observe_stage("w2v", started, len(model_indexes))
+            observer.on_count("tokens", sum(len(q) for q in processed_questions))
+            observer.on_count(
+                "oov_tokens",
+                sum(self.w2v_model.count_oov(q) for q in processed_questions),
+            )
+            started = time.perf_counter()
+        padded_vectors = pad_lstm_vectors(lstm_vectors)
+        if observer:
+            started = self.__observe_stage("pad", started, len(model_indexes))
+        topic_vectors = self.__get_topic_vectors(padded_vectors)
+        if observer:
+            started = self.__observe_stage("topic_model", started, len(model_indexes))
+        decisions = self.__get_decisions(np.asarray(w2v_vectors), topic_vectors)
+        binary = decisions.ndim == 1
+        # a binary classifier scores only the second class
+        scores = np.column_stack((-decisions, decisions)) if binary else decisions
+        if observer:
+            self.__observe_stage("ridge", started, len(model_indexes))
+            # the confidence get_answer would report (canned and fuzzy matches are never off topic)
+            confidences = decisions if binary else scores.max(axis=1)
+            observer.on_count(
+                "off_topic", int(np.sum(confidences < OFF_TOPIC_THRESHOLD))
+            )
+        for row, (i, row_scores, top) in enumerate(
+            zip(model_indexes, scores, _top_k(scores, k))
+        ):
+            candidates[i] = [
+                self.__to_candidate(answer_index, row_scores[answer_index])
+                for answer_index in top
+            ]
+            if binary and answer_confidence:
+                candidates[i][0] = candidates[i][0][:2] + (decisions[row],)
+        return candidates
+
+    def __observe_stage(self, stage, started, n):
+        now = time.perf_counter()
+        self.observer.on_stage(stage, now - started, n)
+        return now
+
+    def __get_decisions(self, w2v_vectors, topic_vectors):
+        """
+        Returns:
+            decisions: (ndarray) shape (questions, answers) of ridge decision scores,
+                columns in the order of logistic_model.classes_,
+                or shape (questions,) with the score of the second class for a binary classifier
+        """
         model_path = self.get_model_path()
         if self.logistic_model is None:
+            from sklearn.externals import joblib
+
             try:
                 self.logistic_model = joblib.load(
                     os.path.join(model_path, "fused_model.pkl")
@@ -147,33 +354,41 @@ class LSTMClassifier(Classifier):
                         model_path
                     )
                 )
-        test_vector = np.concatenate((w2v_vector, topic_vector))
-        test_vector = test_vector.reshape(1, -1)
-        prediction = self.logistic_model.predict(test_vector)
-        decision = self.logistic_model.decision_function(test_vector)
-        confidence_scorces = (
-            sorted(decision[0]) if decision.ndim >= 2 else sorted(decision)
-        )
-        highest_confidence = confidence_scorces[-1]
-        if highest_confidence < -0.88:
-            return "_OFF_TOPIC_", "_OFF_TOPIC_", highest_confidence
-        if not len(prediction) >= 1 and prediction[0]:
-            raise Exception(
-                f"Prediction should be a list with at least one element (answer text) but found {prediction}"
-            )
-        answer_text = prediction[0]
+        test_vectors = np.concatenate((w2v_vectors, topic_vectors), axis=1)
+        return self.logistic_model.decision_function(test_vectors)
+
+    def __to_candidate(self, answer_index, score):
+        answer_text = self.logistic_model.classes_[answer_index]
         answer_id = self.mentor.find_id_for_answer_text(answer_text)
         if not answer_id:
             raise Exception(
                 f"No answer id found for answer text (classifier_data may be out of sync with trained model): {answer_text}"
             )
-        return self.mentor.answer_ids[prediction[0]], prediction[0], highest_confidence
+        return answer_id, answer_text, score
+
+    def __to_answer(self, candidate):
+        if candidate[2] < OFF_TOPIC_THRESHOLD:
+            return "_OFF_TOPIC_", "_OFF_TOPIC_", candidate[2]
+        return candidate
+
+
+def _top_k(scores, k):
+    """
+    Indexes of the k highest scores in each row, highest first (equal scores lowest index first),
+    using a partial selection rather than sorting every score
+    """
+    if k == 1:
+        return np.argmax(scores, axis=1)[:, np.newaxis]
+    k = min(k, scores.shape[1])
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.lexsort((top, -np.take_along_axis(scores, top, axis=1)), axis=1)
+    return np.take_along_axis(top, order, axis=1)
 
 
 # CheckpointClassifierFactory impl that will get registered globally for this arch ('lstm_v1')
 class __ClassifierFactory(CheckpointClassifierFactory):
-    def create(self, checkpoint, mentors):
-        return LSTMClassifier(mentors, checkpoint)
+    def create(self, checkpoint, mentors, **kwargs):
+        return LSTMClassifier(mentors, checkpoint, **kwargs)
 
 
 # NOTE: always make sure this module lives in `mentor_classifier.classifiers.arch.${ARCH}`
@@ -0,0 +1,170 @@
+#
+# This software is Copyright ©️ 2020 The University of Southern California. All Rights Reserved.
+# Permission to use, copy, modify, and distribute this software and its documentation for educational, research and non-profit purposes, without fee, and without a written agreement is hereby granted, provided that the above copyright notice and subject to the full license file found in the root of this software deliverable. Permission to make commercial use of this software may be obtained by contacting:  USC Stevens Center for Innovation University of Southern California 1150 S. Olive Street, Suite 2300, Los Angeles, CA 90115, USA Email: accounting@stevens.usc.edu
+#
+# The full terms of this copyright and license should always be found in the root directory of this software deliverable as "license.txt" and if these terms are not found with this software, please contact the USC Stevens Center for the full license.
+#
+import json
+from typing import Any, Dict, List
+
+import numpy as np
+
+"""
+Forward pass of the lstm_v1 topic model (LSTM -> Dropout -> Dense -> Activation,
+as built by TrainLSTMClassifier) in NumPy, so serving doesn't need TensorFlow
+"""
+
+
+def _hard_sigmoid(x):
+    return np.clip(0.2 * x + 0.5, 0.0, 1.0)
+
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def _softmax(x):
+    e = np.exp(x - np.max(x, axis=-1, keepdims=True))
+    return e / np.sum(e, axis=-1, keepdims=True)
+
+
+_ACTIVATIONS = {
+    "hard_sigmoid": _hard_sigmoid,
+    "linear": lambda x: x,
+    "relu": lambda x: np.maximum(x, 0.0),
+    "sigmoid": _sigmoid,
+    "softmax": _softmax,
+    "tanh": np.tanh,
+}
+
+
+def _activation(name: str):
+    if name not in _ACTIVATIONS:
+        raise Exception(f"activation {name} not supported by NumpyTopicModel")
+    return _ACTIVATIONS[name]
+
+
+def _to_str(s) -> str:
+    return s.decode("utf8") if isinstance(s, bytes) else str(s)
+
+
+def _layer_configs(model_config: Dict[str, Any]) -> List[Dict[str, Any]]:
+    config = model_config["config"]
+    # keras 2.2.4 stores Sequential layers as a list, tf.keras as {"layers": [...]}
+    return config["layers"] if isinstance(config, dict) else config
+
+
+class NumpyTopicModel(object):
+    """
+    Drop-in replacement for the keras topic model's predict.
+
+    Args:
+        lstm_weights: (list of ndarray) kernel, recurrent kernel and bias of the LSTM
+        dense_weights: (list of ndarray) kernel and bias of the Dense layer
+        lstm_activation: (str) name of the LSTM's activation
+        lstm_recurrent_activation: (str) name of the LSTM's recurrent activation
+        output_activation: (str) name of the activation applied to the Dense output
+    """
+
+    def __init__(
+        self,
+        lstm_weights: List[np.ndarray],
+        dense_weights: List[np.ndarray],
+        lstm_activation: str = "tanh",
+        lstm_recurrent_activation: str = "hard_sigmoid",
+        output_activation: str = "softmax",
+    ):
+        self.kernel, self.recurrent_kernel, self.bias = [
+            np.asarray(w, dtype="float32") for w in lstm_weights
+        ]
+        self.dense_kernel, self.dense_bias = [
+            np.asarray(w, dtype="float32") for w in dense_weights
+        ]
+        self.units = self.recurrent_kernel.shape[0]
+        self.activation = _activation(lstm_activation)
+        self.recurrent_activation = _activation(lstm_recurrent_activation)
+        self.output_activation = _activation(output_activation)
+
+    @staticmethod
+    def load(h5_path: str) -> "NumpyTopicModel":
+        """
+        Loads the weights of a topic model saved by keras (e.g. lstm_topic_model.h5)
+        """
+        import h5py
+
+        with h5py.File(h5_path, "r") as f:
+            model_config = json.loads(_to_str(f.attrs["model_config"]))
+            weights_root = f["model_weights"] if "model_weights" in f else f
+            lstm = dense = None
+            activation = "linear"
+            for layer in _layer_configs(model_config):
+                class_name, config = layer["class_name"], layer["config"]
+                if class_name not in ("LSTM", "Dense", "Activation"):
+                    continue
+                if class_name == "Activation":
+                    activation = config["activation"]
+                    continue
+                layer_weights = weights_root[config["name"]]
+                weights = [
+                    np.asarray(layer_weights[_to_str(n)])
+                    for n in layer_weights.attrs["weight_names"]
+                ]
+                if class_name == "LSTM":
+                    lstm = (weights, config)
+                else:
+                    dense = (weights, config)
+                    activation = config.get("activation") or "linear"
+        if not lstm or not dense:
+            raise Exception(f"{h5_path} is not an LSTM topic model")
+        return NumpyTopicModel(
+            lstm[0],
+            dense[0],
+            lstm_activation=lstm[1].get("activation", "tanh"),
+            lstm_recurrent_activation=lstm[1].get(
+                "recurrent_activation", "hard_sigmoid"
+            ),
+            output_activation=activation,
+        )
+
+    @property
+    def nbytes(self) -> int:
+        return sum(
+            w.nbytes
+            for w in (
+                self.kernel,
+                self.recurrent_kernel,
+                self.bias,
+                self.dense_kernel,
+                self.dense_bias,
+            )
+        )
+
+    def predict(self, x: np.ndarray) -> np.ndarray:
+        """
+        Args:
+            x: (ndarray) padded word vectors, shape (batch, timesteps, features)
+
+        Returns:
+            topic_vectors: (ndarray) shape (batch, topics)
+        """
+        x = np.asarray(x, dtype="float32")
+        n, timesteps, _ = x.shape
+        u = self.units
+        # Padding (and out-of-vocabulary words) are all-zero rows, for which the
+        # input projection is zero, so only project the rows that have a word.
+        # The recurrence itself still steps through the padding,
+        # because the model was trained without masking and the state keeps changing there
+        has_word = np.any(x != 0, axis=2)
+        x_proj = np.zeros((n, timesteps, 4 * u), dtype="float32")
+        x_proj[has_word] = np.dot(x[has_word], self.kernel)
+        x_proj += self.bias
+        h = np.zeros((n, u), dtype="float32")
+        c = np.zeros((n, u), dtype="float32")
+        for t in range(timesteps):
+            z = x_proj[:, t] + np.dot(h, self.recurrent_kernel)
+            i = self.recurrent_activation(z[:, :u])
+            f = self.recurrent_activation(z[:, u : 2 * u])
+            c = f * c + i * self.activation(z[:, 2 * u : 3 * u])
+            o = self.recurrent_activation(z[:, 3 * u :])
+            h = o * self.activation(c)
+        return self.output_activation(np.dot(h, self.dense_kernel) + self.dense_bias)
@@ -4,36 +4,42 @@
 #
 # The full terms of this copyright and license should always be found in the root directory of this software deliverable as "license.txt" and if these terms are not found with this software, please contact the USC Stevens Center for the full license.
 #
+from hashlib import sha1
+import json
 import logging
 import os
 
-from tensorflow.keras.preprocessing.sequence import pad_sequences
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import LSTM, Activation, Dense, Dropout
-from tensorflow.keras.callbacks import ModelCheckpoint
 import numpy as np
-import pandas as pd
-from sklearn import metrics
-from sklearn.externals import joblib
-from sklearn.linear_model import RidgeClassifier
-from sklearn.model_selection import cross_val_score, cross_val_predict
 
-from .. import LSTMClassifier
+from .. import LSTMClassifier, pad_lstm_vectors
 from mentor_classifier.classifiers.training import (
     ClassifierTraining,
     ClassifierTrainingFactory,
     register_classifier_training_factory,
 )
+from mentor_classifier.feature_store import Featurizer, FeatureStore
 from mentor_classifier.mentor import Mentor
 from mentor_classifier.nltk_preprocessor import NLTKPreprocessor
 from mentor_classifier.utils import normalize_topics
-from mentor_classifier.w2v import W2V
+from mentor_classifier.w2v import (
+    find_w2v,
+    save_stem_table,
+    save_stem_table_precision,
+    stem_table_path,
+)
 
 
 # CheckpointClassifierFactory impl that will get registered globally for this arch ('lstm_v1')
 class __ClassifierTrainingFactory(ClassifierTrainingFactory):
-    def create(self, checkpoint, mentors):
-        return TrainLSTMClassifier(mentors, checkpoint)
+    def create(self, checkpoint, mentors, **kwargs):
+        return TrainLSTMClassifier(mentors, checkpoint, **kwargs)
+
+    def prepare_checkpoint(self, checkpoint):
+        save_stem_table(find_w2v(), stem_table_path(checkpoint))
+        # serving never converts the stem table on disk (see find_stem_table)
+        for precision in (os.getenv("W2V_PRECISIONS") or "").split(","):
+            if precision:
+                save_stem_table_precision(stem_table_path(checkpoint), precision)
 
 
 # NOTE: always make sure this module lives in `mentor_classifier.classifiers.arch.${ARCH}`
@@ -43,21 +49,137 @@ register_classifier_training_factory(
 )
 
 
+def load_fused_unfused(train_vectors, topic_vectors):
+    """
+    Builds the ridge classifiers' training features: the summed w2v vector of each question (unfused),
+    and the same with the topic model's output appended (fused).
+
+    Args:
+        train_vectors: (list) a [question, w2v_vector, topic_vector, answer_text] for each question
+        topic_vectors: (ndarray) topic model predictions, one row per question
+
+    Returns:
+        x_train_fused, y_train_fused, x_train_unfused, y_train_unfused
+    """
+    x_train_unfused = np.asarray([v[1] for v in train_vectors])
+    y_train_unfused = [v[3] for v in train_vectors]
+    x_train_fused = np.concatenate((x_train_unfused, topic_vectors), axis=1)
+    y_train_fused = list(y_train_unfused)
+    return x_train_fused, y_train_fused, x_train_unfused, y_train_unfused
+
+
+TRAINING_ROWS_FILE_NAME = "training_rows.json"
+WARM_START_EPOCHS_DEFAULT = 3
+
+
+def hash_training_row(question: str, topics: str, text: str) -> dict:
+    """
+    Args:
+        question: (str) the question column of a classifier_data.csv row (with paraphrases)
+        topics: (str) the topics column
+        text: (str) the answer text column
+
+    Returns:
+        hashes: (dict) 'inputs', the hash of what the topic model learns from (question and topics),
+            and 'answer', the hash of the answer text (which only the ridge heads learn)
+    """
+    return dict(
+        inputs=sha1(f"{question}\0{topics}".encode("utf-8")).hexdigest(),
+        answer=sha1(text.encode("utf-8")).hexdigest(),
+    )
+
+
+def find_changed_rows(previous_rows: dict, rows: dict) -> dict:
+    """
+    Compares the row hashes (by answer ID, see hash_training_row) of a previous training run with the current ones
+
+    Returns:
+        changes: (dict) lists of answer IDs 'added', 'removed', 'inputs_changed' and 'answer_changed'
+    """
+    return dict(
+        added=sorted(set(rows) - set(previous_rows)),
+        removed=sorted(set(previous_rows) - set(rows)),
+        inputs_changed=sorted(
+            i
+            for i in rows
+            if i in previous_rows and rows[i]["inputs"] != previous_rows[i]["inputs"]
+        ),
+        answer_changed=sorted(
+            i
+            for i in rows
+            if i in previous_rows and rows[i]["answer"] != previous_rows[i]["answer"]
+        ),
+    )
+
+
+def select_warm_start_samples(changed, rng, min_samples: int = 32):
+    """
+    Picks the samples to fine tune a previously trained topic model on:
+    all the changed samples plus as many unchanged ones (at least min_samples),
+    so that the model doesn't forget what it learned from the rest
+
+    Args:
+        changed: (bool ndarray) one per training sample, true if its row was added or its inputs changed
+        rng: (numpy.random.RandomState)
+        min_samples: (int) min number of unchanged samples to replay
+
+    Returns:
+        indices: (int ndarray) sorted indices of the selected samples
+    """
+    changed_indices = np.flatnonzero(changed)
+    unchanged_indices = np.flatnonzero(~changed)
+    n_replay = min(len(unchanged_indices), max(len(changed_indices), min_samples))
+    replay_indices = rng.choice(unchanged_indices, size=n_replay, replace=False)
+    return np.sort(np.concatenate((changed_indices, replay_indices)))
+
+
 """
 Wrapper class for LSTMClassifier that trains the classifier
 """
 
 
 class TrainLSTMClassifier(ClassifierTraining):
+    """
+    Args:
+        mentor: (mentor_classifier.mentor.Mentor)
+        checkpoint: (str) path of the checkpoint to train
+        feature_store: (str) path of a mentor_classifier.feature_store.FeatureStore
+            to reuse question features from (and save them to) across training runs.
+            Defaults to env FEATURE_STORE, if set
+        previous_checkpoint: (str) path of a checkpoint this mentor was trained in before.
+            If its topics are unchanged, trains incrementally: reuses its topic model
+            if no question or topics changed (e.g. only answer text was edited),
+            otherwise fine tunes it on the changed questions for warm_start_epochs
+        warm_start_epochs: (int) epochs to fine tune a previous topic model
+        compare_full_retrain: (bool) if true and training incrementally,
+            also trains from scratch to report the accuracy delta (see get_report)
+        w2v_root: (str) directory containing the word2vec binary.
+            Defaults to env W2V_ROOT or checkpoint/vector_models
+    """
+
     # TRAINING_DEFAULT_PATH = os.path.join('mentors','{0}','data','classifier_data.csv')
 
-    def __init__(self, mentor, checkpoint):
+    def __init__(
+        self,
+        mentor,
+        checkpoint,
+        feature_store=None,
+        previous_checkpoint=None,
+        warm_start_epochs=WARM_START_EPOCHS_DEFAULT,
+        compare_full_retrain=False,
+        w2v_root=None,
+    ):
         assert isinstance(mentor, Mentor)
         assert isinstance(checkpoint, str)
         self.mentor = mentor
         self.checkpoint = checkpoint
         self.model_path = os.path.join(self.checkpoint, mentor.get_id())
-        self.w2v = W2V()
+        self.w2v = find_w2v(w2v_root=w2v_root)
+        self.feature_store = feature_store or os.getenv("FEATURE_STORE")
+        self.previous_checkpoint = previous_checkpoint
+        self.warm_start_epochs = warm_start_epochs
+        self.compare_full_retrain = compare_full_retrain
+        self.report = {}
 
     """
     Trains the classifier updating trained weights to be saved later with save()
@@ -70,23 +192,72 @@ class TrainLSTMClassifier(ClassifierTraining):
     def train(self):
         if not os.path.exists(self.model_path):
             os.makedirs(self.model_path)
-        training_data, num_rows_having_paraphrases = self.__load_training_data(
-            self.mentor.mentor_data_path("classifier_data.csv")
-        )
-        train_vectors, lstm_train_vectors = self.__load_training_vectors(training_data)
+        store = FeatureStore(self.feature_store) if self.feature_store else None
+        featurizer = Featurizer(NLTKPreprocessor(), self.w2v, store)
+        try:
+            training_data, num_rows_having_paraphrases = self.__load_training_data(
+                self.mentor.mentor_data_path("classifier_data.csv"), featurizer
+            )
+            train_vectors, lstm_train_vectors = self.__load_training_vectors(
+                training_data, featurizer
+            )
+        finally:
+            if store:
+                store.close()
+        logging.info(f"featurized training questions: {featurizer.get_stats()}")
         train_vectors, lstm_train_data = self.__load_topic_vectors(
             train_vectors, lstm_train_vectors
         )
         x_train, y_train = self.__load_xy_train(lstm_train_data)
-        self.topic_model, new_vectors = self.__train_lstm(
-            lstm_train_data, x_train, y_train
+        previous_model_path, changes = self.__find_previous_changes()
+        self.report = dict(mode="full")
+        if previous_model_path is None:
+            self.topic_model, topic_vectors = self.__train_lstm(
+                lstm_train_data, x_train, y_train
+            )
+        else:
+            changed_ids = set(changes["added"] + changes["inputs_changed"])
+            changed = np.asarray(
+                [str(instance[3]) in changed_ids for instance in training_data]
+            )
+            self.report = dict(
+                mode="warm_start" if changed.any() else "reuse_topic_model",
+                changed_samples=int(changed.sum()),
+                **{f"rows_{k}": len(v) for k, v in changes.items()},
+            )
+            logging.info(
+                f"incremental training from {previous_model_path}: {self.report}"
+            )
+            self.topic_model, topic_vectors = self.__warm_start_lstm(
+                previous_model_path, x_train, y_train, changed
+            )
+        scores, accuracy = self.__train_heads(
+            train_vectors, topic_vectors, num_rows_having_paraphrases
         )
+        self.report["accuracy"] = float(accuracy)
+        if self.compare_full_retrain and previous_model_path is not None:
+            _, full_topic_vectors = self.__train_lstm(lstm_train_data, x_train, y_train)
+            _, full_accuracy, _, _ = self.__train_lr(
+                *load_fused_unfused(train_vectors, full_topic_vectors),
+                num_rows_having_paraphrases,
+            )
+            self.report.update(
+                full_retrain_accuracy=float(full_accuracy),
+                accuracy_delta=float(accuracy - full_accuracy),
+            )
+            logging.info(f"incremental vs full retrain: {self.report}")
+        return scores, accuracy
+
+    def get_report(self):
+        return self.report
+
+    def __train_heads(self, train_vectors, topic_vectors, num_rows_having_paraphrases):
         (
             x_train_fused,
             y_train_fused,
             x_train_unfused,
             y_train_unfused,
-        ) = self.__load_fused_unfused(train_vectors, new_vectors)
+        ) = load_fused_unfused(train_vectors, topic_vectors)
         (
             scores,
             accuracy,
@@ -102,6 +273,8 @@ class TrainLSTMClassifier(ClassifierTraining):
         return scores, accuracy
 
     def save(self, to_path=None):
+        from sklearn.externals import joblib
+
         to_path = to_path or self.model_path
         os.makedirs(to_path, exist_ok=True)
         self.topic_model.save(os.path.join(to_path, "lstm_topic_model.h5"))
@@ -111,14 +284,23 @@ class TrainLSTMClassifier(ClassifierTraining):
         )
         with open(os.path.join(to_path, "w2v.txt"), "w") as f:
             f.write(self.w2v.get_w2v_file_name())
+        with open(os.path.join(to_path, TRAINING_ROWS_FILE_NAME), "w") as f:
+            json.dump(dict(topics=self.mentor.topics, rows=self.training_rows), f)
+        # the stem table is shared by all the mentors in a checkpoint
+        # (usually already written by prepare_checkpoint, which makes this a no-op)
+        save_stem_table(
+            self.w2v, stem_table_path(os.path.dirname(os.path.abspath(to_path)))
+        )
+
+    def __load_training_data(self, data_file, featurizer):
+        import pandas as pd
 
-    def __load_training_data(self, data_file):
         assert os.path.isfile(data_file)
         train_data_csv = pd.read_csv(data_file)
         corpus = train_data_csv.fillna("")
-        preprocessor = NLTKPreprocessor()
         train_data = []
         num_rows_having_paraphrases = 0
+        self.training_rows = {}
         for i in range(0, len(corpus)):
             # normalized topics
             topics = corpus.iloc[i]["topics"].split(",")
@@ -133,43 +315,69 @@ class TrainLSTMClassifier(ClassifierTraining):
             answer = corpus.iloc[i]["text"]
             answer_id = corpus.iloc[i]["ID"]
             answer = answer.replace("\u00a0", " ")
+            self.training_rows[str(answer_id)] = hash_training_row(
+                corpus.iloc[i]["question"], corpus.iloc[i]["topics"], answer
+            )
             # add question to dataset
-            processed_question = preprocessor.transform(
-                current_question
-            )  # tokenize the question
+            processed_question = featurizer.featurize(current_question)[
+                0
+            ]  # tokenize the question
             train_data.append(
                 [current_question, processed_question, topics, answer_id, answer]
             )
             # look for paraphrases and add them to dataset
             paraphrases = questions[1:]
             for i in range(0, len(paraphrases)):
-                processed_paraphrase = preprocessor.transform(paraphrases[i])
+                processed_paraphrase = featurizer.featurize(paraphrases[i])[0]
                 train_data.append(
                     [paraphrases[i], processed_paraphrase, topics, answer_id, answer]
                 )
         return train_data, num_rows_having_paraphrases
 
-    def __load_training_vectors(self, train_data):
+    def __find_previous_changes(self):
+        """
+        Returns:
+            previous_model_path: (str) the mentor's model in previous_checkpoint,
+                or None if there isn't one that can be trained incrementally
+            changes: (dict) see find_changed_rows
+        """
+        if not self.previous_checkpoint:
+            return None, None
+        previous_model_path = os.path.join(
+            self.previous_checkpoint, self.mentor.get_id()
+        )
+        try:
+            with open(os.path.join(previous_model_path, TRAINING_ROWS_FILE_NAME)) as f:
+                previous = json.load(f)
+        except (OSError, ValueError):
+            logging.warning(
+                f"no training rows in {previous_model_path}, training from scratch"
+            )
+            return None, None
+        if previous["topics"] != self.mentor.topics:
+            logging.warning(
+                f"topics changed since {previous_model_path}, training from scratch"
+            )
+            return None, None
+        return (
+            previous_model_path,
+            find_changed_rows(previous["rows"], self.training_rows),
+        )
+
+    def __load_training_vectors(self, train_data, featurizer):
         train_vectors = []
         lstm_train_vectors = []
         # for each data point, get w2v vector for the question and store in train_vectors.
         # instance=<question, processed_question, topic, answer_id, answer_text>
         for instance in train_data:
-            w2v_vector, lstm_vector = self.w2v.w2v_for_question(instance[1])
+            _, w2v_vector, lstm_vector = featurizer.featurize(instance[0])
             train_vectors.append(
                 [instance[0], w2v_vector.tolist(), instance[2], instance[4]]
             )
             lstm_train_vectors.append(lstm_vector)
         # For the LSTM, each training sample will have a max dimension of 300 x 25. For those that don't, the pad_sequences
         # function will pad sequences of [0, 0, 0, 0....] vectors to the end of each sample.
-        padded_vectors = pad_sequences(
-            lstm_train_vectors,
-            maxlen=25,
-            dtype="float32",
-            padding="post",
-            truncating="post",
-            value=0.0,
-        )
+        padded_vectors = pad_lstm_vectors(lstm_train_vectors)
         lstm_train_vectors = padded_vectors
         return train_vectors, lstm_train_vectors
 
@@ -202,23 +410,11 @@ class TrainLSTMClassifier(ClassifierTraining):
         x_train = np.asarray(x_train)
         return x_train, y_train
 
-    def __load_fused_unfused(self, train_data, train_topic_vectors):
-        x_train_fused = []
-        y_train_fused = []
-        x_train_unfused = []
-        y_train_unfused = []
-        x_train_unfused = [train_data[i][1] for i in range(len(train_data))]
-        y_train_unfused = [train_data[i][3] for i in range(len(train_data))]
-        x_train_unfused = np.asarray(x_train_unfused)
-        for i in range(0, len(train_data)):
-            x_train_fused.append(
-                np.concatenate((train_data[i][1], train_topic_vectors[i][1]))
-            )
-        x_train_fused = np.asarray(x_train_fused)
-        y_train_fused = [train_data[i][3] for i in range(len(train_data))]
-        return x_train_fused, y_train_fused, x_train_unfused, y_train_unfused
-
     def __train_lstm(self, train_data, x_train, y_train):
+        from tensorflow.keras.callbacks import ModelCheckpoint
+        from tensorflow.keras.layers import LSTM, Activation, Dense, Dropout
+        from tensorflow.keras.models import Sequential
+
         # don't pass summed vectors
         # nb_samples=len(train_data)
         nb_each_sample = len(train_data[0][1])
@@ -257,16 +453,33 @@ class TrainLSTMClassifier(ClassifierTraining):
             callbacks=callbacks_list,
             verbose=1,
         )
-        new_vectors = []
         topic_model.load_weights(lstm_model_path)
         topic_model.compile(
             loss="categorical_crossentropy", optimizer="adam", metrics=["accuracy"]
         )
-        for i in range(0, len(train_data)):
-            current_sample = x_train[i][np.newaxis, :, :]
-            prediction = topic_model.predict(current_sample)
-            new_vectors.append([train_data[i][0], prediction[0].tolist()])
-        return topic_model, new_vectors
+        topic_vectors = topic_model.predict(x_train, batch_size=256)
+        return topic_model, topic_vectors
+
+    def __warm_start_lstm(self, previous_model_path, x_train, y_train, changed):
+        from tensorflow.keras.models import load_model
+
+        topic_model = load_model(
+            os.path.join(previous_model_path, "lstm_topic_model.h5")
+        )
+        topic_model.compile(
+            loss="categorical_crossentropy", optimizer="adam", metrics=["accuracy"]
+        )
+        if changed.any():
+            samples = select_warm_start_samples(changed, np.random.RandomState(0))
+            topic_model.fit(
+                x_train[samples],
+                np.array(y_train)[samples],
+                batch_size=32,
+                epochs=self.warm_start_epochs,
+                verbose=1,
+            )
+        topic_vectors = topic_model.predict(x_train, batch_size=256)
+        return topic_model, topic_vectors
 
     def __train_lr(
         self,
@@ -276,6 +489,10 @@ class TrainLSTMClassifier(ClassifierTraining):
         y_train_unfused,
         num_rows_having_paraphrases,
     ):
+        from sklearn import metrics
+        from sklearn.linear_model import RidgeClassifier
+        from sklearn.model_selection import cross_val_score, cross_val_predict
+
         logistic_model_unfused = RidgeClassifier(alpha=1.0)
         logistic_model_unfused.fit(x_train_unfused, y_train_unfused)
         logistic_model_fused = RidgeClassifier(alpha=1.0)
@@ -0,0 +1,163 @@
+#
+# This software is Copyright ©️ 2020 The University of Southern California. All Rights Reserved.
+# Permission to use, copy, modify, and distribute this software and its documentation for educational, research and non-profit purposes, without fee, and without a written agreement is hereby granted, provided that the above copyright notice and subject to the full license file found in the root of this software deliverable. Permission to make commercial use of this software may be obtained by contacting:  USC Stevens Center for Innovation University of Southern California 1150 S. Olive Street, Suite 2300, Los Angeles, CA 90115, USA Email: accounting@stevens.usc.edu
+#
+# The full terms of this copyright and license should always be found in the root directory of this software deliverable as "license.txt" and if these terms are not found with this software, please contact the USC Stevens Center for the full license.
+#
+import asyncio
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+from mentor_classifier.classifiers import Classifier
+
+MAX_WAIT_MS_DEFAULT = 1.0
+MAX_BATCH_SIZE_DEFAULT = 32
+
+
+def _running_loop() -> asyncio.AbstractEventLoop:
+    # get_running_loop is python 3.7+, get_event_loop (deprecated in coroutines) for 3.6
+    return getattr(asyncio, "get_running_loop", asyncio.get_event_loop)()
+
+
+class AsyncClassifier(object):
+    """
+    Asyncio front end for a (single mentor's) classifier that micro-batches concurrent requests.
+    Questions are collected for up to max_wait_ms or until max_batch_size are waiting,
+    then answered with one Classifier.get_answers call on a worker thread.
+    Requests for a question that is already waiting or running share its answer.
+    If a batch fails, its questions are retried one at a time, so one bad question fails only its own requests.
+    All methods must be called from the event loop's thread.
+    Requests still pending when the classifier is closed fail instead of waiting forever.
+
+    Args:
+        classifier: (mentor_classifier.classifiers.Classifier) the classifier to batch requests for
+        max_wait_ms: (float) max time the first question of a batch waits for others
+        max_batch_size: (int) max questions per batch
+        executor: (concurrent.futures.Executor) runs batches. Defaults to a single worker thread,
+            so batches for a classifier never run concurrently
+    """
+
+    def __init__(
+        self,
+        classifier: Classifier,
+        max_wait_ms: float = MAX_WAIT_MS_DEFAULT,
+        max_batch_size: int = MAX_BATCH_SIZE_DEFAULT,
+        executor: Executor = None,
+    ):
+        assert isinstance(classifier, Classifier)
+        assert max_batch_size >= 1
+        self.classifier = classifier
+        self.max_wait_ms = max_wait_ms
+        self.max_batch_size = max_batch_size
+        self.__owns_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(max_workers=1)
+        self.__in_flight = {}  # (question, canned_question_match_disabled) => future
+        self.__waiting = []
+        self.__timer = None
+        self.__closed = False
+        self.__tasks = set()
+        self.__requests = 0
+        self.__shared = 0
+        self.__batches = 0
+
+    async def aget_answer(
+        self, question: str, canned_question_match_disabled: bool = False
+    ) -> Tuple[str, str, float]:
+        """
+        Coroutine version of Classifier.get_answer
+        """
+        if self.__closed:
+            raise Exception("AsyncClassifier is closed")
+        loop = _running_loop()
+        key = (question, bool(canned_question_match_disabled))
+        self.__requests += 1
+        future = self.__in_flight.get(key)
+        if future is not None:
+            self.__shared += 1
+        else:
+            future = self.__in_flight[key] = loop.create_future()
+            self.__waiting.append(key)
+            if len(self.__waiting) >= self.max_batch_size:
+                self.__flush()
+            elif self.__timer is None:
+                self.__timer = loop.call_later(self.max_wait_ms / 1000.0, self.__flush)
+        # shield so that one cancelled request doesn't cancel the others sharing its answer
+        return await asyncio.shield(future)
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Returns:
+            stats: (dict) requests, shared (answered by another request's computation),
+                batches and waiting (questions not yet sent to the classifier)
+        """
+        return dict(
+            requests=self.__requests,
+            shared=self.__shared,
+            batches=self.__batches,
+            waiting=len(self.__waiting),
+        )
+
+    def close(self) -> None:
+        self.__closed = True
+        if self.__timer is not None:
+            self.__timer.cancel()
+            self.__timer = None
+        # fail every pending request: waiting ones will never be sent and the executor is shutting down
+        err = Exception("AsyncClassifier closed before answering")
+        for future in self.__in_flight.values():
+            if not future.done():
+                future.set_exception(err)
+        self.__in_flight.clear()
+        self.__waiting = []
+        for task in list(self.__tasks):
+            task.cancel()
+        if self.__owns_executor:
+            self.executor.shutdown(wait=False)
+
+    def __flush(self) -> None:
+        if self.__timer is not None:
+            self.__timer.cancel()
+            self.__timer = None
+        while self.__waiting:
+            batch = self.__waiting[: self.max_batch_size]
+            self.__waiting = self.__waiting[self.max_batch_size :]
+            # get_answers takes one canned_question_match_disabled for the whole batch
+            for disabled in (False, True):
+                keys = [k for k in batch if k[1] == disabled]
+                if keys:
+                    task = asyncio.ensure_future(self.__run_batch(keys))
+                    self.__tasks.add(task)
+                    task.add_done_callback(self.__tasks.discard)
+
+    async def __run_batch(self, keys: List[Tuple[str, bool]]) -> None:
+        self.__batches += 1
+        loop = _running_loop()
+        answers, err = [], None
+        try:
+            answers = await loop.run_in_executor(
+                self.executor,
+                self.classifier.get_answers,
+                [k[0] for k in keys],
+                keys[0][1],
+            )
+        except Exception as batch_err:
+            if len(keys) > 1:
+                # answer each question on its own, so one bad question fails only its own requests
+                for key in keys:
+                    await self.__run_batch([key])
+                return
+            err = batch_err
+        except BaseException as cancelled:
+            err = cancelled
+        if err is None and len(answers) != len(keys):
+            err = Exception(
+                f"classifier returned {len(answers)} answers for {len(keys)} questions"
+            )
+        for i, key in enumerate(keys):
+            future = self.__in_flight.pop(key, None)
+            if future is None or future.done():
+                continue
+            if i < len(answers):
+                future.set_result(answers[i])
+            else:
+                future.set_exception(err)
@@ -0,0 +1,206 @@
+#
+# This software is Copyright ©️ 2020 The University of Southern California. All Rights Reserved.
+# Permission to use, copy, modify, and distribute this software and its documentation for educational, research and non-profit purposes, without fee, and without a written agreement is hereby granted, provided that the above copyright notice and subject to the full license file found in the root of this software deliverable. Permission to make commercial use of this software may be obtained by contacting:  USC Stevens Center for Innovation University of Southern California 1150 S. Olive Street, Suite 2300, Los Angeles, CA 90115, USA Email: accounting@stevens.usc.edu
+#
+# The full terms of this copyright and license should always be found in the root directory of this software deliverable as "license.txt" and if these terms are not found with this software, please contact the USC Stevens Center for the full license.
+#
+from collections import OrderedDict
+import sys
+from threading import Lock
+import time
+from typing import Any, Dict, Tuple
+
+from mentor_classifier.classifiers import Classifier
+
+CACHE_MAX_SIZE_DEFAULT = 1000
+
+
+def _normalize_question(question: str) -> str:
+    # only fold what can't change the answer: both the canned-question match
+    # and the model tokens ignore case and surrounding whitespace
+    return question.strip().lower()
+
+
+def _size_of(key: Tuple[str, bool], answer: Tuple[str, str, float]) -> int:
+    return (
+        sys.getsizeof(key)
+        + sys.getsizeof(key[0])
+        + sys.getsizeof(answer)
+        + sum(sys.getsizeof(a) for a in answer)
+    )
+
+
+class CachingClassifier(Classifier):
+    """
+    Wraps any classifier with a bounded LRU cache of answers,
+    keyed by the normalized question and canned_question_match_disabled.
+    The cache is cleared whenever the wrapped classifier's id changes
+    (e.g. it was reloaded from a new checkpoint) or on set_classifier.
+
+    Args:
+        classifier: (mentor_classifier.classifiers.Classifier) the classifier to wrap
+        max_size: (int) max number of answers to cache
+        ttl: (float) seconds a cached answer stays valid. Defaults to no expiry
+        clock: (callable) returns the current time in seconds
+    """
+
+    def __init__(
+        self,
+        classifier: Classifier,
+        max_size: int = CACHE_MAX_SIZE_DEFAULT,
+        ttl: float = None,
+        clock=time.monotonic,
+    ):
+        assert isinstance(classifier, Classifier)
+        assert max_size > 0
+        self.max_size = max_size
+        self.ttl = ttl
+        self.__clock = clock
+        self.__lock = Lock()
+        self.__entries = OrderedDict()
+        self.__memory_bytes = 0
+        self.__classifier = classifier
+        self.__classifier_id = classifier.get_classifier_id()
+        self.__reset_stats()
+
+    def __getattr__(self, name: str) -> Any:
+        # expose the wrapped classifier's attributes (e.g. mentor)
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.__classifier, name)
+
+    def get_classifier(self) -> Classifier:
+        return self.__classifier
+
+    def set_classifier(self, classifier: Classifier) -> None:
+        assert isinstance(classifier, Classifier)
+        with self.__lock:
+            self.__classifier = classifier
+            self.__classifier_id = classifier.get_classifier_id()
+            self.__clear()
+
+    def get_classifier_id(self) -> str:
+        return self.__classifier.get_classifier_id()
+
+    def estimate_memory_bytes(self) -> int:
+        return self.__classifier.estimate_memory_bytes() + self.__memory_bytes
+
+    def get_answer(self, question, canned_question_match_disabled=False):
+        return self.get_answers([question], canned_question_match_disabled)[0]
+
+    def get_answers(self, questions, canned_question_match_disabled=False):
+        classifier, classifier_id = self.__check_classifier_id()
+        keys = [
+            (_normalize_question(q), bool(canned_question_match_disabled))
+            for q in questions
+        ]
+        answers = [self.__get(key) for key in keys]
+        miss_indexes = [i for i, answer in enumerate(answers) if answer is None]
+        if miss_indexes:
+            computed = classifier.get_answers(
+                [questions[i] for i in miss_indexes], canned_question_match_disabled
+            )
+            # answers from a classifier that was swapped while they were computed aren't cached
+            current_classifier, current_id = self.__check_classifier_id()
+            cacheable = current_classifier is classifier and current_id == classifier_id
+            for i, answer in zip(miss_indexes, computed):
+                answers[i] = answer
+                if cacheable:
+                    self.__put(keys[i], answer, classifier_id)
+        return answers
+
+    def get_answer_candidates(
+        self, question, k=1, canned_question_match_disabled=False
+    ):
+        # not cached: candidates are for inspecting the model, not the hot path
+        return self.__classifier.get_answer_candidates(
+            question, k=k, canned_question_match_disabled=canned_question_match_disabled
+        )
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__clear()
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Returns:
+            stats: (dict) hits, misses, evictions and expirations since the last reset_stats,
+                plus the current size (number of answers) and memory_bytes (estimated)
+        """
+        with self.__lock:
+            return dict(
+                hits=self.__hits,
+                misses=self.__misses,
+                evictions=self.__evictions,
+                expirations=self.__expirations,
+                size=len(self.__entries),
+                memory_bytes=self.__memory_bytes,
+            )
+
+    def reset_stats(self) -> None:
+        with self.__lock:
+            self.__reset_stats()
+
+    def __reset_stats(self) -> None:
+        self.__hits = 0
+        self.__misses = 0
+        self.__evictions = 0
+        self.__expirations = 0
+
+    def __check_classifier_id(self) -> Tuple[Classifier, str]:
+        """
+        Clears the cache if the wrapped classifier's id changed
+
+        Returns:
+            classifier: (mentor_classifier.classifiers.Classifier) the wrapped classifier
+            classifier_id: (str) its id
+        """
+        classifier = self.__classifier
+        classifier_id = classifier.get_classifier_id()
+        with self.__lock:
+            if (
+                classifier is self.__classifier
+                and classifier_id != self.__classifier_id
+            ):
+                self.__classifier_id = classifier_id
+                self.__clear()
+        return classifier, classifier_id
+
+    def __clear(self) -> None:
+        self.__entries.clear()
+        self.__memory_bytes = 0
+
+    def __get(self, key: Tuple[str, bool]) -> Tuple[str, str, float]:
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                self.__misses += 1
+                return None
+            answer, expires_at, size = entry
+            if expires_at is not None and self.__clock() >= expires_at:
+                del self.__entries[key]
+                self.__memory_bytes -= size
+                self.__expirations += 1
+                self.__misses += 1
+                return None
+            self.__entries.move_to_end(key)
+            self.__hits += 1
+            return answer
+
+    def __put(
+        self, key: Tuple[str, bool], answer: Tuple[str, str, float], classifier_id: str
+    ) -> None:
+        expires_at = self.__clock() + self.ttl if self.ttl is not None else None
+        size = _size_of(key, answer)
+        with self.__lock:
+            if classifier_id != self.__classifier_id:
+                # the cache was cleared for another classifier since the answer was computed
+                return
+            if key in self.__entries:
+                self.__memory_bytes -= self.__entries.pop(key)[2]
+            self.__entries[key] = (answer, expires_at, size)
+            self.__memory_bytes += size
+            while len(self.__entries) > self.max_size:
+                _, (_, _, evicted_size) = self.__entries.popitem(last=False)
+                self.__memory_bytes -= evicted_size
+                self.__evictions += 1
@@ -0,0 +1,138 @@
+#
+# This software is Copyright ©️ 2020 The University of Southern California. All Rights Reserved.
+# Permission to use, copy, modify, and distribute this software and its documentation for educational, research and non-profit purposes, without fee, and without a written agreement is hereby granted, provided that the above copyright notice and subject to the full license file found in the root of this software deliverable. Permission to make commercial use of this software may be obtained by contacting:  USC Stevens Center for Innovation University of Southern California 1150 S. Olive Street, Suite 2300, Los Angeles, CA 90115, USA Email: accounting@stevens.usc.edu
+#
+# The full terms of this copyright and license should always be found in the root directory of this software deliverable as "license.txt" and if these terms are not found with this software, please contact the USC Stevens Center for the full license.
+#
+from collections import OrderedDict
+import logging
+from threading import Event, Lock
+from typing import Any, Callable, Dict, List
+
+from mentor_classifier.classifiers import Classifier, create_classifier_factory
+from mentor_classifier.mentor import Mentor
+
+
+class _Load(object):
+    """
+    A classifier load in progress, shared by all the requests waiting on it
+    """
+
+    def __init__(self):
+        self.done = Event()
+        self.classifier = None
+        self.error = None
+
+
+class ClassifierPool(object):
+    """
+    Loads a classifier per mentor on first request
+    and keeps the most recently used ones loaded within a memory budget.
+    Concurrent first requests for the same mentor share a single load.
+
+    Args:
+        checkpoint_root: (str) root path of checkpoints
+        arch: (str) id for the architecture
+        checkpoint: (str) id for the checkpoint. Defaults to newest (alphabetical by name)
+        mentor_data_root: (str) root path of mentor data
+        memory_budget_bytes: (int) once the estimated memory of loaded classifiers exceeds this,
+            the least recently used are evicted. Defaults to no limit
+        size_of: (callable) estimates the memory in bytes of a classifier.
+            Defaults to Classifier.estimate_memory_bytes
+        classifier_kwargs: options for the arch's classifier (e.g. topic_model_backend for lstm_v1)
+    """
+
+    def __init__(
+        self,
+        checkpoint_root: str = None,
+        arch: str = None,
+        checkpoint: str = None,
+        mentor_data_root: str = None,
+        memory_budget_bytes: int = None,
+        size_of: Callable[[Classifier], int] = None,
+        **classifier_kwargs,
+    ):
+        self.factory = create_classifier_factory(
+            checkpoint_root=checkpoint_root, arch=arch, checkpoint=checkpoint
+        )
+        self.mentor_data_root = mentor_data_root
+        self.memory_budget_bytes = memory_budget_bytes
+        self.size_of = size_of or (lambda c: c.estimate_memory_bytes())
+        self.classifier_kwargs = classifier_kwargs
+        self.__lock = Lock()
+        self.__loaded = OrderedDict()  # mentor id => (classifier, size) in LRU order
+        self.__loads = {}
+        self.__memory_bytes = 0
+        self.__evictions = 0
+
+    def get_classifier(self, mentor_id: str) -> Classifier:
+        """
+        Returns the classifier for a mentor, loading it if necessary
+        """
+        with self.__lock:
+            if mentor_id in self.__loaded:
+                self.__loaded.move_to_end(mentor_id)
+                return self.__loaded[mentor_id][0]
+            load = self.__loads.get(mentor_id)
+            is_loader = load is None
+            if is_loader:
+                load = self.__loads[mentor_id] = _Load()
+        if not is_loader:
+            load.done.wait()
+            if load.error:
+                raise load.error
+            return load.classifier
+        try:
+            load.classifier = self.__create(mentor_id)
+            size = self.size_of(load.classifier)
+        except BaseException as err:
+            load.error = err
+            with self.__lock:
+                del self.__loads[mentor_id]
+            load.done.set()
+            raise
+        with self.__lock:
+            self.__loaded[mentor_id] = (load.classifier, size)
+            self.__memory_bytes += size
+            del self.__loads[mentor_id]
+            self.__evict_over_budget()
+        load.done.set()
+        return load.classifier
+
+    def evict(self, mentor_id: str) -> bool:
+        with self.__lock:
+            if mentor_id not in self.__loaded:
+                return False
+            self.__memory_bytes -= self.__loaded.pop(mentor_id)[1]
+            return True
+
+    def get_loaded_mentor_ids(self) -> List[str]:
+        with self.__lock:
+            return list(self.__loaded.keys())
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.__lock:
+            return dict(
+                loaded=len(self.__loaded),
+                memory_bytes=self.__memory_bytes,
+                memory_budget_bytes=self.memory_budget_bytes,
+                evictions=self.__evictions,
+            )
+
+    def __create(self, mentor_id: str) -> Classifier:
+        mentor = (
+            Mentor(mentor_id, mentor_data_root=self.mentor_data_root)
+            if self.mentor_data_root
+            else mentor_id
+        )
+        return self.factory.create(mentor, **self.classifier_kwargs)
+
+    def __evict_over_budget(self) -> None:
+        if self.memory_budget_bytes is None:
+            return
+        # never evict the most recently used, even if it alone is over budget
+        while self.__memory_bytes > self.memory_budget_bytes and len(self.__loaded) > 1:
+            mentor_id, (_, size) = self.__loaded.popitem(last=False)
+            self.__memory_bytes -= size
+            self.__evictions += 1
+            logging.info(f"evicted classifier for mentor {mentor_id} ({size} bytes)")
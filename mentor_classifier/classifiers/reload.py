@@ -0,0 +1,232 @@
+#
+# This software is Copyright ©️ 2020 The University of Southern California. All Rights Reserved.
+# Permission to use, copy, modify, and distribute this software and its documentation for educational, research and non-profit purposes, without fee, and without a written agreement is hereby granted, provided that the above copyright notice and subject to the full license file found in the root of this software deliverable. Permission to make commercial use of this software may be obtained by contacting:  USC Stevens Center for Innovation University of Southern California 1150 S. Olive Street, Suite 2300, Los Angeles, CA 90115, USA Email: accounting@stevens.usc.edu
+#
+# The full terms of this copyright and license should always be found in the root directory of this software deliverable as "license.txt" and if these terms are not found with this software, please contact the USC Stevens Center for the full license.
+#
+import logging
+import os
+from threading import Event, Lock, Thread
+from typing import List, Tuple, Union
+import weakref
+
+from mentor_classifier.checkpoints import (
+    ARCH_DEFAULT,
+    CHECKPOINT_ROOT_DEFAULT,
+    MANIFEST_FILE_NAME,
+    find_checkpoint_index,
+)
+from mentor_classifier.classifiers import (
+    Classifier,
+    ClassifierFactory,
+    create_classifier_factory,
+)
+from mentor_classifier.mentor import Mentor
+
+POLL_INTERVAL_DEFAULT = 30.0
+WARMUP_QUESTIONS_DEFAULT = ["Who are you and what do you do?"]
+
+
+def _checkpoint_signature(checkpoint_path: str) -> Tuple:
+    # changes whenever the checkpoint is written again
+    try:
+        st = os.stat(checkpoint_path)
+        manifest_st = os.stat(os.path.join(checkpoint_path, MANIFEST_FILE_NAME))
+        return (st.st_mtime_ns, manifest_st.st_mtime_ns, manifest_st.st_size)
+    except OSError:
+        return None
+
+
+class ReloadingClassifier(Classifier):
+    """
+    A classifier created by a ReloadingClassifierFactory, that passes every request
+    to the classifier for the factory's current checkpoint.
+
+    A request keeps using the classifier it started with even if a new one is swapped in meanwhile,
+    and the old classifier is released once no request uses it.
+    An observer set with set_observer is passed on to every classifier swapped in,
+    while match stats (see get_match_stats) start over with each one
+    """
+
+    def __init__(self, classifier: Classifier, mentors, kwargs):
+        self.__classifier = classifier
+        self.__observer = None
+        self.mentors = mentors
+        self.kwargs = kwargs
+
+    def get_classifier(self) -> Classifier:
+        return self.__classifier
+
+    def set_classifier(self, classifier: Classifier) -> None:
+        if self.__observer is not None:
+            classifier.set_observer(self.__observer)
+        self.__classifier = classifier
+
+    def set_observer(self, observer) -> None:
+        self.__observer = observer
+        self.__classifier.set_observer(observer)
+
+    def get_match_stats(self):
+        return self.__classifier.get_match_stats()
+
+    def get_answer(
+        self, question: str, canned_question_match_disabled: bool = False
+    ) -> Tuple[str, str, float]:
+        return self.__classifier.get_answer(question, canned_question_match_disabled)
+
+    def get_answers(
+        self, questions: List[str], canned_question_match_disabled: bool = False
+    ) -> List[Tuple[str, str, float]]:
+        return self.__classifier.get_answers(questions, canned_question_match_disabled)
+
+    def get_answer_candidates(
+        self, question: str, k: int = 1, canned_question_match_disabled: bool = False
+    ) -> List[Tuple[str, str, float]]:
+        return self.__classifier.get_answer_candidates(
+            question, k=k, canned_question_match_disabled=canned_question_match_disabled
+        )
+
+    def get_classifier_id(self) -> str:
+        return self.__classifier.get_classifier_id()
+
+    def estimate_memory_bytes(self) -> int:
+        return self.__classifier.estimate_memory_bytes()
+
+
+class ReloadingClassifierFactory(ClassifierFactory):
+    """
+    A ClassifierFactory for the newest checkpoint of an arch, that watches the checkpoint root
+    and switches to new checkpoints without a restart.
+
+    When a new checkpoint is complete (train() writes its manifest.json last),
+    a background thread creates a classifier from it
+    for every ReloadingClassifier still in use, warms each with warmup_questions,
+    and only then swaps them all in at once.
+    If any of them fails to load, the swap is abandoned and the current checkpoint stays in use,
+    and the new checkpoint is only tried again once it changes (its directory or manifest is rewritten).
+
+    Args:
+        checkpoint_root: (str) root path of checkpoints
+        arch: (str) id for the architecture
+        poll_interval: (float) seconds between checks for a new checkpoint
+        warmup_questions: (list) questions to answer with each new classifier before swapping it in
+        start: (bool) if false, don't start the watcher thread (call check_for_update() instead)
+    """
+
+    def __init__(
+        self,
+        checkpoint_root: str = None,
+        arch: str = None,
+        poll_interval: float = POLL_INTERVAL_DEFAULT,
+        warmup_questions: List[str] = None,
+        start: bool = True,
+    ):
+        self.checkpoint_root = checkpoint_root
+        self.arch = arch
+        self.poll_interval = poll_interval
+        self.warmup_questions = (
+            warmup_questions
+            if warmup_questions is not None
+            else WARMUP_QUESTIONS_DEFAULT
+        )
+        factory = create_classifier_factory(checkpoint_root=checkpoint_root, arch=arch)
+        super().__init__(factory.checkpoint_classifier_factory, factory.checkpoint)
+        self.__lock = Lock()
+        self.__reload_lock = Lock()
+        self.__classifiers = weakref.WeakSet()
+        self.__failed_checkpoint = None  # (path, __checkpoint_signature)
+        self.__stopped = Event()
+        self.__thread = None
+        if start:
+            self.__thread = Thread(target=self.__watch, daemon=True)
+            self.__thread.start()
+
+    def create(
+        self, mentors: Union[str, Mentor, List[str]], **kwargs
+    ) -> ReloadingClassifier:
+        with self.__lock:
+            classifier = ReloadingClassifier(
+                super().create(mentors, **kwargs), mentors, kwargs
+            )
+            self.__classifiers.add(classifier)
+        return classifier
+
+    def get_checkpoint(self) -> str:
+        return self.checkpoint
+
+    def check_for_update(self) -> bool:
+        """
+        Switches to the newest checkpoint if it's not the current one
+
+        Returns:
+            updated: (bool) true if a new checkpoint was swapped in
+        """
+        with self.__reload_lock:
+            newest = self.__find_newest_complete_checkpoint()
+            if not newest or os.path.basename(newest) <= os.path.basename(
+                self.checkpoint or ""
+            ):
+                return False
+            signature = _checkpoint_signature(newest)
+            if self.__failed_checkpoint == (newest, signature):
+                return False
+            logging.info(
+                f"loading new checkpoint {newest} to replace {self.checkpoint}"
+            )
+            with self.__lock:
+                classifiers = list(self.__classifiers)
+            try:
+                factory = create_classifier_factory(
+                    checkpoint_root=self.checkpoint_root,
+                    arch=self.arch,
+                    checkpoint=os.path.basename(newest),
+                )
+                replacements = []
+                for c in classifiers:
+                    replacement = factory.create(c.mentors, **c.kwargs)
+                    if self.warmup_questions:
+                        replacement.get_answers(
+                            self.warmup_questions, canned_question_match_disabled=True
+                        )
+                    replacements.append(replacement)
+            except BaseException as err:
+                logging.exception(f"failed to load new checkpoint {newest}: {err}")
+                self.__failed_checkpoint = (newest, signature)
+                return False
+            with self.__lock:
+                self.checkpoint_classifier_factory = (
+                    factory.checkpoint_classifier_factory
+                )
+                self.checkpoint = newest
+                for c, replacement in zip(classifiers, replacements):
+                    c.set_classifier(replacement)
+                # classifiers created while the new ones were loading are still on the old checkpoint
+                reloaded = set(classifiers)
+                stale = [c for c in self.__classifiers if c not in reloaded]
+            for c in stale:
+                c.set_classifier(super().create(c.mentors, **c.kwargs))
+            logging.info(
+                f"swapped in checkpoint {newest} for {len(classifiers) + len(stale)} classifier(s)"
+            )
+            return True
+
+    def __find_newest_complete_checkpoint(self) -> str:
+        index = find_checkpoint_index(self.checkpoint_root or CHECKPOINT_ROOT_DEFAULT)
+        arch = self.arch or ARCH_DEFAULT
+        for checkpoint in reversed(index.get_checkpoints(arch)):
+            cp = index.find_checkpoint(arch, checkpoint)
+            if cp and os.path.isfile(os.path.join(cp, MANIFEST_FILE_NAME)):
+                return cp
+        return None
+
+    def close(self) -> None:
+        self.__stopped.set()
+        if self.__thread:
+            self.__thread.join()
+
+    def __watch(self) -> None:
+        while not self.__stopped.wait(self.poll_interval):
+            try:
+                self.check_for_update()
+            except BaseException as err:
+                logging.exception(f"failed to check for a new checkpoint: {err}")
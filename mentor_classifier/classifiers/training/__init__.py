@@ -28,6 +28,13 @@ class ClassifierTraining(ABC):
     def save(self, to_path=None):
         pass
 
+    def get_report(self):
+        """
+        Returns:
+            report: (dict) arch-specific details of the last train() (e.g. whether it trained incrementally)
+        """
+        return {}
+
 
 class ClassifierTrainingFactory(ABC):
     """
@@ -36,19 +43,30 @@ class ClassifierTrainingFactory(ABC):
     """
 
     @abstractmethod
-    def create(self, checkpoint, mentors):
+    def create(self, checkpoint, mentors, **kwargs):
         """
         Creates a ClassifierTraining instance given a checkpoint and mentor[s]
 
         Args:
             checkpoint: (str) id for the checkpoint
             mentors: (str|mentor_classifier.mentor.Mentor|list of mentors/mentor ids) mentor[s] used in classifier
+            kwargs: arch-specific training options
 
         Returns:
             classifierTraining: (mentor_classifier.classifiers.training.ClassifierTraining)
         """
         pass
 
+    def prepare_checkpoint(self, checkpoint):
+        """
+        Writes whatever the mentors of a checkpoint share, once, before any of them is trained
+        (so that parallel training workers don't all write it at once)
+
+        Args:
+            checkpoint: (str) path of the checkpoint
+        """
+        pass
+
 
 _factories_by_arch = {}
 
@@ -0,0 +1,179 @@
+#
+# This software is Copyright ©️ 2020 The University of Southern California. All Rights Reserved.
+# Permission to use, copy, modify, and distribute this software and its documentation for educational, research and non-profit purposes, without fee, and without a written agreement is hereby granted, provided that the above copyright notice and subject to the full license file found in the root of this software deliverable. Permission to make commercial use of this software may be obtained by contacting:  USC Stevens Center for Innovation University of Southern California 1150 S. Olive Street, Suite 2300, Los Angeles, CA 90115, USA Email: accounting@stevens.usc.edu
+#
+# The full terms of this copyright and license should always be found in the root directory of this software deliverable as "license.txt" and if these terms are not found with this software, please contact the USC Stevens Center for the full license.
+#
+from hashlib import sha1
+import json
+import logging
+import os
+import sqlite3
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+FEATURE_STORE_MAX_BYTES_DEFAULT = 2 * 1024 * 1024 * 1024
+SEQUENCE_LENGTH_MAX = 25  # the lstm only sees the first 25 words
+
+"""
+Persistent store of question features (tokens, summed w2v vector and w2v sequence)
+so that training only featurizes questions it hasn't seen before
+"""
+
+
+Features = Tuple[List[str], np.ndarray, np.ndarray]
+
+
+class FeatureStore(object):
+    """
+    Content-addressed sqlite store of question features.
+    Entries are keyed by a hash of the question text and the preprocessor and embedding versions,
+    so identical questions share an entry and changing either version never returns stale features.
+    Once the store grows past max_bytes, flush() evicts the least recently used entries.
+
+    Args:
+        path: (str) path of the sqlite file
+        max_bytes: (int) size bound for stored features
+    """
+
+    def __init__(self, path: str, max_bytes: int = FEATURE_STORE_MAX_BYTES_DEFAULT):
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.__db = sqlite3.connect(path, timeout=60)
+        self.__db.execute(
+            "CREATE TABLE IF NOT EXISTS features ("
+            "key TEXT PRIMARY KEY, tokens TEXT, vector BLOB, sequence BLOB, "
+            "nbytes INTEGER, last_used REAL)"
+        )
+        self.__db.commit()
+        self.__used = set()
+        self.__added = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Features:
+        row = self.__db.execute(
+            "SELECT tokens, vector, sequence FROM features WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.__used.add(key)
+        tokens = json.loads(row[0])
+        vector = np.frombuffer(row[1], dtype="float32")
+        sequence = np.frombuffer(row[2], dtype="float32").reshape(-1, 300)
+        return tokens, vector, sequence
+
+    def put(self, key: str, features: Features) -> None:
+        self.__added[key] = features
+
+    def flush(self) -> None:
+        """
+        Writes added features, marks used ones as recently used and evicts if over max_bytes
+        """
+        now = time.time()
+        rows = []
+        for key, (tokens, vector, sequence) in self.__added.items():
+            vector_bytes = np.asarray(vector, dtype="float32").tobytes()
+            sequence_bytes = np.asarray(sequence, dtype="float32").tobytes()
+            tokens_json = json.dumps(tokens)
+            nbytes = (
+                len(key) + len(tokens_json) + len(vector_bytes) + len(sequence_bytes)
+            )
+            rows.append((key, tokens_json, vector_bytes, sequence_bytes, nbytes, now))
+        with self.__db:
+            self.__db.executemany(
+                "INSERT OR REPLACE INTO features VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+            self.__db.executemany(
+                "UPDATE features SET last_used = ? WHERE key = ?",
+                [(now, key) for key in self.__used],
+            )
+        self.__added = {}
+        self.__used = set()
+        self.__evict()
+
+    def close(self) -> None:
+        self.flush()
+        self.__db.close()
+
+    def get_stats(self) -> Dict[str, float]:
+        requests = self.hits + self.misses
+        return dict(
+            hits=self.hits,
+            misses=self.misses,
+            hit_rate=self.hits / requests if requests else 0.0,
+        )
+
+    def __evict(self) -> None:
+        total = self.__db.execute(
+            "SELECT COALESCE(SUM(nbytes), 0) FROM features"
+        ).fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evict_keys = []
+        for key, nbytes in self.__db.execute(
+            "SELECT key, nbytes FROM features ORDER BY last_used"
+        ):
+            if total <= self.max_bytes:
+                break
+            evict_keys.append((key,))
+            total -= nbytes
+        with self.__db:
+            self.__db.executemany("DELETE FROM features WHERE key = ?", evict_keys)
+        logging.info(
+            f"evicted {len(evict_keys)} entries from feature store {self.path}"
+        )
+
+
+class Featurizer(object):
+    """
+    Turns question text into (tokens, summed w2v vector, w2v sequence),
+    computing each distinct question only once and reusing features from an optional FeatureStore.
+
+    Args:
+        preprocessor: (mentor_classifier.nltk_preprocessor.NLTKPreprocessor)
+        w2v: (mentor_classifier.w2v.W2V)
+        store: (FeatureStore) persistent features, if any
+    """
+
+    def __init__(self, preprocessor, w2v, store: FeatureStore = None):
+        self.preprocessor = preprocessor
+        self.w2v = w2v
+        self.store = store
+        self.__version = f"{preprocessor.get_version()}\n{w2v.get_version()}\n"
+        self.__features_by_question = {}
+        self.duplicates = 0
+
+    def featurize(self, question: str) -> Features:
+        features = self.__features_by_question.get(question)
+        if features is not None:
+            self.duplicates += 1
+            return features
+        key = sha1(f"{self.__version}{question}".encode("utf-8")).hexdigest()
+        features = self.store.get(key) if self.store else None
+        if features is None:
+            tokens = self.preprocessor.transform(question)
+            vector, sequence = self.w2v.w2v_for_question(tokens)
+            sequence = (
+                np.asarray(sequence[:SEQUENCE_LENGTH_MAX], dtype="float32")
+                if sequence
+                else np.zeros((0, 300), dtype="float32")
+            )
+            features = (tokens, vector, sequence)
+            if self.store:
+                self.store.put(key, features)
+        self.__features_by_question[question] = features
+        return features
+
+    def get_stats(self) -> Dict[str, float]:
+        stats = dict(
+            questions=len(self.__features_by_question), duplicates=self.duplicates
+        )
+        if self.store:
+            stats.update(self.store.get_stats())
+        return stats
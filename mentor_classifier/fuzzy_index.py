@@ -0,0 +1,101 @@
+#
+# This software is Copyright ©️ 2020 The University of Southern California. All Rights Reserved.
+# Permission to use, copy, modify, and distribute this software and its documentation for educational, research and non-profit purposes, without fee, and without a written agreement is hereby granted, provided that the above copyright notice and subject to the full license file found in the root of this software deliverable. Permission to make commercial use of this software may be obtained by contacting:  USC Stevens Center for Innovation University of Southern California 1150 S. Olive Street, Suite 2300, Los Angeles, CA 90115, USA Email: accounting@stevens.usc.edu
+#
+# The full terms of this copyright and license should always be found in the root directory of this software deliverable as "license.txt" and if these terms are not found with this software, please contact the USC Stevens Center for the full license.
+#
+from array import array
+import sys
+from typing import Dict, Set, Tuple
+
+NGRAM_SIZE_DEFAULT = 3
+
+"""
+Approximate matching of questions to canned questions by the Jaccard similarity of their character n-grams,
+so that a question that's only a typo or two away from a canned question can get the canned answer
+"""
+
+
+def char_ngrams(s: str, n: int = NGRAM_SIZE_DEFAULT) -> Set[str]:
+    s = f" {' '.join(s.split())} "
+    return {s[i : i + n] for i in range(len(s) - n + 1)}
+
+
+class FuzzyQuestionIndex(object):
+    """
+    An inverted index from character n-gram to the canned questions that contain it.
+
+    Args:
+        answer_ids_by_question: (dict) answer id by sanitized question (e.g. Mentor.question_ids)
+        n: (int) n-gram size
+    """
+
+    def __init__(
+        self, answer_ids_by_question: Dict[str, str], n: int = NGRAM_SIZE_DEFAULT
+    ):
+        self.n = n
+        self.__answer_ids = []
+        self.__ngram_counts = []
+        postings = {}
+        for question, answer_id in answer_ids_by_question.items():
+            ngrams = char_ngrams(question, n)
+            if not ngrams:
+                continue
+            i = len(self.__answer_ids)
+            self.__answer_ids.append(answer_id)
+            self.__ngram_counts.append(len(ngrams))
+            for ngram in ngrams:
+                postings.setdefault(ngram, []).append(i)
+        self.__postings = {ngram: array("I", ids) for ngram, ids in postings.items()}
+
+    def __len__(self):
+        return len(self.__answer_ids)
+
+    def estimate_memory_bytes(self) -> int:
+        """
+        Rough estimate of the memory held by the index (the answer ids are shared with the mentor)
+        """
+        n_bytes = sys.getsizeof(self.__postings) + sys.getsizeof(self.__answer_ids)
+        n_bytes += sys.getsizeof(self.__ngram_counts)
+        n_bytes += sum(
+            sys.getsizeof(ngram) + sys.getsizeof(ids)
+            for ngram, ids in self.__postings.items()
+        )
+        return n_bytes
+
+    def find(self, question: str, threshold: float) -> Tuple[str, float]:
+        """
+        Finds the canned question most similar to a (sanitized) question
+
+        Args:
+            question: (str) sanitized question (see mentor_classifier.utils.sanitize_string)
+            threshold: (float) min Jaccard similarity (0-1] of n-grams for a match
+
+        Returns:
+            match: (tuple) answer id and similarity of the most similar canned question,
+                or None if none is at least threshold similar
+                or the most similar ones have different answers
+        """
+        ngrams = char_ngrams(question, self.n)
+        if not ngrams:
+            return None
+        shared_by_question = {}
+        for ngram in ngrams:
+            for i in self.__postings.get(ngram, ()):
+                shared_by_question[i] = shared_by_question.get(i, 0) + 1
+        # similarity is at most shared / len(ngrams)
+        min_shared = threshold * len(ngrams)
+        best_similarity = 0.0
+        best_answer_ids = set()
+        for i, shared in shared_by_question.items():
+            if shared < min_shared:
+                continue
+            similarity = shared / (len(ngrams) + self.__ngram_counts[i] - shared)
+            if similarity > best_similarity:
+                best_similarity = similarity
+                best_answer_ids = {self.__answer_ids[i]}
+            elif similarity == best_similarity:
+                best_answer_ids.add(self.__answer_ids[i])
+        if best_similarity < threshold or len(best_answer_ids) != 1:
+            return None
+        return best_answer_ids.pop(), best_similarity
@@ -0,0 +1,156 @@
+#
+# This software is Copyright ©️ 2020 The University of Southern California. All Rights Reserved.
+# Permission to use, copy, modify, and distribute this software and its documentation for educational, research and non-profit purposes, without fee, and without a written agreement is hereby granted, provided that the above copyright notice and subject to the full license file found in the root of this software deliverable. Permission to make commercial use of this software may be obtained by contacting:  USC Stevens Center for Innovation University of Southern California 1150 S. Olive Street, Suite 2300, Los Angeles, CA 90115, USA Email: accounting@stevens.usc.edu
+#
+# The full terms of this copyright and license should always be found in the root directory of this software deliverable as "license.txt" and if these terms are not found with this software, please contact the USC Stevens Center for the full license.
+#
+"""
+Opt-in instrumentation of classifier inference: classifiers report the duration of each stage
+and counts of notable events to an InferenceObserver, and do no timing at all without one
+"""
+from bisect import bisect_left
+from threading import Lock
+from typing import Any, Dict, List
+
+# upper bounds (ms) of histogram buckets, roughly doubling from 10µs to ~20s, then +inf
+BUCKET_BOUNDS_MS = [0.01 * 2 ** i for i in range(22)]
+
+
+class InferenceObserver(object):
+    """
+    Receives stage durations and counts from a classifier (e.g. LSTMClassifier).
+    Methods may be called from several threads at once
+    """
+
+    def on_stage(self, stage: str, seconds: float, n: int = 1) -> None:
+        """
+        Args:
+            stage: (str) name of the stage (e.g. 'preprocess', 'topic_model')
+            seconds: (float) duration of the stage
+            n: (int) number of questions the stage ran for (stages may run for a batch at once)
+        """
+        pass
+
+    def on_count(self, name: str, n: int = 1) -> None:
+        """
+        Args:
+            name: (str) name of the counter (e.g. 'canned_hits', 'oov_tokens')
+            n: (int) amount to add
+        """
+        pass
+
+
+class Histogram(object):
+    """
+    Counts of durations in fixed, roughly doubling, buckets (see BUCKET_BOUNDS_MS)
+    """
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+        self.count = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, ms: float) -> None:
+        self.counts[bisect_left(BUCKET_BOUNDS_MS, ms)] += 1
+        self.count += 1
+        self.sum_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, p: float) -> float:
+        """
+        Returns:
+            ms: (float) upper bound of the bucket holding the p-th percentile (capped at max_ms)
+        """
+        if not self.count:
+            return 0.0
+        rank = p / 100 * self.count
+        seen = 0
+        for bound, count in zip(BUCKET_BOUNDS_MS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+    def snapshot(self) -> Dict[str, Any]:
+        return dict(
+            count=self.count,
+            sum_ms=self.sum_ms,
+            max_ms=self.max_ms,
+            p50_ms=self.percentile(50),
+            p95_ms=self.percentile(95),
+            p99_ms=self.percentile(99),
+            buckets={
+                str(bound): count
+                for bound, count in zip(BUCKET_BOUNDS_MS + ["+Inf"], self.counts)
+                if count
+            },
+        )
+
+
+class MetricsObserver(InferenceObserver):
+    """
+    An InferenceObserver that keeps a duration histogram per stage (per call, not per question)
+    and a total per counter, to be scraped with snapshot()
+    """
+
+    def __init__(self):
+        self.__lock = Lock()
+        self.__histograms = {}
+        self.__counters = {}
+
+    def on_stage(self, stage: str, seconds: float, n: int = 1) -> None:
+        with self.__lock:
+            histogram = self.__histograms.get(stage)
+            if histogram is None:
+                histogram = self.__histograms[stage] = Histogram()
+            histogram.record(seconds * 1000)
+            self.__counters[f"{stage}_questions"] = (
+                self.__counters.get(f"{stage}_questions", 0) + n
+            )
+
+    def on_count(self, name: str, n: int = 1) -> None:
+        with self.__lock:
+            self.__counters[name] = self.__counters.get(name, 0) + n
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Returns:
+            snapshot: (dict) 'stages' (histogram snapshot by stage) and 'counters' (total by name)
+        """
+        with self.__lock:
+            return dict(
+                stages={s: h.snapshot() for s, h in self.__histograms.items()},
+                counters=dict(self.__counters),
+            )
+
+    def reset(self) -> Dict[str, Any]:
+        """
+        Returns:
+            snapshot: (dict) the snapshot from just before the reset
+        """
+        with self.__lock:
+            snapshot = dict(
+                stages={s: h.snapshot() for s, h in self.__histograms.items()},
+                counters=dict(self.__counters),
+            )
+            self.__histograms = {}
+            self.__counters = {}
+        return snapshot
+
+
+class MultiObserver(InferenceObserver):
+    """
+    Passes everything on to several observers
+    """
+
+    def __init__(self, observers: List[InferenceObserver]):
+        self.observers = observers
+
+    def on_stage(self, stage: str, seconds: float, n: int = 1) -> None:
+        for o in self.observers:
+            o.on_stage(stage, seconds, n)
+
+    def on_count(self, name: str, n: int = 1) -> None:
+        for o in self.observers:
+            o.on_count(name, n)
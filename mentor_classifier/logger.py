@@ -4,9 +4,301 @@
 #
 # The full terms of this copyright and license should always be found in the root directory of this software deliverable as "license.txt" and if these terms are not found with this software, please contact the USC Stevens Center for the full license.
 #
-import os
+import atexit
 import csv
 from datetime import datetime
+import io
+import logging
+import os
+import queue
+from threading import Lock, Thread
+import time
+
+QUESTION_ANSWER_LOG_PATH = "QuestionAnswerLog.csv"
+QUESTION_ANSWER_LOG_HEADER = [
+    "UserID",
+    "SessionID",
+    "MentorID",
+    "Question",
+    "NPC Answer",
+    "Classifier Answer",
+    "Final Chosen Answer",
+    "Final Video ID",
+    "NPC Editor Confidence",
+    "Classifier Confidence",
+    "Time",
+]
+_CLOSE = object()
+
+
+def _to_csv(row, **fmtparams) -> str:
+    f = io.StringIO()
+    csv.writer(f, **fmtparams).writerow(row)
+    return f.getvalue()
+
+
+class BufferedLogWriter(object):
+    """
+    Appends lines to a log file from a background thread, so that callers never wait on file I/O.
+    Lines are written in batches and flushed at least every flush_interval seconds.
+    The file is rotated (renamed with a timestamp suffix, and a new one started with the header)
+    once it's bigger than rotate_bytes or older than rotate_interval, always between whole lines
+    (a write that doesn't end with a newline is continued by the next one, in the same file).
+    Everything queued is written when the writer is closed, which happens automatically at exit.
+
+    Args:
+        path: (str) path of the log file
+        header: (str) written at the start of every new file
+        max_queue_size: (int) max lines waiting to be written
+        block: (bool) when the queue is full, if true, wait up to block_timeout seconds for room (backpressure).
+            Lines that still don't fit are dropped and counted
+        block_timeout: (float)
+        flush_interval: (float) max seconds between flushes
+        batch_size: (int) max lines per write
+        rotate_bytes: (int) rotate once the file is at least this big
+        rotate_interval: (float) rotate once the file is at least this many seconds old
+    """
+
+    def __init__(
+        self,
+        path: str,
+        header: str = "",
+        max_queue_size: int = 10000,
+        block: bool = False,
+        block_timeout: float = 1.0,
+        flush_interval: float = 1.0,
+        batch_size: int = 500,
+        rotate_bytes: int = None,
+        rotate_interval: float = None,
+    ):
+        self.path = path
+        self.header = header
+        self.block = block
+        self.block_timeout = block_timeout
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.rotate_bytes = rotate_bytes
+        self.rotate_interval = rotate_interval
+        self.__queue = queue.Queue(maxsize=max_queue_size)
+        self.__stats_lock = Lock()
+        self.__stats = dict(written=0, dropped=0, rotations=0)
+        self.__closed = False
+        self.__file = None
+        self.__opened_at = None
+        self.__at_line_start = True
+        self.__thread = Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+        atexit.register(self.close)
+
+    def write(self, line: str) -> bool:
+        """
+        Queues a line to be written
+
+        Args:
+            line: (str) text, usually ending in a line terminator
+
+        Returns:
+            queued: (bool) false if the line was dropped because the queue is full or the writer is closed
+        """
+        if self.__closed:
+            return self.__drop()
+        try:
+            if self.block:
+                self.__queue.put(line, timeout=self.block_timeout)
+            else:
+                self.__queue.put_nowait(line)
+        except queue.Full:
+            return self.__drop()
+        # closed after the check above: close drains the queue once the writer thread stops,
+        # so a line queued after that is only dropped (and counted) here
+        if self.__closed and not self.__thread.is_alive():
+            self.__drain()
+        return True
+
+    def flush(self, timeout: float = None) -> None:
+        """
+        Waits until everything queued so far is written and flushed.
+        Returns immediately once the writer is closed (close writes everything queued)
+
+        Raises:
+            queue.Empty: if not flushed within timeout seconds (including waiting for room in a full queue)
+        """
+        if self.__closed:
+            return
+        done = queue.Queue()
+        queued = False
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            wait = 0.1 if deadline is None else min(0.1, deadline - time.time())
+            try:
+                if not queued:
+                    self.__queue.put(done, timeout=max(wait, 0))
+                    queued = True
+                    continue
+                done.get(timeout=max(wait, 0))
+                return
+            except (queue.Empty, queue.Full) as err:
+                # closed while waiting: the writer thread may have stopped before reaching done
+                if not self.__thread.is_alive():
+                    return
+                if deadline is not None and time.time() >= deadline:
+                    raise queue.Empty(
+                        f"failed to flush {self.path} within {timeout} seconds"
+                    ) from err
+
+    def close(self) -> None:
+        if self.__closed:
+            return
+        self.__closed = True
+        self.__queue.put(_CLOSE)
+        self.__thread.join()
+        self.__drain()
+        try:
+            atexit.unregister(self.close)
+        except Exception:
+            pass
+
+    def get_stats(self):
+        """
+        Returns:
+            stats: (dict) lines written and dropped, rotations and lines queued
+        """
+        with self.__stats_lock:
+            return dict(self.__stats, queued=self.__queue.qsize())
+
+    def __drop(self) -> bool:
+        with self.__stats_lock:
+            self.__stats["dropped"] += 1
+        return False
+
+    def __drain(self) -> None:
+        # whatever is still queued once the writer thread has stopped is never written
+        while True:
+            try:
+                item = self.__queue.get_nowait()
+            except queue.Empty:
+                return
+            if isinstance(item, queue.Queue):
+                item.put(True)
+            elif item is not _CLOSE:
+                self.__drop()
+
+    def __run(self) -> None:
+        closing = False
+        while not closing:
+            try:
+                batch = [self.__queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.__queue.get_nowait())
+                except queue.Empty:
+                    break
+            lines = []
+            waiting = []
+            for item in batch:
+                if item is _CLOSE:
+                    closing = True
+                elif isinstance(item, queue.Queue):
+                    waiting.append(item)
+                else:
+                    lines.append(item)
+            try:
+                self.__write_lines(lines)
+            except BaseException as err:
+                logging.error(
+                    f"failed to write {len(lines)} lines to {self.path}: {err}"
+                )
+                with self.__stats_lock:
+                    self.__stats["dropped"] += len(lines)
+            for done in waiting:
+                done.put(True)
+        if self.__file:
+            self.__file.close()
+            self.__file = None
+
+    def __write_lines(self, lines) -> None:
+        if self.__file is None:
+            self.__open()
+        for line in lines:
+            if self.__should_rotate():
+                self.__rotate()
+            self.__file.write(line)
+            if line:
+                self.__at_line_start = line.endswith("\n")
+        self.__file.flush()
+        with self.__stats_lock:
+            self.__stats["written"] += len(lines)
+
+    def __open(self) -> None:
+        self.__file = open(self.path, "a", newline="")
+        if self.__file.tell() == 0:
+            self.__file.write(self.header)
+        self.__opened_at = time.time()
+
+    def __should_rotate(self) -> bool:
+        return self.__at_line_start and (
+            (
+                self.rotate_bytes is not None
+                and self.__file.tell() >= self.rotate_bytes
+                and self.__file.tell() > len(self.header)
+            )
+            or (
+                self.rotate_interval is not None
+                and time.time() - self.__opened_at >= self.rotate_interval
+            )
+        )
+
+    def __rotate(self) -> None:
+        self.__file.close()
+        base, ext = os.path.splitext(self.path)
+        suffix = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        os.replace(self.path, f"{base}.{suffix}{ext}")
+        with self.__stats_lock:
+            self.__stats["rotations"] += 1
+        self.__open()
+
+
+_question_answer_log = None
+_question_answer_log_lock = Lock()
+
+
+def find_question_answer_log() -> BufferedLogWriter:
+    """
+        Finds the writer for QuestionAnswerLog.csv shared by the whole process, started on first use.
+        Rotation can be configured with env QUESTION_ANSWER_LOG_ROTATE_BYTES and QUESTION_ANSWER_LOG_ROTATE_SECONDS
+
+        Returns:
+            writer: (mentor_classifier.logger.BufferedLogWriter)
+    """
+    global _question_answer_log
+    with _question_answer_log_lock:
+        if _question_answer_log is None:
+            rotate_bytes = os.getenv("QUESTION_ANSWER_LOG_ROTATE_BYTES")
+            rotate_seconds = os.getenv("QUESTION_ANSWER_LOG_ROTATE_SECONDS")
+            _question_answer_log = BufferedLogWriter(
+                QUESTION_ANSWER_LOG_PATH,
+                header=_to_csv(QUESTION_ANSWER_LOG_HEADER),
+                rotate_bytes=int(rotate_bytes) if rotate_bytes else None,
+                rotate_interval=float(rotate_seconds) if rotate_seconds else None,
+            )
+        return _question_answer_log
+
+
+def set_question_answer_log(writer: BufferedLogWriter) -> BufferedLogWriter:
+    """
+        Replaces the writer used by Logger (e.g. to log somewhere else or with other options)
+
+        Returns:
+            previous: (mentor_classifier.logger.BufferedLogWriter) the replaced writer, or None.
+                It's up to the caller to close it
+    """
+    global _question_answer_log
+    with _question_answer_log_lock:
+        previous = _question_answer_log
+        _question_answer_log = writer
+        return previous
 
 
 class Logger(object):
@@ -17,33 +309,17 @@ class Logger(object):
 
     @staticmethod
     def logUserID(ID, uID):
-        if not os.path.isfile("QuestionAnswerLog.csv"):
-            with open("QuestionAnswerLog.csv", "a", newline="") as log:
-                logWriter = csv.writer(log, delimiter=",", quotechar='"')
-                logWriter.writerow(
-                    [
-                        "UserID",
-                        "SessionID",
-                        "MentorID",
-                        "Question",
-                        "NPC Answer",
-                        "Classifier Answer",
-                        "Final Chosen Answer",
-                        "Final Video ID",
-                        "NPC Editor Confidence",
-                        "Classifier Confidence",
-                        "Time",
-                    ]
-                )
-        with open("QuestionAnswerLog.csv", "a", newline="") as log:
-            logWriter = csv.writer(
-                log,
+        # starts the line that the next logData finishes, as it always has
+        find_question_answer_log().write(
+            _to_csv(
+                [ID, uID],
                 delimiter=",",
                 quotechar="|",
                 quoting=csv.QUOTE_MINIMAL,
-                lineterminator=",",
-            )  # this keeps the rest open for
-            logWriter.writerow([ID, uID])
+                lineterminator="",
+            )
+            + ","
+        )
 
     @staticmethod
     def logData(
@@ -56,9 +332,8 @@ class Logger(object):
         npcConfidence,
         classifierConfidence,
     ):
-        with open("QuestionAnswerLog.csv", "a", newline="") as log:
-            logWriter = csv.writer(log, delimiter=",", quotechar='"')
-            logWriter.writerow(
+        find_question_answer_log().write(
+            _to_csv(
                 [
                     mentor.id,
                     question,
@@ -69,5 +344,8 @@ class Logger(object):
                     npcConfidence,
                     classifierConfidence,
                     datetime.now(),
-                ]
+                ],
+                delimiter=",",
+                quotechar='"',
             )
+        )
@@ -5,12 +5,15 @@
 # The full terms of this copyright and license should always be found in the root directory of this software deliverable as "license.txt" and if these terms are not found with this software, please contact the USC Stevens Center for the full license.
 #
 import csv
+from hashlib import sha1
 import logging
 import os
+import pickle
 import re
+import sys
+import uuid
 from typing import Any, Dict, List
 
-import pandas as pd
 from yaml import load
 
 try:
@@ -18,8 +21,35 @@ try:
 except ImportError:
     from yaml import Loader
 
+from mentor_classifier.fuzzy_index import FuzzyQuestionIndex
 from mentor_classifier.utils import normalize_topics, sanitize_string
 
+CLASSIFIER_DATA_COLUMNS = ["ID", "topics", "text", "question"]
+UTTERANCE_DATA_COLUMNS = ["ID", "utterance", "situation"]
+SNAPSHOT_SOURCE_FILES = [
+    "profile.yml",
+    "topics.csv",
+    "utterance_data.csv",
+    "classifier_data.csv",
+]
+# bump whenever a change to load would change the loaded state
+SNAPSHOT_VERSION = 4
+SNAPSHOT_ATTRS = [
+    "name",
+    "short_name",
+    "title",
+    "topics",
+    "topics_by_id",
+    "topic_id_by_question_topic_id",
+    "use_question_topics",
+    "utterances_by_type",
+    "suggestions",
+    "ids_answers",
+    "answer_ids",
+    "ids_questions",
+    "question_ids",
+    "questions_by_id",
+]
 STRIP_TOPICS = [
     "navy",
     "positive",
@@ -27,6 +57,15 @@ STRIP_TOPICS = [
 ]  # TODO: this should NOT be hardcoded in this class
 
 
+def _read_csv_columns(path: str, columns: List[str]) -> Dict[str, List[Any]]:
+    import pandas as pd
+
+    # dtypes are inferred (and missing values are ""), as when training reads the same csv,
+    # so e.g. numeric ids are the same numpy values a row of the DataFrame would have
+    data = pd.read_csv(path, usecols=columns).fillna("")
+    return {c: list(data[c].to_numpy()) for c in columns}
+
+
 def _add_question_to_list(question_id: str, questions: List[str]) -> List[str]:
     questions = questions or []
     questions.append(question_id)
@@ -98,11 +137,28 @@ class MentorRootNotFoundError(MentorError):
 
 
 class Mentor(object):
-    def __init__(self, id, mentor_data_root=None, topic_name_default="About Me"):
+    """
+    Args:
+        id: (str)
+        mentor_data_root: (str) directory containing a ${id}/data directory for each mentor
+        topic_name_default: (str) topic for questions with no mapped topic
+        snapshot_root: (str) if set, directory to save a snapshot of the loaded mentor to
+            and to load it from (a single file read) while the mentor data is unchanged.
+            Defaults to env MENTOR_SNAPSHOT_ROOT
+    """
+
+    def __init__(
+        self,
+        id,
+        mentor_data_root=None,
+        topic_name_default="About Me",
+        snapshot_root=None,
+    ):
         self.id = id
         self.__mentor_data_root = os.path.join(
             mentor_data_root or "mentors", self.id, "data"
         )
+        self.__snapshot_root = snapshot_root or os.getenv("MENTOR_SNAPSHOT_ROOT")
         logging.info(
             f"initializing mentor {id} with data root {os.path.abspath(self.mentor_data_path())}"
         )
@@ -121,7 +177,25 @@ class Mentor(object):
         self.question_ids = {}
         self.questions_by_id = {}
         self.topic_id_by_question_topic_id = {}
-        self.load()
+        self.use_question_topics = False
+        self.__fuzzy_index = None
+        if self.__snapshot_root and os.path.isdir(self.mentor_data_path()):
+            self.__load_with_snapshot()
+        else:
+            self.load()
+
+    def get_fuzzy_index(self) -> FuzzyQuestionIndex:
+        """
+        Index for questions that are close to, but not exactly, a canned question,
+        built on first use since fuzzy matching is off by default
+
+        Returns:
+            index: (mentor_classifier.fuzzy_index.FuzzyQuestionIndex)
+        """
+        # concurrent first calls may each build an index, but they're identical and one wins
+        if self.__fuzzy_index is None:
+            self.__fuzzy_index = FuzzyQuestionIndex(self.question_ids)
+        return self.__fuzzy_index
 
     def find_id_for_answer_text(self, answer_text: str) -> str:
         return self.answer_ids.get(answer_text)
@@ -129,6 +203,22 @@ class Mentor(object):
     def get_id(self):
         return self.id
 
+    def estimate_memory_bytes(self) -> int:
+        """
+        Rough estimate of the memory held by the loaded questions, answers and ids
+        """
+        n_bytes = 0
+        for d in (self.ids_answers, self.answer_ids, self.question_ids):
+            n_bytes += sys.getsizeof(d)
+            n_bytes += sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in d.items())
+        for questions in self.ids_questions.values():
+            n_bytes += sum(sys.getsizeof(q) for q in questions)
+        for suggestions in self.suggestions.values():
+            n_bytes += sum(sys.getsizeof(s[0]) for s in suggestions)
+        if self.__fuzzy_index is not None:
+            n_bytes += self.__fuzzy_index.estimate_memory_bytes()
+        return n_bytes
+
     def mentor_data_path(self, p=None):
         return (
             os.path.join(self.__mentor_data_root, p) if p else self.__mentor_data_root
@@ -146,14 +236,108 @@ class Mentor(object):
             self.topic_id_by_question_topic_id,
         ) = self.load_topics()
         self.utterances_by_type = self.load_utterances()
-        self.suggestions = self.load_suggestions()
+        classifier_data = self.load_classifier_data()
+        self.suggestions = self.load_suggestions(classifier_data)
         (
             self.ids_answers,
             self.answer_ids,
             self.ids_questions,
             self.question_ids,
             self.questions_by_id,
-        ) = self.load_ids_answers()
+        ) = self.load_ids_answers(classifier_data)
+        self.__fuzzy_index = None
+
+    def snapshot_path(self) -> str:
+        root_hash = sha1(
+            os.path.abspath(self.mentor_data_path()).encode("utf-8")
+        ).hexdigest()[:12]
+        return os.path.join(self.__snapshot_root, f"{self.id}-{root_hash}.pkl")
+
+    def __source_stats(self) -> List[Any]:
+        stats = []
+        for f in SNAPSHOT_SOURCE_FILES:
+            try:
+                st = os.stat(self.mentor_data_path(f))
+                stats.append((f, st.st_size, st.st_mtime_ns))
+            except OSError:
+                stats.append((f, None, None))
+        return stats
+
+    def __source_hash(self) -> str:
+        h = sha1(f"{SNAPSHOT_VERSION}\n{self.topic_name_default}\n".encode("utf-8"))
+        for f in SNAPSHOT_SOURCE_FILES:
+            h.update(f"{f}\n".encode("utf-8"))
+            try:
+                with open(self.mentor_data_path(f), "rb") as source:
+                    h.update(source.read())
+            except OSError:
+                h.update(b"\0missing\0")
+        return h.hexdigest()
+
+    def __read_snapshot(self) -> Dict[str, Any]:
+        try:
+            with open(self.snapshot_path(), "rb") as f:
+                snapshot = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except BaseException as err:
+            logging.warning(f"failed to read snapshot for {self.id}: {err}")
+            return None
+        if (
+            snapshot.get("version") != SNAPSHOT_VERSION
+            or snapshot.get("topic_name_default") != self.topic_name_default
+        ):
+            return None
+        return snapshot
+
+    def __load_with_snapshot(self) -> None:
+        """
+        Loads the mentor from its snapshot if the snapshot was saved from the current mentor data:
+        either with the same size and mtime for every source file (so they aren't even read)
+        or, failing that, with the same hash of their contents (then resaves the snapshot with the new stats).
+        Otherwise loads the mentor data and saves a new snapshot
+        """
+        stats = self.__source_stats()
+        snapshot = self.__read_snapshot()
+        if snapshot and snapshot["stats"] == stats:
+            self.__set_state(snapshot["state"])
+            return
+        # stats and hash are taken before loading, so a concurrent edit leaves the snapshot stale, never wrong
+        source_hash = self.__source_hash()
+        if snapshot and snapshot["hash"] == source_hash:
+            self.__set_state(snapshot["state"])
+            snapshot.update(stats=stats)
+            self.__write_snapshot(snapshot)
+            return
+        self.load()
+        self.__write_snapshot(
+            dict(
+                version=SNAPSHOT_VERSION,
+                topic_name_default=self.topic_name_default,
+                stats=stats,
+                hash=source_hash,
+                state={attr: getattr(self, attr) for attr in SNAPSHOT_ATTRS},
+            )
+        )
+
+    def __set_state(self, state: Dict[str, Any]) -> None:
+        for attr in SNAPSHOT_ATTRS:
+            setattr(self, attr, state[attr])
+
+    def __write_snapshot(self, snapshot: Dict[str, Any]) -> None:
+        path = self.snapshot_path()
+        # write to a unique tmp file and rename into place,
+        # so concurrent writers never leave (or read) a partial snapshot
+        tmp_path = f"{path}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+        try:
+            os.makedirs(self.__snapshot_root, exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except OSError as err:
+            logging.warning(f"failed to save snapshot for {self.id}: {err}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
 
     def __load_profile(self) -> (str, str, str):
         try:
@@ -198,21 +382,31 @@ class Mentor(object):
             logging.warning(f"failed to load topics for {self.id}: {err}")
         return topics, topics_by_id, topic_id_by_question_topic_id
 
+    def load_classifier_data(self) -> Dict[str, List[Any]]:
+        """
+        Reads classifier_data.csv, once for both load_suggestions and load_ids_answers
+
+        Returns:
+            columns: (dict) list of values for each of the columns ID, topics, text and question
+        """
+        return _read_csv_columns(
+            self.mentor_data_path("classifier_data.csv"), CLASSIFIER_DATA_COLUMNS
+        )
+
     def load_utterances(self):
         utterances_by_type = {}
         try:
-            utterance_df = pd.read_csv(
-                open(self.mentor_data_path("utterance_data.csv"), "rb")
+            utterance_data = _read_csv_columns(
+                self.mentor_data_path("utterance_data.csv"), UTTERANCE_DATA_COLUMNS
             )
-            corpus = utterance_df.fillna("")
-            for i in range(len(corpus)):
-                situation = corpus.iloc[i]["situation"]
-                video_name = corpus.iloc[i]["ID"]
-                utterance = corpus.iloc[i]["utterance"]
-                if situation in utterances_by_type:
-                    utterances_by_type[situation].append((video_name, utterance))
-                else:
-                    utterances_by_type[situation] = [(video_name, utterance)]
+            for situation, video_name, utterance in zip(
+                utterance_data["situation"],
+                utterance_data["ID"],
+                utterance_data["utterance"],
+            ):
+                utterances_by_type.setdefault(situation, []).append(
+                    (video_name, utterance)
+                )
             return utterances_by_type
         except BaseException as err:
             logging.warning(f"failed to load utterances for {self.id}: {str(err)}")
@@ -226,58 +420,50 @@ class Mentor(object):
             "_PROFANITY_": ["profanity"],
         }
 
-    def load_suggestions(self):
+    def load_suggestions(self, classifier_data: Dict[str, List[Any]] = None):
+        classifier_data = classifier_data or self.load_classifier_data()
         suggestions = {}
-        classifier_data = pd.read_csv(self.mentor_data_path("classifier_data.csv"))
-        corpus = classifier_data.fillna("")
-        for i in range(0, len(corpus)):
-            topics = corpus.iloc[i]["topics"].split(",")
-            topics = [_f for _f in topics if _f]
+        for topics_csv, question_csv, answer, answer_id in zip(
+            classifier_data["topics"],
+            classifier_data["question"],
+            classifier_data["text"],
+            classifier_data["ID"],
+        ):
             # normalize the topics
-            topics = normalize_topics(topics)
-            questions = corpus.iloc[i]["question"].split("\n")
-            questions = [_f for _f in questions if _f]
-            answer = corpus.iloc[i]["text"]
-            answer_id = corpus.iloc[i]["ID"]
+            topics = normalize_topics([_f for _f in topics_csv.split(",") if _f])
             # remove nbsp and \"
             answer = answer.replace("\u00a0", " ")
-            for question in questions:
+            for question in question_csv.split("\n"):
+                if not question:
+                    continue
                 for topic in topics:
-                    if topic != "Navy" or topic != "Positive" or topic != "Negative":
-                        if topic in suggestions:
-                            suggestions[topic].append((question, answer, answer_id))
-                        else:
-                            suggestions[topic] = [(question, answer, answer_id)]
+                    suggestions.setdefault(topic, []).append(
+                        (question, answer, answer_id)
+                    )
         return suggestions
 
-    def load_ids_answers(self):
-        classifier_data = pd.read_csv(self.mentor_data_path("classifier_data.csv"))
-        corpus = classifier_data.fillna("")
-        answer_ids = {}
-        ids_answers = {}
+    def load_ids_answers(self, classifier_data: Dict[str, List[Any]] = None):
+        classifier_data = classifier_data or self.load_classifier_data()
+        ids = classifier_data["ID"]
+        answers = [a.replace("\u00a0", " ") for a in classifier_data["text"]]
+        questions_by_row = [q.split("\n") for q in classifier_data["question"]]
+        answer_ids = dict(zip(answers, ids))
+        ids_answers = dict(zip(ids, answers))
+        ids_questions = dict(zip(ids, questions_by_row))
         question_ids = {}
-        ids_questions = {}
         questions_by_id = {}
-        for i in range(0, len(corpus)):
-            id = corpus.iloc[i]["ID"]
-            answer = corpus.iloc[i]["text"]
-            topics_csv = corpus.iloc[i]["topics"]
-            answer = answer.replace("\u00a0", " ")
-            answer_ids[answer] = id
-            ids_answers[id] = answer
-            questions = corpus.iloc[i]["question"].split("\n")
-            for i, question in enumerate(questions):
+        for id, questions in zip(ids, questions_by_row):
+            for question in questions:
                 question_ids[sanitize_string(question)] = id
-                if i == 0:
-                    questions_by_id[id] = {"question_text": question}
-                _add_question_to_topics(
-                    id,
-                    topics_csv,
-                    self.topics_by_id,
-                    self.topic_id_default,
-                    topic_id_by_question_topic_id=self.topic_id_by_question_topic_id,
-                )
-            ids_questions[id] = questions
+            questions_by_id[id] = {"question_text": questions[0]}
+        for id, topics_csv in zip(ids, classifier_data["topics"]):
+            _add_question_to_topics(
+                id,
+                topics_csv,
+                self.topics_by_id,
+                self.topic_id_default,
+                topic_id_by_question_topic_id=self.topic_id_by_question_topic_id,
+            )
         for tid in [k for k in self.topics_by_id.keys()]:
             topic = self.topics_by_id[tid]
             if not topic["questions"] or len(topic["questions"]) == 0:
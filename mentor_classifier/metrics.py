@@ -6,9 +6,64 @@
 #
 import csv
 import os
+from threading import Lock
+import time
+from typing import Dict, List
+
+import numpy as np
 
 from mentor_classifier.utils import sanitize_string
 
+EVALUATE_BATCH_SIZE_DEFAULT = 32
+
+_test_sets = {}
+_test_sets_lock = Lock()
+
+
+def read_test_set(path: str, num: int = None) -> Dict[str, List[str]]:
+    """
+    Reads a test set: a 2D matrix of user questions (columns from the 3rd on)
+    vs answers (rows from the 2nd on, answer text in the 2nd column)
+    where 'i' (ideal) or 'r' (reasonable) marks the answers that are correct for a question.
+    Cached for the process until the file changes.
+
+    Args:
+        path: (str) path of the test set csv
+        num: (int) max number of user questions to read (default is all of them)
+
+    Returns:
+        user_questions: (dict) sanitized correct answers by sanitized user question
+    """
+    st = os.stat(path)
+    key = (os.path.abspath(path), num)
+    with _test_sets_lock:
+        cached = _test_sets.get(key)
+    if cached and cached[0] == (st.st_size, st.st_mtime_ns):
+        return cached[1]
+    with open(path) as f:
+        test_data = list(csv.reader(f))
+    numcols = len(test_data[0])
+    # number of questions to ask (default is all of them)
+    if num is None or num > numcols - 2:
+        num = numcols - 2
+    # sanitize each answer once, not once per user question
+    answers = [sanitize_string(row[1]) for row in test_data[1:]]
+    user_questions = {}
+    for c in range(2, num + 2):
+        user_question = sanitize_string(test_data[0][c])
+        # get ideal and reasonable matches for user questions
+        for row, answer in zip(test_data[1:], answers):
+            match = row[c]
+            if match and sanitize_string(match) in ("i", "r"):
+                user_questions.setdefault(user_question, []).append(answer)
+    with _test_sets_lock:
+        _test_sets[key] = ((st.st_size, st.st_mtime_ns), user_questions)
+    return user_questions
+
+
+def get_test_set_path(mentor_id: str, test_file: str) -> str:
+    return os.path.join("checkpoint", "tests", mentor_id, test_file)
+
 
 class Metrics:
 
@@ -59,66 +114,79 @@ class Metrics:
     """
 
     def test_accuracy(self, classifier, test_file, num=None):
-        mentor = classifier.mentor
-        path = os.path.join("checkpoint", "tests", mentor.id, test_file)
-        user_questions = self.__read_test_data(path, num)
-
-        # return 0
-
+        report = self.evaluate(classifier, test_file, num=num)
         print(
             "Loaded test set '{0}' of {1} questions for {2}".format(
-                test_file, len(user_questions), mentor.id
+                test_file, report["questions"], report["mentor"]
             )
         )
-
-        correct_predictions = 0
-        total_predictions = 0
-
-        for q in user_questions:
-            ID, text, confidence = self.answer_confidence(classifier, q)
-            if sanitize_string(text) in user_questions[q]:
-                correct_predictions += 1
-            else:
-                print("{0}. '{1}'".format(total_predictions + 1, q))
-                print("   Expected:")
-                for i in user_questions[q]:
-                    print("    - {0}".format(" ".join(i.split()[:15])))
-                print("   Got:\n    - {0}".format(" ".join(text.split()[:15])))
-            total_predictions += 1
-
+        for i, result in enumerate(report["results"]):
+            if result["correct"]:
+                continue
+            print("{0}. '{1}'".format(i + 1, result["question"]))
+            print("   Expected:")
+            for e in result["expected"]:
+                print("    - {0}".format(" ".join(e.split()[:15])))
+            print("   Got:\n    - {0}".format(" ".join(result["answer"].split()[:15])))
         print(
             "{0}/{1} ({2:.1f}%) questions answered correctly".format(
-                correct_predictions,
-                total_predictions,
-                (correct_predictions / total_predictions) * 100,
+                report["correct"], report["questions"], report["accuracy"] * 100
             )
         )
+        return report["accuracy"]
+
+    """
+    Test classifier on a test set, asking its questions in batches
 
-        return correct_predictions / total_predictions
-
-    def __read_test_data(self, file, num):
-        # load 2D matrix of user questions vs actual questions
-        test_data = list(csv.reader(open(file)))
-        numrows = len(test_data)
-        numcols = len(test_data[0])
-
-        # number of questions to ask (default is all of them)
-        if num is None or num > numcols - 2:
-            num = numcols - 2
-
-        # get user questions
-        user_questions = {}
-        for c in range(0, num):
-            user_question = sanitize_string(test_data[0][c + 2])
-
-            # get ideal and reasonable matches for user questions
-            for r in range(1, numrows):
-                match = sanitize_string(test_data[r][c + 2])
-                if match == "i" or match == "r":
-                    answer = sanitize_string(test_data[r][1])
-                    try:
-                        user_questions[user_question].append(answer)
-                    except KeyError:
-                        user_questions[user_question] = [answer]
-
-        return user_questions
+    Args:
+        classifier: (Classifier)
+        test_file: (string) file name of the testing data to load
+        num: (int) max number of questions to ask
+        batch_size: (int) number of questions per call to classifier.get_answers
+    Returns:
+        report: (dict) mentor, test_set, questions, correct, accuracy,
+            results (question, expected, answer_id, answer, confidence, correct and latency_ms for each question),
+            latency_ms (p50, p95 and p99 of the batch latency of each question)
+            and throughput (questions per second)
+    """
+
+    def evaluate(
+        self, classifier, test_file, num=None, batch_size=EVALUATE_BATCH_SIZE_DEFAULT
+    ):
+        mentor = classifier.mentor
+        user_questions = read_test_set(get_test_set_path(mentor.id, test_file), num)
+        questions = list(user_questions)
+        results = []
+        started = time.perf_counter()
+        for b in range(0, len(questions), batch_size):
+            batch = questions[b : b + batch_size]
+            batch_started = time.perf_counter()
+            answers = classifier.get_answers(batch)
+            latency_ms = (time.perf_counter() - batch_started) * 1000
+            for q, (answer_id, text, confidence) in zip(batch, answers):
+                results.append(
+                    dict(
+                        question=q,
+                        expected=user_questions[q],
+                        answer_id=answer_id,
+                        answer=text,
+                        confidence=float(confidence),
+                        correct=sanitize_string(text) in user_questions[q],
+                        latency_ms=latency_ms,
+                    )
+                )
+        seconds = time.perf_counter() - started
+        correct = sum(1 for r in results if r["correct"])
+        latencies = [r["latency_ms"] for r in results] or [0.0]
+        return dict(
+            mentor=mentor.id,
+            test_set=test_file,
+            questions=len(results),
+            correct=correct,
+            accuracy=correct / len(results) if results else 0.0,
+            results=results,
+            latency_ms={
+                f"p{p}": float(np.percentile(latencies, p)) for p in (50, 95, 99)
+            },
+            throughput=len(results) / seconds if seconds > 0 else 0.0,
+        )
@@ -4,10 +4,12 @@
 #
 # The full terms of this copyright and license should always be found in the root directory of this software deliverable as "license.txt" and if these terms are not found with this software, please contact the USC Stevens Center for the full license.
 #
+from functools import lru_cache
 import string
-from nltk.tokenize import RegexpTokenizer
-from nltk import pos_tag
-from nltk.stem import PorterStemmer
+
+STEM_CACHE_SIZE_DEFAULT = 100000
+# bump whenever a change to tokenize would change its output
+VERSION = "1"
 
 """
 This class contains the methods that operate on the questions to normalize them. The questions are tokenized, punctuations are
@@ -16,9 +18,34 @@ removed and words are stemmed to bring them to a common platform
 
 
 class NLTKPreprocessor(object):
-    def __init__(self):
+    """
+    Args:
+        pos_tag: (bool) if true, part-of-speech tag tokens before stemming.
+            The tags are never used, so this only exists to check parity with older output
+        stem_cache_size: (int) max number of stemmed tokens to memoize
+    """
+
+    def __init__(
+        self, pos_tag: bool = False, stem_cache_size: int = STEM_CACHE_SIZE_DEFAULT
+    ):
+        # importing nltk also imports sklearn, pandas etc. so wait until it's needed
+        from nltk.stem import PorterStemmer
+        from nltk.tokenize import RegexpTokenizer
+
         self.punct = set(string.punctuation)
         self.stemmer = PorterStemmer()
+        self.tokenizer = RegexpTokenizer(r"\w+")
+        self.pos_tag = pos_tag
+        self.__stem = lru_cache(maxsize=stem_cache_size)(self.stemmer.stem)
+
+    def get_version(self) -> str:
+        """
+        Returns:
+            version: (str) changes whenever transform output could change (e.g. a new nltk stemmer)
+        """
+        import nltk
+
+        return f"{VERSION}-nltk{nltk.__version__}"
 
     def inverse_transform(self, X):
         return [" ".join(doc) for doc in X]
@@ -31,9 +58,13 @@ class NLTKPreprocessor(object):
     """
 
     def tokenize(self, sentence):
-        tokenizer = RegexpTokenizer(r"\w+")
-        # Break the sentence into part of speech tagged tokens
-        for token, tag in pos_tag(tokenizer.tokenize(sentence)):
+        tokens = self.tokenizer.tokenize(sentence)
+        if self.pos_tag:
+            from nltk import pos_tag
+
+            # Break the sentence into part of speech tagged tokens
+            tokens = [token for token, tag in pos_tag(tokens)]
+        for token in tokens:
             token = token.lower()
             token = token.strip()
 
@@ -43,7 +74,7 @@ class NLTKPreprocessor(object):
 
             # Stem the token and yield
             try:
-                stemmed_token = self.stemmer.stem(token)
+                stemmed_token = self.__stem(token)
             except BaseException:
                 print(
                     "Unicode error. File encoding was changed when you opened it in Excel. ",
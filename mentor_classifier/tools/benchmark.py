@@ -0,0 +1,404 @@
+#
+# This software is Copyright ©️ 2020 The University of Southern California. All Rights Reserved.
+# Permission to use, copy, modify, and distribute this software and its documentation for educational, research and non-profit purposes, without fee, and without a written agreement is hereby granted, provided that the above copyright notice and subject to the full license file found in the root of this software deliverable. Permission to make commercial use of this software may be obtained by contacting:  USC Stevens Center for Innovation University of Southern California 1150 S. Olive Street, Suite 2300, Los Angeles, CA 90115, USA Email: accounting@stevens.usc.edu
+#
+# The full terms of this copyright and license should always be found in the root directory of this software deliverable as "license.txt" and if these terms are not found with this software, please contact the USC Stevens Center for the full license.
+#
+import csv
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+from mentor_classifier.checkpoints import ARCH_DEFAULT
+from mentor_classifier.mentor import Mentor
+from mentor_classifier.w2v import W2V_FILE_NAME_DEFAULT
+
+logging.basicConfig(level=logging.INFO)
+
+TOPICS = [
+    ("Background", "About Me"),
+    ("LifeStyle", "LifeStyle"),
+    ("JobSpecific", "About the Job"),
+    ("Navy", "Navy"),
+    ("STEM", "STEM"),
+    ("Advice", "Advice"),
+]
+UTTERANCE_SITUATIONS = ["_INTRO_", "_OFF_TOPIC_", "_PROMPT_", "_FEEDBACK_", "_REPEAT_"]
+WORDS = (
+    "what who where when why how do you your is are the navy job work time "
+    "like best hardest day family school study train learn advice deploy ship"
+).split()
+BENCHMARK_CHECKPOINT = "benchmark"
+# results where lower is better, compared by compare_results
+TIMED_RESULTS = [
+    "load_seconds",
+    "train_seconds",
+    "save_seconds",
+    "create_classifier_seconds",
+    "latency_ms_p50",
+    "latency_ms_p95",
+    "latency_ms_p99",
+    "peak_rss_bytes",
+]
+
+
+def _sentence(rng: random.Random, n_words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n_words)).capitalize()
+
+
+def _topics(n_topics: int) -> List[tuple]:
+    return TOPICS[:n_topics] + [
+        (f"Topic{i}", f"Topic {i}") for i in range(len(TOPICS), n_topics)
+    ]
+
+
+def generate_mentor(
+    mentor_root: str,
+    mentor_id: str,
+    n_rows: int,
+    seed: int = 0,
+    n_paraphrases_max: int = 3,
+    n_topics: int = len(TOPICS),
+) -> Mentor:
+    """
+    Writes a synthetic mentor with n_rows answers
+
+    Args:
+        mentor_root: (str) directory to create the mentor in
+        mentor_id: (str)
+        n_rows: (int) number of rows in classifier_data.csv
+        seed: (int) random seed, the same seed always gives the same mentor
+        n_paraphrases_max: (int) each answer has 0 to this many paraphrases of its question
+        n_topics: (int) number of topics (each answer has 1 or 2)
+
+    Returns:
+        mentor: (mentor_classifier.mentor.Mentor) loaded from the written data
+    """
+    rng = random.Random(seed)
+    topics = _topics(n_topics)
+    data_path = os.path.join(mentor_root, mentor_id, "data")
+    os.makedirs(data_path, exist_ok=True)
+    with open(os.path.join(data_path, "topics.csv"), "w", newline="") as f:
+        csv.writer(f).writerows(topics)
+    with open(os.path.join(data_path, "classifier_data.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["ID", "topics", "text", "question"])
+        for i in range(n_rows):
+            row_topics = rng.sample(topics, min(len(topics), rng.randint(1, 2)))
+            questions = [
+                f"{_sentence(rng, rng.randint(3, 12))}?"
+                for _ in range(1 + rng.randint(0, n_paraphrases_max))
+            ]
+            writer.writerow(
+                [
+                    f"{mentor_id}_a{i}_1_1",
+                    ",".join(t[0] for t in row_topics),
+                    f"{_sentence(rng, rng.randint(5, 60))}.",
+                    "\n".join(questions),
+                ]
+            )
+    with open(os.path.join(data_path, "utterance_data.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["ID", "utterance", "situation"])
+        for i in range(max(len(UTTERANCE_SITUATIONS), n_rows // 100)):
+            writer.writerow(
+                [
+                    f"{mentor_id}_u{i}_1_1",
+                    f"{_sentence(rng, rng.randint(2, 10))}.",
+                    UTTERANCE_SITUATIONS[i % len(UTTERANCE_SITUATIONS)],
+                ]
+            )
+    with open(os.path.join(data_path, "profile.yml"), "w") as f:
+        f.write(f"name: {mentor_id}\nshort_name: {mentor_id}\ntitle: benchmark\n")
+    return Mentor(mentor_id, mentor_root)
+
+
+def generate_w2v(
+    w2v_path: str, n_words: int = 10000, dim: int = 300, seed: int = 0
+) -> List[str]:
+    """
+    Writes a small word2vec binary with random vectors to use in place of GoogleNews,
+    with all the words (and their stems) used by generate_mentor, padded out to n_words
+
+    Returns:
+        words: (list) the words in the binary
+    """
+    from mentor_classifier.nltk_preprocessor import NLTKPreprocessor
+
+    stems = NLTKPreprocessor().transform(" ".join(WORDS))
+    words = list(dict.fromkeys(WORDS + stems))
+    words += [f"word{i}" for i in range(max(0, n_words - len(words)))]
+    vectors = np.random.RandomState(seed).uniform(-0.25, 0.25, (len(words), dim))
+    os.makedirs(os.path.dirname(os.path.abspath(w2v_path)), exist_ok=True)
+    with open(w2v_path, "wb") as f:
+        f.write(f"{len(words)} {dim}\n".encode("utf-8"))
+        for word, vector in zip(words, vectors.astype("float32")):
+            f.write(f"{word} ".encode("utf-8") + vector.tobytes() + b"\n")
+    return words
+
+
+def _peak_rss_bytes() -> int:
+    import resource
+
+    # linux reports kilobytes
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _timed(f: Callable[[], Any]) -> (Any, float):
+    started = time.perf_counter()
+    result = f()
+    return result, time.perf_counter() - started
+
+
+def benchmark_mentor_load(n_rows: int, repeat: int = 3) -> dict:
+    """
+    Times Mentor.load for a synthetic mentor with n_rows answers
+
+    Returns:
+        result: (dict) rows, questions and the best and mean seconds over repeat loads
+    """
+    with tempfile.TemporaryDirectory() as mentor_root:
+        mentor = generate_mentor(mentor_root, "benchmark", n_rows)
+        seconds = []
+        for _ in range(repeat):
+            seconds.append(_timed(mentor.load)[1])
+    return dict(
+        rows=n_rows,
+        questions=len(mentor.question_ids),
+        best_seconds=min(seconds),
+        mean_seconds=sum(seconds) / len(seconds),
+    )
+
+
+def benchmark(
+    work_dir: str,
+    n_rows: int,
+    n_paraphrases_max: int = 3,
+    n_topics: int = len(TOPICS),
+    n_questions: int = 100,
+    arch: str = ARCH_DEFAULT,
+) -> Dict[str, Any]:
+    """
+    Times loading, training and saving a synthetic mentor, creating its classifier,
+    and answering n_questions (new, not canned) questions one at a time and in one batch.
+    Uses a generated word2vec binary (see generate_w2v) under work_dir.
+    Training and inference are skipped (with the reason under 'skipped') if the arch can't be trained here.
+
+    Returns:
+        result: (dict) sizes, *_seconds, latency_ms_*, throughput
+            and peak_rss_bytes (of the whole process so far, so run sizes smallest first)
+    """
+    w2v_root = os.path.join(work_dir, "vector_models")
+    if not os.path.exists(os.path.join(w2v_root, W2V_FILE_NAME_DEFAULT)):
+        generate_w2v(os.path.join(w2v_root, W2V_FILE_NAME_DEFAULT))
+    return _benchmark_mentor(
+        work_dir, w2v_root, n_rows, n_paraphrases_max, n_topics, n_questions, arch
+    )
+
+
+def _benchmark_mentor(
+    work_dir: str,
+    w2v_root: str,
+    n_rows: int,
+    n_paraphrases_max: int,
+    n_topics: int,
+    n_questions: int,
+    arch: str,
+) -> Dict[str, Any]:
+    mentor_root = os.path.join(work_dir, f"mentors_{n_rows}")
+    mentor_id = "benchmark"
+    generate_mentor(
+        mentor_root,
+        mentor_id,
+        n_rows,
+        n_paraphrases_max=n_paraphrases_max,
+        n_topics=n_topics,
+    )
+    mentor, load_seconds = _timed(lambda: Mentor(mentor_id, mentor_root))
+    result = dict(
+        rows=n_rows,
+        paraphrases_max=n_paraphrases_max,
+        topics=n_topics,
+        questions=len(mentor.question_ids),
+        load_seconds=load_seconds,
+    )
+    checkpoint_root = os.path.join(work_dir, f"checkpoint_{n_rows}")
+    try:
+        from mentor_classifier.classifiers import checkpoint_path, create_classifier
+        from mentor_classifier.classifiers.training import (
+            find_classifier_training_factory,
+        )
+
+        cp = checkpoint_path(checkpoint_root, arch, BENCHMARK_CHECKPOINT)
+        training = find_classifier_training_factory(arch).create(
+            cp, mentor, w2v_root=w2v_root
+        )
+        _, result["train_seconds"] = _timed(training.train)
+        _, result["save_seconds"] = _timed(
+            lambda: training.save(to_path=os.path.join(cp, mentor_id))
+        )
+        classifier, result["create_classifier_seconds"] = _timed(
+            lambda: create_classifier(
+                checkpoint_root=checkpoint_root,
+                arch=arch,
+                checkpoint=BENCHMARK_CHECKPOINT,
+                mentors=mentor,
+                w2v_root=w2v_root,
+            )
+        )
+    except ImportError as err:
+        logging.warning(f"skipping train and inference benchmarks: {err}")
+        result["skipped"] = str(err)
+        result["peak_rss_bytes"] = _peak_rss_bytes()
+        return result
+    rng = random.Random(1)
+    questions = [f"{_sentence(rng, rng.randint(3, 12))}?" for _ in range(n_questions)]
+    classifier.get_answer(questions[0])  # warm up
+    latencies = [_timed(lambda: classifier.get_answer(q))[1] * 1000 for q in questions]
+    for p in (50, 95, 99):
+        result[f"latency_ms_p{p}"] = float(np.percentile(latencies, p))
+    _, batch_seconds = _timed(lambda: classifier.get_answers(questions))
+    result["throughput"] = len(questions) / batch_seconds
+    result["peak_rss_bytes"] = _peak_rss_bytes()
+    return result
+
+
+def _git_commit() -> str:
+    try:
+        return (
+            subprocess.check_output(
+                ["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL
+            )
+            .decode("utf-8")
+            .strip()
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(
+    base: Dict[str, Any], new: Dict[str, Any], tolerance: float = 0.1
+) -> List[Dict[str, Any]]:
+    """
+    Compares two benchmark reports (see run) size by size
+
+    Args:
+        base: (dict) report to compare against (e.g. from the previous commit)
+        new: (dict) report to compare
+        tolerance: (float) relative change allowed before a result counts as a regression
+
+    Returns:
+        changes: (list) dicts of rows, result, base, new, ratio and regression
+            for each result in both reports
+    """
+    base_by_rows = {r["rows"]: r for r in base["results"]}
+    changes = []
+    for r in new["results"]:
+        b = base_by_rows.get(r["rows"])
+        if not b:
+            continue
+        for name in TIMED_RESULTS + ["throughput"]:
+            if name not in r or name not in b or not b[name]:
+                continue
+            ratio = r[name] / b[name]
+            lower_is_better = name != "throughput"
+            changes.append(
+                dict(
+                    rows=r["rows"],
+                    result=name,
+                    base=b[name],
+                    new=r[name],
+                    ratio=ratio,
+                    regression=ratio > 1 + tolerance
+                    if lower_is_better
+                    else ratio < 1 - tolerance,
+                )
+            )
+    return changes
+
+
+def run() -> None:
+    """
+    Runs the benchmark for synthetic mentors of each size in BENCHMARK_ROWS
+    (comma separated, default 100,1000,10000) and writes the results to BENCHMARK_OUT (default benchmark.json).
+    Sizes can be tuned with BENCHMARK_PARAPHRASES (max per answer), BENCHMARK_TOPICS and BENCHMARK_QUESTIONS
+    """
+    BENCHMARK_ROWS = os.getenv("BENCHMARK_ROWS") or "100,1000,10000"
+    BENCHMARK_PARAPHRASES = int(os.getenv("BENCHMARK_PARAPHRASES") or 3)
+    BENCHMARK_TOPICS = int(os.getenv("BENCHMARK_TOPICS") or len(TOPICS))
+    BENCHMARK_QUESTIONS = int(os.getenv("BENCHMARK_QUESTIONS") or 100)
+    BENCHMARK_OUT = os.getenv("BENCHMARK_OUT") or "benchmark.json"
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for n_rows in [int(n) for n in BENCHMARK_ROWS.split(",")]:
+            result = benchmark(
+                work_dir,
+                n_rows,
+                n_paraphrases_max=BENCHMARK_PARAPHRASES,
+                n_topics=BENCHMARK_TOPICS,
+                n_questions=BENCHMARK_QUESTIONS,
+            )
+            logging.info(f"  {json.dumps(result)}")
+            results.append(result)
+    with open(BENCHMARK_OUT, "w") as f:
+        json.dump(
+            dict(
+                commit=_git_commit(),
+                python=sys.version.split()[0],
+                platform=platform.platform(),
+                results=results,
+            ),
+            f,
+            indent=2,
+        )
+    logging.info(f"wrote benchmark results to {BENCHMARK_OUT}")
+
+
+def compare() -> None:
+    """
+    Compares the benchmark results in BENCHMARK_OUT (default benchmark.json) to those in BENCHMARK_BASE
+    and exits with an error if any result regressed by more than BENCHMARK_TOLERANCE (default 0.1)
+    """
+    BENCHMARK_BASE = os.getenv("BENCHMARK_BASE")
+    BENCHMARK_OUT = os.getenv("BENCHMARK_OUT") or "benchmark.json"
+    BENCHMARK_TOLERANCE = float(os.getenv("BENCHMARK_TOLERANCE") or 0.1)
+    with open(BENCHMARK_BASE) as f:
+        base = json.load(f)
+    with open(BENCHMARK_OUT) as f:
+        new = json.load(f)
+    changes = compare_results(base, new, tolerance=BENCHMARK_TOLERANCE)
+    for c in changes:
+        logging.info(
+            f"  {c['rows']} rows {c['result']}: {c['base']:.4g} -> {c['new']:.4g} "
+            f"({c['ratio']:.2f}x){' REGRESSION' if c['regression'] else ''}"
+        )
+    regressions = [c for c in changes if c["regression"]]
+    if regressions:
+        logging.error(
+            f"{len(regressions)} result(s) regressed by more than {BENCHMARK_TOLERANCE:.0%}"
+        )
+        sys.exit(1)
+
+
+def mentor_load() -> None:
+    """
+    Prints Mentor.load times for synthetic mentors with
+    BENCHMARK_ROWS (comma separated, default 1000,10000,100000) rows
+    """
+    BENCHMARK_ROWS = os.getenv("BENCHMARK_ROWS") or "1000,10000,100000"
+    BENCHMARK_REPEAT = int(os.getenv("BENCHMARK_REPEAT") or 3)
+    for n_rows in [int(n) for n in BENCHMARK_ROWS.split(",")]:
+        result = benchmark_mentor_load(n_rows, repeat=BENCHMARK_REPEAT)
+        logging.info(
+            f"  {result['rows']} rows ({result['questions']} questions): "
+            f"best {result['best_seconds']:.3f}s mean {result['mean_seconds']:.3f}s"
+        )
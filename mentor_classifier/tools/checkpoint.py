@@ -5,9 +5,20 @@
 # The full terms of this copyright and license should always be found in the root directory of this software deliverable as "license.txt" and if these terms are not found with this software, please contact the USC Stevens Center for the full license.
 #
 import datetime
+import itertools
+import json
 import logging
+import multiprocessing
 import os
+import sys
+import time
+from typing import List
 
+from mentor_classifier.checkpoints import (
+    ARCH_DEFAULT,
+    find_checkpoint_index,
+    write_manifest,
+)
 from mentor_classifier.mentor import Mentor
 from mentor_classifier.metrics import Metrics
 from mentor_classifier.classifiers import checkpoint_path, create_classifier
@@ -16,30 +27,194 @@ from mentor_classifier.classifiers.training import find_classifier_training_fact
 logging.basicConfig(level=logging.INFO)
 
 
+def _evaluate(
+    checkpoint_root: str,
+    arch: str,
+    checkpoint: str,
+    mentor: str,
+    test_set: str,
+    fuzzy_match_threshold: float,
+) -> dict:
+    kwargs = (
+        dict(fuzzy_match_threshold=fuzzy_match_threshold)
+        if fuzzy_match_threshold
+        else {}
+    )
+    classifier = create_classifier(
+        checkpoint_root=checkpoint_root,
+        arch=arch,
+        checkpoint=checkpoint,
+        mentors=mentor,
+        **kwargs,
+    )
+    report = Metrics().evaluate(classifier, test_set)
+    report.update(checkpoint=checkpoint, fuzzy_match_threshold=fuzzy_match_threshold)
+    if fuzzy_match_threshold:
+        report["match_stats"] = classifier.get_match_stats()
+    return report
+
+
+def _evaluate_args(args) -> dict:
+    return _evaluate(*args)
+
+
+def _summarize(reports: List[dict]) -> dict:
+    questions = sum(r["questions"] for r in reports)
+    latencies = [r["latency_ms"]["p95"] for r in reports]
+    return dict(
+        questions=questions,
+        accuracy=sum(r["correct"] for r in reports) / questions if questions else 0.0,
+        latency_ms_p95=max(latencies) if latencies else 0.0,
+        throughput=sum(r["throughput"] for r in reports) / len(reports)
+        if reports
+        else 0.0,
+    )
+
+
 def test() -> None:
+    """
+    Evaluates classifiers for MENTOR (default all the mentors in each checkpoint) on TEST_SET,
+    one per checkpoint in CHECKPOINT (default newest).
+    MENTOR and CHECKPOINT may be comma-separated lists, to compare checkpoints for accuracy and speed in one run
+    (TEST_WORKERS evaluations at a time in separate processes, default 1 so latencies aren't skewed).
+    With FUZZY_MATCH_THRESHOLD set, also evaluates with fuzzy matches of canned questions at that threshold.
+    With TEST_REPORT set, writes a json report with the results for every question to that path
+    """
     ARCH = os.getenv("ARCH")
     CHECKPOINT = os.getenv("CHECKPOINT")
     CHECKPOINT_ROOT = os.getenv("CHECKPOINT_ROOT") or "/app/checkpoint"
     MENTOR = os.getenv("MENTOR")
     TEST_SET = os.getenv("TEST_SET")
+    TEST_REPORT = os.getenv("TEST_REPORT")
+    TEST_WORKERS = int(os.getenv("TEST_WORKERS") or 1)
+    FUZZY_MATCH_THRESHOLD = float(os.getenv("FUZZY_MATCH_THRESHOLD") or 0)
     print(f"ARCH {ARCH}")
     print(f"CHECKPOINT {CHECKPOINT}")
     print(f"MENTOR {MENTOR}")
-    classifier = create_classifier(
-        checkpoint_root=CHECKPOINT_ROOT,
-        arch=ARCH,
-        checkpoint=CHECKPOINT,
-        mentors=MENTOR,
-    )
-    metrics = Metrics()
-    accuracy = metrics.test_accuracy(classifier, TEST_SET)
-    print(f"  ARCH {ARCH}")
-    print(f"  CHECKPOINT {CHECKPOINT}")
-    print(f"  MENTOR {MENTOR}")
-    print(f"  ACCURACY: {accuracy}")
+    checkpoints = CHECKPOINT.split(",") if CHECKPOINT else [None]
+    thresholds = [0.0, FUZZY_MATCH_THRESHOLD] if FUZZY_MATCH_THRESHOLD else [0.0]
+    index = find_checkpoint_index(CHECKPOINT_ROOT)
+    args = [
+        (CHECKPOINT_ROOT, ARCH, c, m, TEST_SET, t)
+        for c in checkpoints
+        for m in (
+            MENTOR.split(",")
+            if MENTOR
+            else sorted(index.get_mentors(ARCH or ARCH_DEFAULT, c))
+        )
+        for t in thresholds
+    ]
+    if TEST_WORKERS <= 1 or len(args) <= 1:
+        reports = [_evaluate_args(a) for a in args]
+    else:
+        # processes (spawned, as for training) rather than threads,
+        # since a tensorflow 1 model can't predict from several threads without its own graph and session
+        with multiprocessing.get_context("spawn").Pool(TEST_WORKERS) as pool:
+            reports = pool.map(_evaluate_args, args)
+    for r in reports:
+        print(f"  ARCH {ARCH}")
+        print(f"  CHECKPOINT {r['checkpoint']}")
+        print(f"  MENTOR {r['mentor']}")
+        if r["fuzzy_match_threshold"]:
+            stats = r["match_stats"]
+            print(f"  FUZZY_MATCH_THRESHOLD {r['fuzzy_match_threshold']}")
+            print(
+                f"  FUZZY HITS: {stats['fuzzy_hits']}/{stats['questions']}, "
+                f"MODEL AVOIDED: {stats['model_avoided']:.1%}"
+            )
+        print(f"  ACCURACY: {r['accuracy']}")
+        print(
+            f"  LATENCY MS: p50 {r['latency_ms']['p50']:.1f} "
+            f"p95 {r['latency_ms']['p95']:.1f} p99 {r['latency_ms']['p99']:.1f}"
+        )
+        print(f"  THROUGHPUT: {r['throughput']:.1f} questions/s")
+    summaries = {
+        f"{c}{f' fuzzy {t}' if t else ''}": _summarize(
+            [
+                r
+                for r in reports
+                if r["checkpoint"] == c and r["fuzzy_match_threshold"] == t
+            ]
+        )
+        for c, t in itertools.product(checkpoints, thresholds)
+    }
+    if len(summaries) > 1:
+        print("COMPARISON")
+        for name, s in summaries.items():
+            print(
+                f"  {name}: accuracy {s['accuracy']:.4f} "
+                f"p95 {s['latency_ms_p95']:.1f}ms {s['throughput']:.1f} questions/s"
+            )
+    if TEST_REPORT:
+        with open(TEST_REPORT, "w") as f:
+            json.dump(dict(summaries=summaries, reports=reports), f, indent=2)
+
+
+def _mentor_data_size(mentor_root: str, mentor_id: str) -> int:
+    try:
+        return os.path.getsize(
+            os.path.join(mentor_root, mentor_id, "data", "classifier_data.csv")
+        )
+    except OSError:
+        return 0
+
+
+def _init_training_worker(threads_per_worker: int) -> None:
+    # must happen before tensorflow or numpy start their thread pools
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads_per_worker)
+    import tensorflow as tf
+
+    tf.config.threading.set_intra_op_parallelism_threads(threads_per_worker)
+    tf.config.threading.set_inter_op_parallelism_threads(threads_per_worker)
+
+
+def _train_mentor(
+    arch: str, cp: str, mentor_root: str, mentor_id: str, training_kwargs: dict
+) -> dict:
+    started = time.time()
+    result = dict(mentor=mentor_id)
+    try:
+        m = Mentor(mentor_id, mentor_root)
+        save_path = os.path.join(cp, mentor_id)
+        logging.info(f"train mentor {m.mentor_data_path()} to save path {save_path}...")
+        training = find_classifier_training_factory(arch).create(
+            cp, m, **training_kwargs
+        )
+        scores, accuracy = training.train()
+        training.save(to_path=save_path)
+        logging.info(f"  CHECKPOINT: {cp}")
+        logging.info(f"  ACCURACY: {accuracy}")
+        result.update(
+            status="success", accuracy=float(accuracy), report=training.get_report()
+        )
+    except Exception as err:
+        logging.exception(f"failed to train mentor {mentor_id}")
+        result.update(status="failure", error=str(err))
+    result["seconds"] = time.time() - started
+    return result
+
+
+def _train_mentor_args(args) -> dict:
+    return _train_mentor(*args)
 
 
 def train() -> None:
+    """
+    Trains every mentor under MENTOR_ROOT (or just MENTOR) into a new checkpoint.
+    With TRAIN_WORKERS > 1 trains that many mentors at a time in separate processes,
+    each limited to TRAIN_THREADS_PER_WORKER threads (default cpus / workers).
+    Largest mentors go first, and a failed mentor doesn't stop the others
+    (but the process exits with status 1 once all are done if any failed).
+    Writes train_summary.json with the status and time of each mentor to the checkpoint,
+    and manifest.json with the artifacts of each mentor (see mentor_classifier.checkpoints.CheckpointIndex).
+    With FEATURE_STORE set to a file path, reuses question features from previous runs
+    (see mentor_classifier.feature_store).
+    With PREVIOUS_CHECKPOINT set, trains each mentor incrementally from its model in that checkpoint,
+    and with COMPARE_FULL_RETRAIN also trains from scratch to report the accuracy delta.
+    With W2V_PRECISIONS set (comma-separated, e.g. float16,int8), also saves the checkpoint's
+    word2vec stem table at each of those precisions, for classifiers served with W2V_PRECISION.
+    """
     ARCH = os.getenv("ARCH")
     CHECKPOINT = os.getenv("CHECKPOINT") or datetime.datetime.now().strftime(
         "%Y-%m-%d-%H%M"
@@ -47,12 +222,34 @@ def train() -> None:
     CHECKPOINT_ROOT = os.getenv("CHECKPOINT_ROOT") or "/app/checkpoint"
     MENTOR_ROOT = os.getenv("MENTOR_ROOT") or "/app/mentors"
     MENTOR = os.getenv("MENTOR")
+    TRAIN_WORKERS = int(os.getenv("TRAIN_WORKERS") or 1)
+    TRAIN_THREADS_PER_WORKER = int(
+        os.getenv("TRAIN_THREADS_PER_WORKER")
+        or max(1, (os.cpu_count() or 1) // TRAIN_WORKERS)
+    )
     logging.info(f"ARCH {ARCH}")
     logging.info(f"CHECKPOINT {CHECKPOINT}")
     logging.info(f"CHECKPOINT_ROOT {CHECKPOINT_ROOT}")
     logging.info(f"MENTOR_ROOT {MENTOR_ROOT}")
     logging.info(f"MENTOR {MENTOR}")
-    fac = find_classifier_training_factory(ARCH)
+    logging.info(f"TRAIN_WORKERS {TRAIN_WORKERS}")
+    logging.info(f"FEATURE_STORE {os.getenv('FEATURE_STORE')}")
+    PREVIOUS_CHECKPOINT = os.getenv("PREVIOUS_CHECKPOINT")
+    COMPARE_FULL_RETRAIN = (os.getenv("COMPARE_FULL_RETRAIN") or "").lower() in (
+        "1",
+        "true",
+    )
+    logging.info(f"PREVIOUS_CHECKPOINT {PREVIOUS_CHECKPOINT}")
+    training_kwargs = (
+        dict(
+            previous_checkpoint=checkpoint_path(
+                CHECKPOINT_ROOT, ARCH, PREVIOUS_CHECKPOINT
+            ),
+            compare_full_retrain=COMPARE_FULL_RETRAIN,
+        )
+        if PREVIOUS_CHECKPOINT
+        else {}
+    )
     cp = checkpoint_path(CHECKPOINT_ROOT, ARCH, CHECKPOINT)
     logging.info(f"CHECKPOINT_PATH {cp}")
     mentor_ids = (
@@ -64,15 +261,40 @@ def train() -> None:
         if not MENTOR
         else [MENTOR]
     )
+    mentor_ids.sort(key=lambda m: _mentor_data_size(MENTOR_ROOT, m), reverse=True)
     logging.info(f"training mentor list: {mentor_ids}")
-    for mentor_id in mentor_ids:
-        if not os.path.isdir(MENTOR_ROOT):
-            continue
-        m = Mentor(mentor_id, MENTOR_ROOT)
-        save_path = os.path.join(cp, mentor_id)
-        logging.info(f"train mentor {m.mentor_data_path()} to save path {save_path}...")
-        training = fac.create(cp, m)
-        scores, accuracy = training.train()
-        training.save(to_path=save_path)
-        logging.info(f"  CHECKPOINT: {cp}")
-        logging.info(f"  ACCURACY: {accuracy}")
+    started = time.time()
+    args = [
+        (ARCH, cp, MENTOR_ROOT, mentor_id, training_kwargs) for mentor_id in mentor_ids
+    ]
+    # e.g. converts the word2vec model to its memory-mapped format and writes the stem table
+    # once, up front, so that all the workers share them
+    find_classifier_training_factory(ARCH).prepare_checkpoint(cp)
+    if TRAIN_WORKERS <= 1 or len(mentor_ids) <= 1:
+        results = [_train_mentor_args(a) for a in args]
+    else:
+        # spawn (not fork) so that each worker initializes its own tensorflow
+        with multiprocessing.get_context("spawn").Pool(
+            TRAIN_WORKERS,
+            initializer=_init_training_worker,
+            initargs=(TRAIN_THREADS_PER_WORKER,),
+        ) as pool:
+            results = list(pool.imap_unordered(_train_mentor_args, args))
+    summary = dict(
+        checkpoint=cp,
+        workers=TRAIN_WORKERS,
+        seconds=time.time() - started,
+        mentors=sorted(results, key=lambda r: r["mentor"]),
+    )
+    os.makedirs(cp, exist_ok=True)
+    with open(os.path.join(cp, "train_summary.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+    write_manifest(cp)
+    for r in summary["mentors"]:
+        logging.info(
+            f"  {r['mentor']}: {r['status']} in {r['seconds']:.1f}s {r.get('error', '')}"
+        )
+    failures = [r["mentor"] for r in results if r["status"] != "success"]
+    if failures:
+        logging.error(f"failed to train {len(failures)} mentor(s): {failures}")
+        sys.exit(1)
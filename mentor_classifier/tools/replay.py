@@ -0,0 +1,277 @@
+#
+# This software is Copyright ©️ 2020 The University of Southern California. All Rights Reserved.
+# Permission to use, copy, modify, and distribute this software and its documentation for educational, research and non-profit purposes, without fee, and without a written agreement is hereby granted, provided that the above copyright notice and subject to the full license file found in the root of this software deliverable. Permission to make commercial use of this software may be obtained by contacting:  USC Stevens Center for Innovation University of Southern California 1150 S. Olive Street, Suite 2300, Los Angeles, CA 90115, USA Email: accounting@stevens.usc.edu
+#
+# The full terms of this copyright and license should always be found in the root directory of this software deliverable as "license.txt" and if these terms are not found with this software, please contact the USC Stevens Center for the full license.
+#
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+import csv
+from itertools import islice
+import json
+import logging
+import os
+from threading import BoundedSemaphore, Lock
+import time
+from typing import Callable, Iterable, Iterator
+
+import numpy as np
+
+from mentor_classifier.classifiers import create_classifier_factory
+from mentor_classifier.logger import (
+    QUESTION_ANSWER_LOG_HEADER,
+    QUESTION_ANSWER_LOG_PATH,
+)
+
+LOG_DATA_FIELDS = QUESTION_ANSWER_LOG_HEADER[2:]
+DIFF_SAMPLES_MAX = 20
+
+
+def read_question_answer_log(paths: Iterable[str]) -> Iterator[dict]:
+    """
+    Streams the questions logged by mentor_classifier.logger.Logger.logData, in logged order.
+    Each line is an optional user and session id (from Logger.logUserID) followed by the logData fields.
+    Header lines and lines too short to be logData rows are skipped
+
+    Args:
+        paths: (list of str) log files, read in the order given (e.g. oldest rotated log first)
+
+    Returns:
+        records: (iterator of dict) mentor, question, classifier_answer, time, user_id and session_id
+    """
+    for path in paths:
+        with open(path, newline="") as f:
+            for row in csv.reader(f):
+                if len(row) < len(LOG_DATA_FIELDS):
+                    continue
+                data = row[-len(LOG_DATA_FIELDS) :]
+                if data == LOG_DATA_FIELDS:
+                    continue
+                user_ids = row[: -len(LOG_DATA_FIELDS)]
+                yield dict(
+                    mentor=data[0],
+                    question=data[1],
+                    classifier_answer=data[3],
+                    time=data[8],
+                    user_id=user_ids[0] if len(user_ids) == 2 else "",
+                    session_id=user_ids[1] if len(user_ids) == 2 else "",
+                )
+
+
+class QuestionAnswerLog(object):
+    """
+    The questions in question answer logs (see read_question_answer_log),
+    read from the files again every time it's iterated, so that it can be replayed without holding it in memory
+
+    Args:
+        paths: (list of str) log files, read in the order given
+        mentors: (list of str) only the questions for these mentors (default all)
+    """
+
+    def __init__(self, paths: Iterable[str], mentors: Iterable[str] = None):
+        self.paths = list(paths)
+        self.mentors = set(mentors) if mentors else None
+
+    def __iter__(self) -> Iterator[dict]:
+        for record in read_question_answer_log(self.paths):
+            if self.mentors is None or record["mentor"] in self.mentors:
+                yield record
+
+
+class _MentorReplay(object):
+    def __init__(self):
+        self.questions = 0
+        self.errors = 0
+        self.compared = 0
+        self.diffs = 0
+        self.latencies_ms = array("d")
+
+    def record(self, latency_ms: float, logged: str, diff: bool) -> None:
+        self.questions += 1
+        if latency_ms is None:
+            self.errors += 1
+            return
+        self.latencies_ms.append(latency_ms)
+        if logged:
+            self.compared += 1
+            self.diffs += int(diff)
+
+    def report(self) -> dict:
+        latencies = self.latencies_ms or [0.0]
+        return dict(
+            questions=self.questions,
+            errors=self.errors,
+            compared=self.compared,
+            diffs=self.diffs,
+            diff_rate=self.diffs / self.compared if self.compared else 0.0,
+            latency_ms={
+                f"p{p}": float(np.percentile(latencies, p)) for p in (50, 95, 99)
+            },
+        )
+
+
+def replay(
+    records: Iterable[dict],
+    get_classifier: Callable,
+    rate: float = None,
+    concurrency: int = 1,
+    limit: int = None,
+) -> dict:
+    """
+    Replays logged questions against classifiers and measures how they keep up.
+
+    Args:
+        records: (iterable of dict) mentor, question and classifier_answer for each question
+            (see QuestionAnswerLog). Iterated twice, first for the mentor ids only, then streamed as questions are sent,
+            so it must not be a one-time iterator
+        get_classifier: (function) returns the mentor_classifier.classifiers.Classifier for a mentor id.
+            Called once per mentor, for all of them before any question is sent,
+            so the time it takes isn't counted in latencies or throughput
+        rate: (float) questions per second to send. Latency is measured from when each question was due,
+            so time spent waiting behind slow answers counts. If not passed sends as fast as possible
+        concurrency: (int) max questions in flight
+        limit: (int) max questions to replay
+
+    Returns:
+        report: (dict) questions, errors, throughput (questions per second), latency_ms (p50, p95 and p99),
+            diff_rate (share of questions answered differently than logged, among those with a logged answer),
+            diff_samples, load_seconds and the same stats per mentor in mentors
+    """
+    if iter(records) is records:
+        raise Exception(
+            "replay iterates records twice, so they can't be an iterator (pass e.g. a list or a QuestionAnswerLog)"
+        )
+    classifiers = {}
+
+    def load(mentor_id):
+        try:
+            classifiers[mentor_id] = get_classifier(mentor_id)
+        except Exception:
+            logging.exception(f"failed to create classifier for {mentor_id}")
+            classifiers[mentor_id] = None
+
+    started = time.perf_counter()
+    # a first pass for just the mentor ids, so that every classifier is loaded before the clock starts
+    # without holding all the questions in memory
+    for record in islice(records, limit):
+        if record["mentor"] not in classifiers:
+            load(record["mentor"])
+    load_seconds = time.perf_counter() - started
+    stats_lock = Lock()
+    by_mentor = {}
+    total = _MentorReplay()
+    diff_samples = []
+    in_flight = BoundedSemaphore(concurrency)
+
+    def answer(record, due):
+        try:
+            classifier = classifiers[record["mentor"]]
+            if due is None:
+                due = time.perf_counter()
+            answer_id, answer_text, error = "", "", classifier is None
+            try:
+                if not error:
+                    answer_id, answer_text, _ = classifier.get_answer(
+                        record["question"]
+                    )
+            except Exception:
+                logging.exception(f"failed to answer {record['question']!r}")
+                error = True
+            latency_ms = None if error else (time.perf_counter() - due) * 1000
+            logged = record.get("classifier_answer") or ""
+            diff = not error and logged not in (answer_id, answer_text)
+            with stats_lock:
+                by_mentor.setdefault(record["mentor"], _MentorReplay()).record(
+                    latency_ms, logged, diff
+                )
+                total.record(latency_ms, logged, diff)
+                if logged and diff and len(diff_samples) < DIFF_SAMPLES_MAX:
+                    diff_samples.append(
+                        dict(
+                            mentor=record["mentor"],
+                            question=record["question"],
+                            logged=logged,
+                            answer_id=answer_id,
+                            answer=answer_text,
+                        )
+                    )
+        finally:
+            in_flight.release()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for i, record in enumerate(islice(records, limit)):
+            if record["mentor"] not in classifiers:
+                # e.g. logged since the first pass
+                load(record["mentor"])
+            due = None
+            if rate:
+                due = started + i / rate
+                wait = due - time.perf_counter()
+                if wait > 0:
+                    time.sleep(wait)
+            in_flight.acquire()
+            executor.submit(answer, record, due)
+    seconds = time.perf_counter() - started
+    report = total.report()
+    report.update(
+        throughput=total.questions / seconds if seconds > 0 else 0.0,
+        rate=rate,
+        concurrency=concurrency,
+        load_seconds=load_seconds,
+        diff_samples=diff_samples,
+        mentors={m: s.report() for m, s in sorted(by_mentor.items())},
+    )
+    return report
+
+
+def run() -> None:
+    """
+    Replays the questions in REPLAY_LOG (comma-separated paths, default QuestionAnswerLog.csv)
+    against CHECKPOINT (default newest) of ARCH, to measure a checkpoint or runtime on real traffic before deploying it.
+    Sends REPLAY_RATE questions per second (default as fast as possible), REPLAY_CONCURRENCY at a time (default 1),
+    up to REPLAY_LIMIT questions, only for the mentors in MENTOR (comma-separated, default all).
+    With REPLAY_REPORT set, writes the json report to that path
+    """
+    ARCH = os.getenv("ARCH")
+    CHECKPOINT = os.getenv("CHECKPOINT")
+    CHECKPOINT_ROOT = os.getenv("CHECKPOINT_ROOT") or "/app/checkpoint"
+    MENTOR = os.getenv("MENTOR")
+    REPLAY_LOG = os.getenv("REPLAY_LOG") or QUESTION_ANSWER_LOG_PATH
+    REPLAY_RATE = float(os.getenv("REPLAY_RATE") or 0) or None
+    REPLAY_CONCURRENCY = int(os.getenv("REPLAY_CONCURRENCY") or 1)
+    REPLAY_LIMIT = int(os.getenv("REPLAY_LIMIT") or 0) or None
+    REPLAY_REPORT = os.getenv("REPLAY_REPORT")
+    print(f"ARCH {ARCH}")
+    print(f"CHECKPOINT {CHECKPOINT}")
+    print(f"REPLAY_LOG {REPLAY_LOG}")
+    factory = create_classifier_factory(
+        checkpoint_root=CHECKPOINT_ROOT, arch=ARCH, checkpoint=CHECKPOINT
+    )
+    report = replay(
+        QuestionAnswerLog(
+            REPLAY_LOG.split(","), mentors=MENTOR.split(",") if MENTOR else None
+        ),
+        factory.create,
+        rate=REPLAY_RATE,
+        concurrency=REPLAY_CONCURRENCY,
+        limit=REPLAY_LIMIT,
+    )
+    for mentor_id, r in report["mentors"].items():
+        print(f"  MENTOR {mentor_id}")
+        print(f"    QUESTIONS: {r['questions']} ({r['errors']} errors)")
+        print(f"    DIFF RATE: {r['diff_rate']:.1%} of {r['compared']}")
+        print(
+            f"    LATENCY MS: p50 {r['latency_ms']['p50']:.1f} "
+            f"p95 {r['latency_ms']['p95']:.1f} p99 {r['latency_ms']['p99']:.1f}"
+        )
+    print(f"QUESTIONS: {report['questions']} ({report['errors']} errors)")
+    print(f"DIFF RATE: {report['diff_rate']:.1%} of {report['compared']}")
+    print(
+        f"LATENCY MS: p50 {report['latency_ms']['p50']:.1f} "
+        f"p95 {report['latency_ms']['p95']:.1f} p99 {report['latency_ms']['p99']:.1f}"
+    )
+    print(f"THROUGHPUT: {report['throughput']:.1f} questions/s")
+    if REPLAY_REPORT:
+        with open(REPLAY_REPORT, "w") as f:
+            json.dump(report, f, indent=2)
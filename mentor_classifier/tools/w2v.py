@@ -0,0 +1,154 @@
+#
+# This software is Copyright ©️ 2020 The University of Southern California. All Rights Reserved.
+# Permission to use, copy, modify, and distribute this software and its documentation for educational, research and non-profit purposes, without fee, and without a written agreement is hereby granted, provided that the above copyright notice and subject to the full license file found in the root of this software deliverable. Permission to make commercial use of this software may be obtained by contacting:  USC Stevens Center for Innovation University of Southern California 1150 S. Olive Street, Suite 2300, Los Angeles, CA 90115, USA Email: accounting@stevens.usc.edu
+#
+# The full terms of this copyright and license should always be found in the root directory of this software deliverable as "license.txt" and if these terms are not found with this software, please contact the USC Stevens Center for the full license.
+#
+import json
+import logging
+import os
+
+from mentor_classifier.checkpoints import ARCH_DEFAULT, find_checkpoint
+from mentor_classifier.classifiers import create_classifier_factory
+from mentor_classifier.metrics import Metrics, get_test_set_path
+from mentor_classifier.w2v import (
+    PRECISION_DEFAULT,
+    W2V_FILE_NAME_DEFAULT,
+    find_w2v,
+    save_quantized_w2v,
+    save_stem_table_precision,
+    stem_table_path,
+)
+
+
+def _vectors_bytes(path: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(path, f))
+        for f in ("vectors.npy", "scales.npy")
+        if os.path.exists(os.path.join(path, f))
+    )
+
+
+def _test_mentors(test_set: str, mentor: str = None) -> list:
+    if mentor:
+        return mentor.split(",")
+    tests_root = os.path.dirname(os.path.dirname(get_test_set_path("_", test_set)))
+    if not os.path.isdir(tests_root):
+        return []
+    return sorted(
+        m
+        for m in os.listdir(tests_root)
+        if os.path.isfile(get_test_set_path(m, test_set))
+    )
+
+
+def save_checkpoint_stem_tables(checkpoint: str, precisions: list) -> list:
+    """
+    Saves the stem table of a checkpoint (if it has one) at each precision,
+    so that classifiers using it at those precisions memory map it instead of converting it in memory
+
+    Args:
+        checkpoint: (str) path of the checkpoint
+        precisions: (list of str)
+
+    Returns:
+        paths: (list of str) directories of the stem table at each precision
+    """
+    path = stem_table_path(checkpoint)
+    if not os.path.isdir(path):
+        return []
+    return [save_stem_table_precision(path, p) for p in precisions]
+
+
+def compare_accuracy(factory, mentors: list, test_set: str, precisions: list) -> dict:
+    """
+    Tests classifiers using word vectors of each precision on each mentor's test set.
+    Classifiers with a stem table use it converted to each precision (see save_checkpoint_stem_tables),
+    which has the same vectors as the quantized word2vec binary for the words it keeps
+
+    Args:
+        factory: (mentor_classifier.classifiers.ClassifierFactory)
+        mentors: (list of str) ids of mentors with a test set
+        test_set: (str) file name of the test sets
+        precisions: (list of str) precisions to compare with float32
+
+    Returns:
+        report: (dict) accuracy by precision by mentor,
+            and for each precision its mean accuracy and accuracy_delta (vs float32) over all mentors
+    """
+    precisions = [PRECISION_DEFAULT] + [p for p in precisions if p != PRECISION_DEFAULT]
+    accuracy = {
+        m: {
+            p: Metrics().test_accuracy(factory.create(m, w2v_precision=p), test_set)
+            for p in precisions
+        }
+        for m in mentors
+    }
+    summary = {}
+    for p in precisions:
+        mean = sum(a[p] for a in accuracy.values()) / len(mentors) if mentors else 0.0
+        summary[p] = dict(accuracy=mean)
+    for p in precisions:
+        summary[p]["accuracy_delta"] = (
+            summary[p]["accuracy"] - summary[PRECISION_DEFAULT]["accuracy"]
+        )
+    return dict(mentors=accuracy, precisions=summary)
+
+
+def quantize() -> None:
+    """
+    Saves the word2vec binary W2V_FILE_NAME under W2V_ROOT at each of the precisions in W2V_PRECISIONS
+    (comma-separated, default float16,int8), then tests CHECKPOINT of ARCH with each precision
+    on TEST_SET for every mentor in MENTOR (comma-separated, default all mentors with that test set)
+    and reports the accuracy delta vs float32, to pick a precision for a deployment.
+    Also saves the stem table of CHECKPOINT at each precision, ready to serve with W2V_PRECISION.
+    With W2V_REPORT set, writes the json report to that path
+    """
+    W2V_FILE_NAME = os.getenv("W2V_FILE_NAME") or W2V_FILE_NAME_DEFAULT
+    W2V_PRECISIONS = os.getenv("W2V_PRECISIONS") or "float16,int8"
+    W2V_REPORT = os.getenv("W2V_REPORT")
+    ARCH = os.getenv("ARCH")
+    CHECKPOINT = os.getenv("CHECKPOINT")
+    CHECKPOINT_ROOT = os.getenv("CHECKPOINT_ROOT") or "/app/checkpoint"
+    MENTOR = os.getenv("MENTOR")
+    TEST_SET = os.getenv("TEST_SET") or "test_set.csv"
+    precisions = W2V_PRECISIONS.split(",")
+    full = find_w2v(W2V_FILE_NAME, precision=PRECISION_DEFAULT)
+    report = dict(w2v=W2V_FILE_NAME, vectors_bytes={})
+    for p in precisions:
+        if p == PRECISION_DEFAULT:
+            continue
+        path = save_quantized_w2v(full, p)
+        report["vectors_bytes"][p] = _vectors_bytes(path)
+        print(f"SAVED {p} {path} ({report['vectors_bytes'][p] / 2 ** 20:.1f} MB)")
+    cp = find_checkpoint(
+        checkpoint_root=CHECKPOINT_ROOT,
+        arch=ARCH or ARCH_DEFAULT,
+        checkpoint=CHECKPOINT,
+    )
+    if cp:
+        for path in save_checkpoint_stem_tables(cp, precisions):
+            print(f"SAVED STEM TABLE {path}")
+    mentors = _test_mentors(TEST_SET, MENTOR)
+    if not mentors:
+        logging.warning(f"no test sets named {TEST_SET}, skipping accuracy comparison")
+    else:
+        factory = create_classifier_factory(
+            checkpoint_root=CHECKPOINT_ROOT, arch=ARCH, checkpoint=CHECKPOINT
+        )
+        print(
+            "ACCURACY: checkpoint stem tables are converted to each precision, "
+            "with the same vectors as the quantized binaries above"
+        )
+        report.update(compare_accuracy(factory, mentors, TEST_SET, precisions))
+        for m, accuracy in report["mentors"].items():
+            print(f"  MENTOR {m}")
+            for p, a in accuracy.items():
+                print(f"    {p}: {a:.4f}")
+        for p, s in report["precisions"].items():
+            print(
+                f"{p.upper()}: accuracy {s['accuracy']:.4f} (delta {s['accuracy_delta']:+.4f})"
+            )
+    if W2V_REPORT:
+        with open(W2V_REPORT, "w") as f:
+            json.dump(report, f, indent=2)
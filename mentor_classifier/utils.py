@@ -8,6 +8,9 @@
 Strips leading and ending whitespace and non-alphanumeric characters
 Returns sanitized string.
 """
+from string import ascii_letters, digits, whitespace
+
+_ALPHANUMERIC = frozenset(ascii_letters + digits + whitespace)
 
 
 def sanitize_string(InputString):
@@ -19,11 +22,7 @@ def sanitize_string(InputString):
 
 
 def extract_alphanumeric(InputString):
-    from string import ascii_letters, digits, whitespace
-
-    return "".join(
-        [ch for ch in InputString if ch in (ascii_letters + digits + whitespace)]
-    )
+    return "".join([ch for ch in InputString if ch in _ALPHANUMERIC])
 
 
 def normalize_topics(topics):
@@ -4,25 +4,366 @@
 #
 # The full terms of this copyright and license should always be found in the root directory of this software deliverable as "license.txt" and if these terms are not found with this software, please contact the USC Stevens Center for the full license.
 #
+from glob import escape, glob
+import logging
 import os
+import re
+import shutil
+import tempfile
+from threading import Lock
 
-from gensim.models.keyedvectors import KeyedVectors
 import numpy as np
 
 
+W2V_FILE_NAME_DEFAULT = "GoogleNews-vectors-negative300-SLIM.bin"
+W2V_ROOT_DEFAULT = os.path.join("checkpoint", "vector_models")
+
+
+def _w2v_root(w2v_root: str = None) -> str:
+    return w2v_root or os.getenv("W2V_ROOT") or W2V_ROOT_DEFAULT
+
+
+STEM_TABLE_DIR = "w2v_stems"
+# bump whenever a change to save_stem_table would change which keys a table keeps
+STEM_TABLE_VERSION = "2"
+# NLTKPreprocessor only emits lowercased stems of \w+ tokens
+_STEM_KEY = re.compile(r"\w+")
+PRECISIONS = ["float32", "float16", "int8"]
+PRECISION_DEFAULT = "float32"
+
+
+def _w2v_precision(precision: str = None) -> str:
+    precision = precision or os.getenv("W2V_PRECISION") or PRECISION_DEFAULT
+    assert (
+        precision in PRECISIONS
+    ), f"invalid w2v precision {precision} (expected one of {PRECISIONS})"
+    return precision
+
+
+def quantize_vectors(vectors, precision: str):
+    """
+    Converts float32 word vectors to a smaller precision.
+    int8 vectors are scaled per row, so each word keeps its full range
+
+    Args:
+        vectors: (np.ndarray) float32 vectors, one row per word
+        precision: (str) float32, float16 or int8
+
+    Returns:
+        quantized: (np.ndarray) vectors of dtype precision
+        scales: (np.ndarray) float32 scale of each row for int8 (dequantized = quantized * scale), otherwise None
+    """
+    vectors = np.asarray(vectors, dtype="float32")
+    if precision == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        quantized = np.round(vectors / scales[:, np.newaxis]).astype("int8")
+        return quantized, scales.astype("float32")
+    return vectors.astype(precision), None
+
+
+def _native_path(w2v_path: str) -> str:
+    return f"{w2v_path}.kv"
+
+
+def _is_native_current(native_path: str, w2v_path: str) -> bool:
+    try:
+        return os.path.getmtime(native_path) >= os.path.getmtime(w2v_path)
+    except OSError:
+        return False
+
+
+def _convert_to_native(w2v_path: str, native_path: str) -> None:
+    """
+    Converts a word2vec binary to gensim's native format, which can be memory mapped.
+    Writes to temp files first and renames them into place (main file last)
+    so that concurrent processes never load a partially written model
+    """
+    from gensim.models.keyedvectors import KeyedVectors
+
+    logging.info(f"converting word2vec model {w2v_path} to native format...")
+    model = KeyedVectors.load_word2vec_format(w2v_path, binary=True)
+    tmp_path = f"{native_path}.{os.getpid()}.tmp"
+    model.save(tmp_path)
+    for tmp_array_path in glob(f"{escape(tmp_path)}.*"):
+        os.replace(tmp_array_path, native_path + tmp_array_path[len(tmp_path) :])
+    os.replace(tmp_path, native_path)
+
+
+def _load_w2v_model(w2v_path: str, mmap: bool):
+    from gensim.models.keyedvectors import KeyedVectors
+
+    if not mmap:
+        return KeyedVectors.load_word2vec_format(w2v_path, binary=True)
+    native_path = _native_path(w2v_path)
+    if not _is_native_current(native_path, w2v_path):
+        try:
+            _convert_to_native(w2v_path, native_path)
+        except OSError as err:
+            logging.warning(
+                f"failed to convert {w2v_path} to native format (will load without mmap): {err}"
+            )
+            return KeyedVectors.load_word2vec_format(w2v_path, binary=True)
+    return KeyedVectors.load(native_path, mmap="r")
+
+
+def _array_precision(path: str) -> str:
+    try:
+        return np.load(os.path.join(path, "vectors.npy"), mmap_mode="r").dtype.name
+    except (OSError, ValueError):
+        return None
+
+
+class _ArrayVectors(object):
+    """
+    Read-only word vectors stored as a words.txt file (one word per line)
+    and a memory-mapped vectors.npy with one row per word,
+    either float32, float16 or int8 with a per-row scale in scales.npy (see quantize_vectors).
+    Only the rows looked up are converted back to float32.
+
+    Args:
+        path: (str) directory of the vectors
+        precision: (str) if different from the stored precision, the vectors are converted to it in memory,
+            which gives up memory mapping (prefer converting on disk, see save_stem_table_precision)
+    """
+
+    def __init__(self, path: str, precision: str = None):
+        with open(os.path.join(path, "words.txt"), encoding="utf-8") as f:
+            self.index2word = f.read().split("\n")
+        self.__index_by_word = {w: i for i, w in enumerate(self.index2word)}
+        self.__vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        scales_path = os.path.join(path, "scales.npy")
+        self.__scales = (
+            np.load(scales_path, mmap_mode="r") if os.path.exists(scales_path) else None
+        )
+        if precision and precision != self.__vectors.dtype.name:
+            self.__vectors, self.__scales = quantize_vectors(
+                self.__dequantize(slice(None)), precision
+            )
+        self.precision = self.__vectors.dtype.name
+
+    def __contains__(self, word):
+        return word in self.__index_by_word
+
+    def __getitem__(self, word):
+        return self.__dequantize(self.__index_by_word[word])
+
+    def __dequantize(self, rows):
+        if self.__scales is None and self.__vectors.dtype == np.float32:
+            return self.__vectors[rows]
+        vectors = np.asarray(self.__vectors[rows], dtype="float32")
+        if self.__scales is not None:
+            scales = self.__scales[rows]
+            vectors *= scales if np.ndim(scales) == 0 else scales[:, np.newaxis]
+        return vectors
+
+
+def _save_array_vectors(
+    w2v,
+    words,
+    to_path: str,
+    precision: str,
+    version: str = "",
+    chunk_size: int = 100000,
+) -> None:
+    """
+    Writes the vectors for some words of a W2V in the _ArrayVectors format,
+    a chunk of rows at a time so that the whole float32 matrix is never copied,
+    and a version.txt with version (to tell whether it needs to be written again).
+    Writes to a temp directory first and renames it into place,
+    so that other processes never load partially written vectors
+    """
+    parent, name = os.path.split(os.path.abspath(to_path))
+    os.makedirs(parent, exist_ok=True)
+    # unique per call, as other threads or processes may be writing the same vectors
+    tmp_path = tempfile.mkdtemp(prefix=f"{name}.", suffix=".tmp", dir=parent)
+    with open(os.path.join(tmp_path, "words.txt"), "w", encoding="utf-8") as f:
+        f.write("\n".join(words))
+    vectors = np.lib.format.open_memmap(
+        os.path.join(tmp_path, "vectors.npy"),
+        mode="w+",
+        dtype=precision,
+        shape=(len(words), 300),
+    )
+    scales = (
+        np.lib.format.open_memmap(
+            os.path.join(tmp_path, "scales.npy"),
+            mode="w+",
+            dtype="float32",
+            shape=(len(words),),
+        )
+        if precision == "int8"
+        else None
+    )
+    for start in range(0, len(words), chunk_size):
+        chunk = words[start : start + chunk_size]
+        quantized, chunk_scales = quantize_vectors(
+            np.array([w2v.get_vector(w) for w in chunk], dtype="float32").reshape(
+                len(chunk), 300
+            ),
+            precision,
+        )
+        vectors[start : start + len(chunk)] = quantized
+        if scales is not None:
+            scales[start : start + len(chunk)] = chunk_scales
+    vectors.flush()
+    del vectors
+    if scales is not None:
+        scales.flush()
+        del scales
+    with open(os.path.join(tmp_path, "w2v.txt"), "w") as f:
+        f.write(w2v.get_w2v_file_name())
+    with open(os.path.join(tmp_path, "version.txt"), "w") as f:
+        f.write(version)
+    # move the old vectors aside (rather than deleting them in place) so that to_path is only missing
+    # between two renames, and processes that memory mapped them keep their pages
+    old_path = f"{tmp_path[:-len('.tmp')]}.old"
+    try:
+        os.rename(to_path, old_path)
+    except OSError:
+        old_path = None
+    try:
+        os.rename(tmp_path, to_path)
+    except OSError:
+        # another process put the same vectors in place first
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    if old_path:
+        shutil.rmtree(old_path, ignore_errors=True)
+
+
+def quantized_w2v_path(w2v_path: str, precision: str) -> str:
+    return f"{w2v_path}.{precision}"
+
+
+def save_quantized_w2v(w2v, precision: str, to_path: str = None) -> str:
+    """
+        Writes all the vectors of a W2V at a smaller precision (see quantize_vectors),
+        to load with W2V(precision=precision).
+        Does nothing if the vectors at to_path are already newer than the word2vec binary.
+
+        Args:
+            w2v: (mentor_classifier.w2v.W2V) the full model
+            precision: (str) float16 or int8
+            to_path: (str) directory to write the vectors to (default next to the word2vec binary)
+
+        Returns:
+            path: (str) directory of the quantized vectors
+    """
+    to_path = to_path or quantized_w2v_path(w2v.get_w2v_path(), precision)
+    if (
+        _is_native_current(os.path.join(to_path, "w2v.txt"), w2v.get_w2v_path())
+        and _array_precision(to_path) == precision
+    ):
+        return to_path
+    logging.info(f"saving {w2v.get_w2v_file_name()} as {precision} to {to_path}...")
+    _save_array_vectors(w2v, list(w2v.get_words()), to_path, precision)
+    return to_path
+
+
+def _load_quantized_w2v(w2v_path: str, precision: str, mmap: bool) -> _ArrayVectors:
+    path = quantized_w2v_path(w2v_path, precision)
+    if not (
+        _is_native_current(os.path.join(path, "w2v.txt"), w2v_path)
+        and _array_precision(path) == precision
+    ):
+        full = W2V(
+            os.path.basename(w2v_path),
+            w2v_root=os.path.dirname(w2v_path),
+            precision=PRECISION_DEFAULT,
+            mmap=mmap,
+        )
+        save_quantized_w2v(full, precision, path)
+    return _ArrayVectors(path)
+
+
 class W2V(object):
-    def __init__(self, w2v_file_name="GoogleNews-vectors-negative300-SLIM.bin"):
+    """
+    Word vectors for preprocessed questions.
+
+    Prefer find_w2v() to constructing a W2V directly,
+    so that all classifiers and trainers in a process share one instance.
+
+    Args:
+        w2v_file_name: (str) file name of the word2vec binary
+        w2v_root: (str) directory containing the word2vec binary.
+            Defaults to env W2V_ROOT or checkpoint/vector_models
+        mmap: (bool) if true, load a memory-mapped, read-only copy of the vectors
+            (converting the binary to gensim's native format on first use)
+        w2v_model: vectors to use in place of loading the word2vec binary
+            (e.g. a stem table, see find_stem_table)
+        precision: (str) float32, or float16 or int8 to use quantized vectors that take 1/2 or 1/4 of the memory
+            (converting the binary with save_quantized_w2v on first use).
+            Defaults to env W2V_PRECISION or float32. Ignored if w2v_model is passed
+    """
+
+    def __init__(
+        self,
+        w2v_file_name: str = W2V_FILE_NAME_DEFAULT,
+        w2v_root: str = None,
+        mmap: bool = True,
+        w2v_model=None,
+        precision: str = None,
+    ):
         self.__w2v_file_name = w2v_file_name
-        self.__w2v_path = os.path.join(
-            "checkpoint", "vector_models", self.__w2v_file_name
-        )
-        self.__w2v_model = KeyedVectors.load_word2vec_format(
-            self.__w2v_path, binary=True
+        self.__w2v_path = os.path.join(_w2v_root(w2v_root), w2v_file_name)
+        self.__w2v_model_type = (
+            type(w2v_model).__name__ if w2v_model is not None else ""
         )
+        if w2v_model is not None:
+            self.__precision = getattr(w2v_model, "precision", PRECISION_DEFAULT)
+            self.__w2v_model = w2v_model
+        else:
+            self.__precision = _w2v_precision(precision)
+            self.__w2v_model = (
+                _load_w2v_model(self.__w2v_path, mmap)
+                if self.__precision == PRECISION_DEFAULT
+                else _load_quantized_w2v(self.__w2v_path, self.__precision, mmap)
+            )
 
     def get_w2v_file_name(self):
         return self.__w2v_file_name
 
+    def get_w2v_path(self):
+        return self.__w2v_path
+
+    def get_precision(self) -> str:
+        return self.__precision
+
+    def get_version(self) -> str:
+        """
+        Returns:
+            version: (str) file name, size and modified time of the word2vec binary
+                (and the type of w2v_model if one was passed in, and the precision if not float32)
+        """
+        version = self.__w2v_file_name
+        try:
+            st = os.stat(self.__w2v_path)
+            version = f"{version}:{st.st_size}:{st.st_mtime_ns}"
+        except OSError:
+            pass
+        if self.__w2v_model_type:
+            # e.g. a stem table, which only has some of the binary's words
+            version = f"{version}:{self.__w2v_model_type}"
+        if self.__precision != PRECISION_DEFAULT:
+            version = f"{version}:{self.__precision}"
+        return version
+
+    def get_words(self):
+        return self.__w2v_model.index2word
+
+    def get_vector(self, word):
+        return self.__w2v_model[word]
+
+    def count_oov(self, question) -> int:
+        """
+        Args:
+            question: (list) preprocessed tokens of a question
+
+        Returns:
+            n: (int) number of tokens with no vector (which w2v_for_question treats as zeros)
+        """
+        return sum(1 for word in question if word not in self.__w2v_model)
+
     def w2v_for_question(self, question):
         current_vector = np.zeros(300, dtype="float32")
         lstm_vector = []
@@ -34,3 +375,172 @@ class W2V(object):
             lstm_vector.append(word_vector)
             current_vector += word_vector
         return current_vector, lstm_vector
+
+
+_w2v_by_path = {}
+_w2v_lock = Lock()
+
+
+def find_w2v(
+    w2v_file_name: str = W2V_FILE_NAME_DEFAULT,
+    w2v_root: str = None,
+    precision: str = None,
+) -> W2V:
+    """
+        Finds the memory-mapped W2V shared by the whole process, loading it on first use.
+        Other processes that load the same model share its pages through the page cache.
+
+        Args:
+            w2v_file_name: (str) file name of the word2vec binary
+            w2v_root: (str) directory containing the word2vec binary
+            precision: (str) float32, float16 or int8 (default env W2V_PRECISION or float32, see W2V)
+
+        Returns:
+            w2v: (mentor_classifier.w2v.W2V)
+    """
+    precision = _w2v_precision(precision)
+    w2v_path = os.path.abspath(os.path.join(_w2v_root(w2v_root), w2v_file_name))
+    key = (w2v_path, precision)
+    with _w2v_lock:
+        if key not in _w2v_by_path:
+            _w2v_by_path[key] = W2V(
+                w2v_file_name, w2v_root=w2v_root, precision=precision
+            )
+        return _w2v_by_path[key]
+
+
+def stem_table_path(checkpoint: str) -> str:
+    return os.path.join(checkpoint, STEM_TABLE_DIR)
+
+
+def _stem_table_source(path: str) -> str:
+    try:
+        with open(os.path.join(path, "w2v.txt")) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _stem_table_version(w2v: W2V) -> str:
+    return f"{STEM_TABLE_VERSION}:{w2v.get_version()}"
+
+
+def _read_stem_table_version(path: str) -> str:
+    try:
+        with open(os.path.join(path, "version.txt")) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def save_stem_table(w2v: W2V, to_path: str) -> None:
+    """
+        Writes the vectors for only those keys of a W2V that questions can hit,
+        at the same precision as the W2V.
+        Questions are looked up after NLTKPreprocessor has split them into word-character tokens,
+        lowercased and stemmed them, so every key that is a lowercase word-character token is kept
+        (not just keys that are the stem of some key: Porter stemming isn't idempotent,
+        e.g. 'recurses' stems to 'recurs' but 'recurs' stems to 'recur').
+        Does nothing if a table for the same word2vec model (file, size and modified time) is already at to_path.
+
+        Args:
+            w2v: (mentor_classifier.w2v.W2V) the full model
+            to_path: (str) directory to write the table to
+    """
+    version = _stem_table_version(w2v)
+    if _read_stem_table_version(to_path) == version:
+        return
+    logging.info(f"building stem table for {w2v.get_w2v_file_name()}...")
+    words = w2v.get_words()
+    stems = [w for w in words if w == w.lower() and _STEM_KEY.fullmatch(w)]
+    _save_array_vectors(w2v, stems, to_path, w2v.get_precision(), version=version)
+    logging.info(f"saved stem table of {len(stems)}/{len(words)} words to {to_path}")
+
+
+def stem_table_precision_path(path: str, precision: str) -> str:
+    # inside the stem table's dir, so a checkpoint never gets more top-level dirs than its mentors
+    return os.path.join(path, precision)
+
+
+def _stem_table_precision_version(path: str, precision: str) -> str:
+    return f"{_read_stem_table_version(path)}:{precision}"
+
+
+def _is_stem_table_precision_current(path: str, precision: str) -> bool:
+    to_path = stem_table_precision_path(path, precision)
+    return (
+        _read_stem_table_version(to_path)
+        == _stem_table_precision_version(path, precision)
+        and _array_precision(to_path) == precision
+    )
+
+
+def save_stem_table_precision(path: str, precision: str) -> str:
+    """
+        Converts the stem table at path to another precision (see quantize_vectors) and saves it
+        in a subdirectory (see stem_table_precision_path), so it can be memory mapped like the original.
+        Meant for training and tools, as serving never writes to a checkpoint (see find_stem_table).
+        The vectors are the same as the stem table of a W2V at that precision
+        (unless the original was saved at a lower precision).
+        Does nothing if the table is already at that precision
+        or was already converted from the same original.
+
+        Args:
+            path: (str) directory of the stem table (see save_stem_table)
+            precision: (str) float32, float16 or int8
+
+        Returns:
+            path: (str) directory of the stem table at precision
+    """
+    source = _ArrayVectors(path)
+    if source.precision == precision:
+        return path
+    to_path = stem_table_precision_path(path, precision)
+    if _is_stem_table_precision_current(path, precision):
+        return to_path
+    logging.info(f"converting stem table {path} to {precision}...")
+    _save_array_vectors(
+        W2V(_stem_table_source(path), w2v_model=source),
+        source.index2word,
+        to_path,
+        precision,
+        version=_stem_table_precision_version(path, precision),
+    )
+    return to_path
+
+
+def find_stem_table(path: str, precision: str = None) -> W2V:
+    """
+        Finds the W2V for the stem table saved at path (see save_stem_table),
+        shared by the whole process and loaded on first use.
+
+        Args:
+            path: (str) directory of the stem table
+            precision: (str) float32, float16 or int8 (default env W2V_PRECISION or the precision it was saved with).
+                Uses the table converted to that precision by save_stem_table_precision if there is one,
+                otherwise converts it in memory (nothing is written to a deployed checkpoint)
+
+        Returns:
+            w2v: (mentor_classifier.w2v.W2V) or None if there is no stem table at path
+    """
+    path = os.path.abspath(path)
+    precision = precision or os.getenv("W2V_PRECISION")
+    key = (path, precision)
+    with _w2v_lock:
+        if key not in _w2v_by_path:
+            w2v_file_name = _stem_table_source(path)
+            if not w2v_file_name:
+                return None
+            table_path = path
+            if precision and precision != _array_precision(path):
+                if _is_stem_table_precision_current(path, precision):
+                    table_path = stem_table_precision_path(path, precision)
+                else:
+                    logging.warning(
+                        f"stem table {path} has not been saved as {precision} (see save_stem_table_precision), "
+                        "converting it in memory"
+                    )
+            _w2v_by_path[key] = W2V(
+                w2v_file_name, w2v_model=_ArrayVectors(table_path, precision)
+            )
+        return _w2v_by_path[key]
@@ -4,7 +4,13 @@
 #
 # The full terms of this copyright and license should always be found in the root directory of this software deliverable as "license.txt" and if these terms are not found with this software, please contact the USC Stevens Center for the full license.
 #
+import json
 import os
+from threading import Lock
+
+import numpy as np
+
+from mentor_classifier.classifiers import CheckpointClassifierFactory, Classifier
 
 
 def resource_root_for_test(test_file: str) -> str:
@@ -17,3 +23,154 @@ def resource_root_for_test(test_file: str) -> str:
 
 def resource_root_checkpoints_for_test(test_file: str) -> str:
     return os.path.join(resource_root_for_test(test_file), "checkpoint")
+
+
+def write_lstm_v1_checkpoint(
+    checkpoint: str, mentor, words, answers=None, n_topics=3, n_units=8, seed=1
+) -> None:
+    """
+    Writes a small lstm_v1 checkpoint for a mentor with random weights,
+    that LSTMClassifier can load with topic_model_backend='numpy':
+    the topic model in keras' h5 layout, a ridge fused_model.pkl that picks one of answers
+    (default all the mentor's answers) and a stem table with random vectors for words
+    """
+    import h5py
+    from sklearn.externals import joblib
+    from sklearn.linear_model import RidgeClassifier
+
+    from mentor_classifier.w2v import W2V, save_stem_table, stem_table_path
+
+    rng = np.random.RandomState(seed)
+    model_path = os.path.join(checkpoint, mentor.id)
+    os.makedirs(model_path, exist_ok=True)
+    layers = [
+        dict(class_name="LSTM", config=dict(name="lstm", activation="tanh")),
+        dict(class_name="Dense", config=dict(name="dense", activation="linear")),
+        dict(class_name="Activation", config=dict(activation="softmax")),
+    ]
+    weights = dict(
+        lstm=dict(
+            kernel=rng.randn(300, 4 * n_units) * 0.1,
+            recurrent_kernel=rng.randn(n_units, 4 * n_units) * 0.1,
+            bias=np.zeros(4 * n_units),
+        ),
+        dense=dict(kernel=rng.randn(n_units, n_topics), bias=np.zeros(n_topics)),
+    )
+    with h5py.File(os.path.join(model_path, "lstm_topic_model.h5"), "w") as f:
+        f.attrs["model_config"] = json.dumps(
+            dict(class_name="Sequential", config=dict(layers=layers))
+        )
+        for layer_name, layer_weights in weights.items():
+            group = f.create_group(f"model_weights/{layer_name}")
+            group.attrs["weight_names"] = [n.encode("utf8") for n in layer_weights]
+            for name, w in layer_weights.items():
+                group[name] = w.astype("float32")
+    answers = answers or sorted(set(mentor.ids_answers.values()))
+    x = rng.randn(len(answers) * 4, 300 + n_topics)
+    y = [answers[i % len(answers)] for i in range(len(x))]
+    joblib.dump(
+        RidgeClassifier().fit(x, y), os.path.join(model_path, "fused_model.pkl")
+    )
+
+    vectors = FakeKeyedVectors(words, rng.randn(len(words), 300))
+    save_stem_table(W2V("fake.bin", w2v_model=vectors), stem_table_path(checkpoint))
+
+
+class FakeKeyedVectors(object):
+    """
+    Word vectors to pass as a W2V's w2v_model in place of gensim's KeyedVectors
+    (random unless vectors are passed)
+    """
+
+    def __init__(self, words, vectors=None):
+        self.index2word = list(words)
+        self.vectors = (
+            vectors if vectors is not None else np.random.rand(len(words), 300)
+        ).astype("float32")
+
+    def __getitem__(self, word):
+        return self.vectors[self.index2word.index(word)]
+
+
+class FakeMentor(object):
+    def __init__(self, id="mentor_01"):
+        self.id = id
+
+
+class FakeClassifier(Classifier):
+    """
+    Answers questions from answers (dict of question => (answer_id, answer_text)),
+    raising ValueError for any other question, or if answers isn't passed echoes each question
+    as (f'{classifier_id}:{question}', question, float(canned_question_match_disabled)).
+    Records the questions of every get_answers call in batches
+    """
+
+    def __init__(
+        self,
+        answers=None,
+        mentor_id="mentor_01",
+        classifier_id="checkpoint_1",
+        size=100,
+    ):
+        self.answers = answers
+        self.mentor = FakeMentor(mentor_id)
+        self.classifier_id = classifier_id
+        self.size = size
+        self.batches = []
+
+    @property
+    def questions_asked(self):
+        return [q for batch in self.batches for q in batch]
+
+    def answer(self, question, canned_question_match_disabled=False):
+        if self.answers is None:
+            return (
+                f"{self.classifier_id}:{question}",
+                question,
+                float(canned_question_match_disabled),
+            )
+        if question not in self.answers:
+            raise ValueError(question)
+        answer_id, answer_text = self.answers[question]
+        return answer_id, answer_text, 0.5
+
+    def get_answer(self, question, canned_question_match_disabled=False):
+        return self.get_answers([question], canned_question_match_disabled)[0]
+
+    def get_answers(self, questions, canned_question_match_disabled=False):
+        self.batches.append(list(questions))
+        return [self.answer(q, canned_question_match_disabled) for q in questions]
+
+    def get_answer_candidates(
+        self, question, k=1, canned_question_match_disabled=False
+    ):
+        return [
+            (f"{self.classifier_id}:{question}:{i}", question, -i) for i in range(k)
+        ]
+
+    def get_classifier_id(self):
+        return self.classifier_id
+
+    def estimate_memory_bytes(self):
+        return self.size
+
+
+class FakeClassifierFactory(CheckpointClassifierFactory):
+    """
+    Creates classifiers with create_classifier(checkpoint, mentors, **kwargs)
+    (default a FakeClassifier for the mentor), recording the checkpoint and mentors of every call in created
+    """
+
+    def __init__(self, create_classifier=None):
+        self.create_classifier = create_classifier or (
+            lambda checkpoint, mentors, **kwargs: FakeClassifier(
+                mentor_id=mentors, classifier_id=mentors
+            )
+        )
+        self.created = []
+        self.__lock = Lock()
+
+    def create(self, checkpoint, mentors, **kwargs):
+        with self.__lock:
+            self.created.append((checkpoint, mentors))
+        return self.create_classifier(checkpoint, mentors, **kwargs)
@@ -0,0 +1,144 @@
+#
+# This software is Copyright ©️ 2020 The University of Southern California. All Rights Reserved.
+# Permission to use, copy, modify, and distribute this software and its documentation for educational, research and non-profit purposes, without fee, and without a written agreement is hereby granted, provided that the above copyright notice and subject to the full license file found in the root of this software deliverable. Permission to make commercial use of this software may be obtained by contacting:  USC Stevens Center for Innovation University of Southern California 1150 S. Olive Street, Suite 2300, Los Angeles, CA 90115, USA Email: accounting@stevens.usc.edu
+#
+# The full terms of this copyright and license should always be found in the root directory of this software deliverable as "license.txt" and if these terms are not found with this software, please contact the USC Stevens Center for the full license.
+#
+import asyncio
+from threading import Event
+
+import pytest
+
+from mentor_classifier.classifiers.async_classifier import AsyncClassifier
+from .helpers import FakeClassifier
+
+
+class _RecordingClassifier(FakeClassifier):
+    def answer(self, question, canned_question_match_disabled=False):
+        if question == "explode":
+            raise Exception("classifier failed")
+        return super().answer(question, canned_question_match_disabled)
+
+
+def _run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def test_concurrent_questions_run_as_one_batch_and_share_duplicates():
+    classifier = _RecordingClassifier()
+    async_classifier = AsyncClassifier(classifier, max_wait_ms=50)
+    questions = ["a", "b", "a", "c", "b", "a"]
+
+    async def ask_all():
+        return await asyncio.gather(
+            *[async_classifier.aget_answer(q) for q in questions]
+        )
+
+    answers = _run(ask_all())
+    assert answers == [(f"checkpoint_1:{q}", q, 0.0) for q in questions]
+    assert classifier.batches == [["a", "b", "c"]]
+    stats = async_classifier.get_stats()
+    assert (stats["requests"], stats["shared"], stats["batches"]) == (6, 3, 1)
+    async_classifier.close()
+
+
+def test_it_splits_batches_at_max_batch_size_and_by_canned_match_flag():
+    classifier = _RecordingClassifier()
+    async_classifier = AsyncClassifier(classifier, max_wait_ms=50, max_batch_size=2)
+
+    async def ask_all():
+        return await asyncio.gather(
+            async_classifier.aget_answer("a"),
+            async_classifier.aget_answer("b"),
+            async_classifier.aget_answer("c"),
+            async_classifier.aget_answer("c", canned_question_match_disabled=True),
+        )
+
+    answers = _run(ask_all())
+    assert answers[2] == ("checkpoint_1:c", "c", 0.0)
+    assert answers[3] == ("checkpoint_1:c", "c", 1.0)
+    assert sorted(classifier.batches) == [["a", "b"], ["c"], ["c"]]
+    async_classifier.close()
+
+
+def test_a_failed_batch_is_retried_one_question_at_a_time():
+    classifier = _RecordingClassifier()
+    async_classifier = AsyncClassifier(classifier, max_wait_ms=50)
+
+    async def ask_all():
+        return await asyncio.gather(
+            async_classifier.aget_answer("explode"),
+            async_classifier.aget_answer("a"),
+            return_exceptions=True,
+        )
+
+    results = _run(ask_all())
+    with pytest.raises(Exception, match="classifier failed"):
+        raise results[0]
+    assert results[1] == ("checkpoint_1:a", "a", 0.0)
+    assert classifier.batches == [["explode", "a"], ["explode"], ["a"]]
+    assert async_classifier.get_stats()["waiting"] == 0
+    async_classifier.close()
+
+
+def test_questions_without_an_answer_fail_instead_of_hanging():
+    class _ShortClassifier(_RecordingClassifier):
+        def get_answers(self, questions, canned_question_match_disabled=False):
+            return super().get_answers(questions)[:1]
+
+    async_classifier = AsyncClassifier(_ShortClassifier(), max_wait_ms=50)
+
+    async def ask_all():
+        return await asyncio.wait_for(
+            asyncio.gather(
+                async_classifier.aget_answer("a"),
+                async_classifier.aget_answer("b"),
+                return_exceptions=True,
+            ),
+            timeout=5,
+        )
+
+    results = _run(ask_all())
+    assert results[0] == ("checkpoint_1:a", "a", 0.0)
+    with pytest.raises(Exception, match="1 answers for 2 questions"):
+        raise results[1]
+    async_classifier.close()
+
+
+def test_requests_pending_at_close_fail_instead_of_hanging():
+    release = Event()
+
+    class _SlowClassifier(_RecordingClassifier):
+        def get_answers(self, questions, canned_question_match_disabled=False):
+            release.wait(5)
+            return super().get_answers(questions, canned_question_match_disabled)
+
+    async_classifier = AsyncClassifier(
+        _SlowClassifier(), max_wait_ms=10000, max_batch_size=2
+    )
+
+    async def ask_all():
+        # a and b are sent to the classifier, c waits for a batch that never comes
+        requests = asyncio.gather(
+            async_classifier.aget_answer("a"),
+            async_classifier.aget_answer("b"),
+            async_classifier.aget_answer("c"),
+            return_exceptions=True,
+        )
+        await asyncio.sleep(0.05)
+        async_classifier.close()
+        return await asyncio.wait_for(requests, timeout=5)
+
+    try:
+        results = _run(ask_all())
+    finally:
+        release.set()
+    for result in results:
+        with pytest.raises(Exception, match="closed before answering"):
+            raise result
+    with pytest.raises(Exception, match="closed"):
+        _run(async_classifier.aget_answer("d"))
@@ -0,0 +1,94 @@
+#
+# This software is Copyright ©️ 2020 The University of Southern California. All Rights Reserved.
+# Permission to use, copy, modify, and distribute this software and its documentation for educational, research and non-profit purposes, without fee, and without a written agreement is hereby granted, provided that the above copyright notice and subject to the full license file found in the root of this software deliverable. Permission to make commercial use of this software may be obtained by contacting:  USC Stevens Center for Innovation University of Southern California 1150 S. Olive Street, Suite 2300, Los Angeles, CA 90115, USA Email: accounting@stevens.usc.edu
+#
+# The full terms of this copyright and license should always be found in the root directory of this software deliverable as "license.txt" and if these terms are not found with this software, please contact the USC Stevens Center for the full license.
+#
+import os
+
+import numpy as np
+import pytest
+
+from mentor_classifier.tools.benchmark import (
+    benchmark,
+    compare_results,
+    generate_mentor,
+    generate_w2v,
+)
+
+
+def test_generate_mentor_at_configured_size(tmpdir):
+    m = generate_mentor(
+        str(tmpdir), "mentor_generated", 30, n_paraphrases_max=0, n_topics=10
+    )
+    assert len(m.ids_questions) == 30
+    assert all(len(questions) == 1 for questions in m.ids_questions.values())
+    # less Navy, which Mentor always strips
+    assert len(m.topics) == 9
+    assert m.utterances_by_type
+
+
+def test_generate_w2v_writes_a_word2vec_binary(tmpdir):
+    gensim_models = pytest.importorskip("gensim.models")
+    path = str(tmpdir.join("w2v.bin"))
+    words = generate_w2v(path, n_words=100)
+    assert len(words) == 100
+    assert "navy" in words
+    vectors = gensim_models.KeyedVectors.load_word2vec_format(path, binary=True)
+    assert vectors["navy"].shape == (300,)
+    assert np.abs(vectors["navy"]).max() <= 0.25
+
+
+def test_compare_results_flags_regressions():
+    base = dict(
+        results=[dict(rows=10, load_seconds=1.0, throughput=100.0, train_seconds=5.0)]
+    )
+    new = dict(
+        results=[dict(rows=10, load_seconds=1.5, throughput=95.0, train_seconds=4.0)]
+    )
+    changes = {c["result"]: c for c in compare_results(base, new, tolerance=0.1)}
+    assert changes["load_seconds"]["regression"]
+    assert not changes["throughput"]["regression"]
+    assert not changes["train_seconds"]["regression"]
+    assert changes["train_seconds"]["ratio"] == 0.8
+
+
+def test_benchmark_passes_its_w2v_root_instead_of_setting_env(tmpdir, monkeypatch):
+    from mentor_classifier import classifiers
+    from mentor_classifier.classifiers import training
+
+    monkeypatch.setenv("W2V_ROOT", "/original/vector_models")
+    w2v_roots = []
+
+    class _Training:
+        def train(self):
+            assert os.environ["W2V_ROOT"] == "/original/vector_models"
+
+        def save(self, to_path=None):
+            pass
+
+    class _TrainingFactory:
+        def create(self, checkpoint, mentors, w2v_root=None):
+            w2v_roots.append(w2v_root)
+            return _Training()
+
+    class _Classifier:
+        def get_answer(self, question):
+            return "a", "a", 1.0
+
+        def get_answers(self, questions):
+            return [self.get_answer(q) for q in questions]
+
+    def create_classifier(w2v_root=None, **kwargs):
+        w2v_roots.append(w2v_root)
+        return _Classifier()
+
+    monkeypatch.setattr(
+        training, "find_classifier_training_factory", lambda arch: _TrainingFactory()
+    )
+    monkeypatch.setattr(classifiers, "create_classifier", create_classifier)
+    result = benchmark(str(tmpdir), 20, n_questions=2)
+    assert result["rows"] == 20
+    assert result["throughput"] > 0
+    assert w2v_roots == [str(tmpdir.join("vector_models"))] * 2
+    assert os.environ["W2V_ROOT"] == "/original/vector_models"
@@ -0,0 +1,115 @@
+#
+# This software is Copyright ©️ 2020 The University of Southern California. All Rights Reserved.
+# Permission to use, copy, modify, and distribute this software and its documentation for educational, research and non-profit purposes, without fee, and without a written agreement is hereby granted, provided that the above copyright notice and subject to the full license file found in the root of this software deliverable. Permission to make commercial use of this software may be obtained by contacting:  USC Stevens Center for Innovation University of Southern California 1150 S. Olive Street, Suite 2300, Los Angeles, CA 90115, USA Email: accounting@stevens.usc.edu
+#
+# The full terms of this copyright and license should always be found in the root directory of this software deliverable as "license.txt" and if these terms are not found with this software, please contact the USC Stevens Center for the full license.
+#
+from mentor_classifier.classifiers.cache import CachingClassifier
+from .helpers import FakeClassifier
+
+
+class _FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_it_caches_answers_by_normalized_question():
+    classifier = FakeClassifier()
+    cache = CachingClassifier(classifier)
+    first = cache.get_answer("Who are you?")
+    assert cache.get_answer("  who are YOU?  ") == first
+    assert (
+        cache.get_answer("Who are you?", canned_question_match_disabled=True) != first
+    )
+    assert classifier.questions_asked == ["Who are you?", "Who are you?"]
+    stats = cache.get_stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (1, 2, 2)
+    assert stats["memory_bytes"] > 0
+
+
+def test_get_answers_only_asks_classifier_about_misses():
+    classifier = FakeClassifier()
+    cache = CachingClassifier(classifier)
+    cache.get_answer("b")
+    answers = cache.get_answers(["a", "b", "c"])
+    assert [a[1] for a in answers] == ["a", "b", "c"]
+    assert classifier.questions_asked == ["b", "a", "c"]
+
+
+def test_it_evicts_least_recently_used():
+    classifier = FakeClassifier()
+    cache = CachingClassifier(classifier, max_size=2)
+    cache.get_answer("a")
+    cache.get_answer("b")
+    cache.get_answer("a")
+    cache.get_answer("c")
+    cache.get_answer("a")
+    cache.get_answer("b")
+    assert classifier.questions_asked == ["a", "b", "c", "b"]
+    assert cache.get_stats()["evictions"] == 2
+
+
+def test_it_expires_answers_after_ttl():
+    classifier = FakeClassifier()
+    clock = _FakeClock()
+    cache = CachingClassifier(classifier, ttl=10, clock=clock)
+    cache.get_answer("a")
+    clock.now = 9
+    cache.get_answer("a")
+    clock.now = 10
+    cache.get_answer("a")
+    assert classifier.questions_asked == ["a", "a"]
+    assert cache.get_stats()["expirations"] == 1
+
+
+def test_it_clears_when_classifier_is_reloaded():
+    classifier = FakeClassifier()
+    cache = CachingClassifier(classifier)
+    assert cache.get_answer("a")[0] == "checkpoint_1:a"
+    classifier.classifier_id = "checkpoint_2"
+    assert cache.get_answer("a")[0] == "checkpoint_2:a"
+    cache.set_classifier(FakeClassifier(classifier_id="checkpoint_3"))
+    assert cache.get_answer("a")[0] == "checkpoint_3:a"
+    assert cache.classifier_id == "checkpoint_3"
+
+
+def test_it_does_not_cache_answers_from_a_classifier_swapped_while_answering():
+    class _SwappedWhileAnswering(FakeClassifier):
+        def get_answers(self, questions, canned_question_match_disabled=False):
+            answers = super().get_answers(questions, canned_question_match_disabled)
+            # a reload finishes while the old model is still answering
+            self.classifier_id = "checkpoint_2"
+            return answers
+
+    classifier = _SwappedWhileAnswering()
+    cache = CachingClassifier(classifier)
+    assert cache.get_answer("a")[0] == "checkpoint_1:a"
+    assert cache.get_stats()["size"] == 0
+    replaced = FakeClassifier(classifier_id="checkpoint_3")
+
+    class _ReplacedWhileAnswering(FakeClassifier):
+        def get_answers(self, questions, canned_question_match_disabled=False):
+            cache.set_classifier(replaced)
+            return super().get_answers(questions, canned_question_match_disabled)
+
+    cache.set_classifier(_ReplacedWhileAnswering())
+    assert cache.get_answer("a")[0] == "checkpoint_1:a"
+    assert cache.get_stats()["size"] == 0
+    assert cache.get_answer("a")[0] == "checkpoint_3:a"
+    assert cache.get_answer("a")[0] == "checkpoint_3:a"
+    assert replaced.questions_asked == ["a"]
+
+
+def test_it_passes_candidate_requests_through_uncached():
+    classifier = FakeClassifier()
+    cache = CachingClassifier(classifier)
+    assert [c[0] for c in cache.get_answer_candidates("a", k=3)] == [
+        "checkpoint_1:a:0",
+        "checkpoint_1:a:1",
+        "checkpoint_1:a:2",
+    ]
+    assert len(cache.get_answer_candidates("a", k=5)) == 5
+    assert cache.get_stats()["size"] == 0
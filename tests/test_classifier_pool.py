@@ -0,0 +1,72 @@
+#
+# This software is Copyright ©️ 2020 The University of Southern California. All Rights Reserved.
+# Permission to use, copy, modify, and distribute this software and its documentation for educational, research and non-profit purposes, without fee, and without a written agreement is hereby granted, provided that the above copyright notice and subject to the full license file found in the root of this software deliverable. Permission to make commercial use of this software may be obtained by contacting:  USC Stevens Center for Innovation University of Southern California 1150 S. Olive Street, Suite 2300, Los Angeles, CA 90115, USA Email: accounting@stevens.usc.edu
+#
+# The full terms of this copyright and license should always be found in the root directory of this software deliverable as "license.txt" and if these terms are not found with this software, please contact the USC Stevens Center for the full license.
+#
+from concurrent.futures import ThreadPoolExecutor
+import os
+import time
+
+import pytest
+
+from mentor_classifier.classifiers import register_classifier_factory
+from mentor_classifier.classifiers.pool import ClassifierPool
+from .helpers import FakeClassifier, FakeClassifierFactory
+
+ARCH = "fake_arch_for_test_classifier_pool"
+
+
+def _create_classifier(checkpoint, mentors, size=100, delay=0.0):
+    time.sleep(delay)
+    if mentors == "bad_mentor":
+        raise Exception("failed to load bad_mentor")
+    return FakeClassifier(mentor_id=mentors, classifier_id=mentors, size=size)
+
+
+@pytest.fixture
+def factory(tmpdir):
+    os.makedirs(os.path.join(str(tmpdir), ARCH, "2020-01-01-0000"))
+    fac = FakeClassifierFactory(_create_classifier)
+    register_classifier_factory(ARCH, fac)
+    return fac
+
+
+def test_it_loads_each_mentor_once(factory, tmpdir):
+    pool = ClassifierPool(checkpoint_root=str(tmpdir), arch=ARCH)
+    c1 = pool.get_classifier("m1")
+    assert pool.get_classifier("m1") is c1
+    assert pool.get_classifier("m2") is not c1
+    assert [m for _, m in factory.created] == ["m1", "m2"]
+    assert pool.get_stats()["memory_bytes"] == 200
+
+
+def test_it_evicts_least_recently_used_over_budget(factory, tmpdir):
+    pool = ClassifierPool(
+        checkpoint_root=str(tmpdir), arch=ARCH, memory_budget_bytes=250
+    )
+    pool.get_classifier("m1")
+    pool.get_classifier("m2")
+    pool.get_classifier("m1")
+    pool.get_classifier("m3")
+    assert pool.get_loaded_mentor_ids() == ["m1", "m3"]
+    assert pool.get_stats()["evictions"] == 1
+    pool.get_classifier("m2")
+    assert [m for _, m in factory.created] == ["m1", "m2", "m3", "m2"]
+
+
+def test_concurrent_first_requests_share_one_load(factory, tmpdir):
+    pool = ClassifierPool(checkpoint_root=str(tmpdir), arch=ARCH, delay=0.2)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        classifiers = list(executor.map(pool.get_classifier, ["m1"] * 8))
+    assert [m for _, m in factory.created] == ["m1"]
+    assert all(c is classifiers[0] for c in classifiers)
+
+
+def test_failed_load_is_retried(factory, tmpdir):
+    pool = ClassifierPool(checkpoint_root=str(tmpdir), arch=ARCH)
+    with pytest.raises(Exception, match="failed to load bad_mentor"):
+        pool.get_classifier("bad_mentor")
+    assert pool.get_loaded_mentor_ids() == []
+    with pytest.raises(Exception, match="failed to load bad_mentor"):
+        pool.get_classifier("bad_mentor")
@@ -0,0 +1,163 @@
+#
+# This software is Copyright ©️ 2020 The University of Southern California. All Rights Reserved.
+# Permission to use, copy, modify, and distribute this software and its documentation for educational, research and non-profit purposes, without fee, and without a written agreement is hereby granted, provided that the above copyright notice and subject to the full license file found in the root of this software deliverable. Permission to make commercial use of this software may be obtained by contacting:  USC Stevens Center for Innovation University of Southern California 1150 S. Olive Street, Suite 2300, Los Angeles, CA 90115, USA Email: accounting@stevens.usc.edu
+#
+# The full terms of this copyright and license should always be found in the root directory of this software deliverable as "license.txt" and if these terms are not found with this software, please contact the USC Stevens Center for the full license.
+#
+import gc
+import os
+from threading import Event, Thread
+import weakref
+
+import pytest
+
+from mentor_classifier.checkpoints import find_checkpoint_index, write_manifest
+from mentor_classifier.classifiers import register_classifier_factory
+from mentor_classifier.classifiers.reload import ReloadingClassifierFactory
+from .helpers import FakeClassifier, FakeClassifierFactory
+
+ARCH = "fake_arch_for_test_classifier_reload"
+
+
+class _FakeClassifier(FakeClassifier):
+    def __init__(self, checkpoint, mentor_id):
+        self.checkpoint = os.path.basename(checkpoint)
+        super().__init__(
+            mentor_id=mentor_id, classifier_id=f"{self.checkpoint}/{mentor_id}"
+        )
+        self.warmed = False
+        self.started = Event()
+        self.release = None
+        self.observer = None
+
+    def answer(self, question, canned_question_match_disabled=False):
+        return self.mentor.id, self.checkpoint, 1.0
+
+    def get_answers(self, questions, canned_question_match_disabled=False):
+        self.warmed = True
+        if self.release:
+            self.started.set()
+            self.release.wait()
+        return super().get_answers(questions, canned_question_match_disabled)
+
+    def set_observer(self, observer):
+        self.observer = observer
+
+    def get_match_stats(self):
+        return dict(checkpoint=self.checkpoint)
+
+
+def _create_classifier(checkpoint, mentors):
+    if os.path.exists(os.path.join(checkpoint, "missing_model")):
+        raise Exception("broken checkpoint")
+    return _FakeClassifier(checkpoint, mentors)
+
+
+def _write_checkpoint(checkpoint_root, name, manifest=True, broken=False):
+    cp = os.path.join(checkpoint_root, ARCH, name)
+    os.makedirs(cp, exist_ok=True)
+    if broken:
+        open(os.path.join(cp, "missing_model"), "w").close()
+    elif os.path.exists(os.path.join(cp, "missing_model")):
+        os.remove(os.path.join(cp, "missing_model"))
+    if manifest:
+        write_manifest(cp)
+    return cp
+
+
+@pytest.fixture
+def fake_factory():
+    return FakeClassifierFactory(_create_classifier)
+
+
+@pytest.fixture
+def checkpoint_root(tmpdir, fake_factory):
+    _write_checkpoint(str(tmpdir), "2020-01-01-0000")
+    register_classifier_factory(ARCH, fake_factory)
+    find_checkpoint_index(str(tmpdir)).stat_interval = 0
+    return str(tmpdir)
+
+
+def test_it_swaps_in_warmed_classifiers_for_a_new_checkpoint(checkpoint_root):
+    factory = ReloadingClassifierFactory(checkpoint_root, ARCH, start=False)
+    classifier = factory.create("m1")
+    assert classifier.get_answer("hi") == ("m1", "2020-01-01-0000", 1.0)
+    assert not factory.check_for_update()
+    old = weakref.ref(classifier.get_classifier())
+    _write_checkpoint(checkpoint_root, "2020-02-01-0000")
+    assert factory.check_for_update()
+    assert factory.get_checkpoint().endswith("2020-02-01-0000")
+    assert classifier.get_classifier().warmed
+    assert classifier.get_answer("hi") == ("m1", "2020-02-01-0000", 1.0)
+    assert factory.create("m2").get_answer("hi") == ("m2", "2020-02-01-0000", 1.0)
+    gc.collect()
+    assert old() is None
+
+
+def test_in_flight_requests_finish_on_the_old_classifier(checkpoint_root):
+    factory = ReloadingClassifierFactory(checkpoint_root, ARCH, start=False)
+    classifier = factory.create("m1")
+    release = Event()
+    classifier.get_classifier().release = release
+    started = classifier.get_classifier().started
+    old = weakref.ref(classifier.get_classifier())
+    answers = []
+    request = Thread(target=lambda: answers.append(classifier.get_answer("hi")))
+    request.start()
+    started.wait()
+    _write_checkpoint(checkpoint_root, "2020-02-01-0000")
+    assert factory.check_for_update()
+    gc.collect()
+    assert old() is not None
+    release.set()
+    request.join()
+    assert answers == [("m1", "2020-01-01-0000", 1.0)]
+    gc.collect()
+    assert old() is None
+
+
+def test_it_waits_for_a_checkpoint_to_be_complete_and_retries_it_once_changed(
+    checkpoint_root, fake_factory
+):
+    factory = ReloadingClassifierFactory(checkpoint_root, ARCH, start=False)
+    classifier = factory.create("m1")
+    fake_factory.created.clear()
+    # train() has started the checkpoint but not yet written its manifest
+    _write_checkpoint(checkpoint_root, "2020-03-01-0000", manifest=False, broken=True)
+    assert not factory.check_for_update()
+    assert [os.path.basename(cp) for cp, _ in fake_factory.created] == []
+    # complete, but fails to load: not retried until it changes
+    _write_checkpoint(checkpoint_root, "2020-03-01-0000", broken=True)
+    assert not factory.check_for_update()
+    assert not factory.check_for_update()
+    assert [os.path.basename(cp) for cp, _ in fake_factory.created] == [
+        "2020-03-01-0000"
+    ]
+    assert classifier.get_answer("hi") == ("m1", "2020-01-01-0000", 1.0)
+    # written again, e.g. by a retrained checkpoint
+    _write_checkpoint(checkpoint_root, "2020-03-01-0000")
+    assert factory.check_for_update()
+    assert classifier.get_answer("hi") == ("m1", "2020-03-01-0000", 1.0)
+
+
+def test_it_never_swaps_to_an_older_checkpoint(checkpoint_root):
+    # the newest checkpoint is still being written when the factory starts
+    _write_checkpoint(checkpoint_root, "2020-02-01-0000", manifest=False)
+    factory = ReloadingClassifierFactory(checkpoint_root, ARCH, start=False)
+    assert factory.get_checkpoint().endswith("2020-02-01-0000")
+    assert not factory.check_for_update()
+
+
+def test_it_forwards_observer_and_match_stats_to_the_current_classifier(
+    checkpoint_root,
+):
+    factory = ReloadingClassifierFactory(checkpoint_root, ARCH, start=False)
+    classifier = factory.create("m1")
+    observer = object()
+    classifier.set_observer(observer)
+    assert classifier.get_classifier().observer is observer
+    assert classifier.get_match_stats() == dict(checkpoint="2020-01-01-0000")
+    _write_checkpoint(checkpoint_root, "2020-02-01-0000")
+    assert factory.check_for_update()
+    assert classifier.get_classifier().observer is observer
+    assert classifier.get_match_stats() == dict(checkpoint="2020-02-01-0000")
@@ -5,10 +5,15 @@
 # The full terms of this copyright and license should always be found in the root directory of this software deliverable as "license.txt" and if these terms are not found with this software, please contact the USC Stevens Center for the full license.
 #
 import os
+from unittest.mock import patch
 
 import pytest
 
-from mentor_classifier.checkpoints import find_checkpoint
+from mentor_classifier.checkpoints import (
+    CheckpointIndex,
+    find_checkpoint,
+    write_manifest,
+)
 from .helpers import resource_root_checkpoints_for_test
 
 CHECKPOINTS_ROOT = resource_root_checkpoints_for_test(__file__)
@@ -24,3 +29,46 @@ def test_it_finds_the_newest_checkpoint_by_alpha(checkpoints_root, expected_chec
     )
     actual_checkpoint = find_checkpoint(checkpoints_root)
     assert expected_checkpoint_abs == actual_checkpoint
+
+
+def _make_checkpoint(arch_root, checkpoint, mentors):
+    for m in mentors:
+        os.makedirs(os.path.join(arch_root, checkpoint, m))
+        with open(os.path.join(arch_root, checkpoint, m, "w2v.txt"), "w") as f:
+            f.write("GoogleNews-vectors-negative300-SLIM.bin")
+
+
+def test_index_finds_new_checkpoints_once_stat_interval_passes(tmpdir):
+    now = [0.0]
+    arch_root = str(tmpdir.join("classifiers", "lstm_v1"))
+    _make_checkpoint(arch_root, "2020-01-01-0000", ["m1"])
+    index = CheckpointIndex(str(tmpdir), stat_interval=5.0, clock=lambda: now[0])
+    assert index.find_checkpoint("lstm_v1") == os.path.join(
+        arch_root, "2020-01-01-0000"
+    )
+    _make_checkpoint(arch_root, "2020-02-01-0000", ["m1", "m2"])
+    with patch("os.stat") as stat, patch("os.scandir") as scandir:
+        assert index.find_checkpoint("lstm_v1").endswith("2020-01-01-0000")
+        stat.assert_not_called()
+        scandir.assert_not_called()
+    now[0] = 10.0
+    assert index.find_checkpoint("lstm_v1").endswith("2020-02-01-0000")
+    assert index.get_archs() == ["lstm_v1"]
+    assert index.get_checkpoints("lstm_v1") == ["2020-01-01-0000", "2020-02-01-0000"]
+    assert index.get_mentors("lstm_v1") == {
+        "m1": {"w2v.txt": 39},
+        "m2": {"w2v.txt": 39},
+    }
+
+
+def test_index_reads_mentors_from_manifest(tmpdir):
+    arch_root = str(tmpdir.join("lstm_v1"))
+    _make_checkpoint(arch_root, "2020-01-01-0000", ["m1"])
+    for d in ("w2v_stems", "w2v_stems.abc123.tmp", "w2v_stems.abc123.old", ".sync"):
+        os.makedirs(os.path.join(arch_root, "2020-01-01-0000", d))
+    expected = write_manifest(os.path.join(arch_root, "2020-01-01-0000"))
+    assert expected == {"m1": {"w2v.txt": 39}}
+    index = CheckpointIndex(str(tmpdir))
+    with patch("os.walk") as walk:
+        assert index.get_mentors("lstm_v1", "2020-01-01-0000") == expected
+        walk.assert_not_called()
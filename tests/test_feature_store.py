@@ -0,0 +1,66 @@
+#
+# This software is Copyright ©️ 2020 The University of Southern California. All Rights Reserved.
+# Permission to use, copy, modify, and distribute this software and its documentation for educational, research and non-profit purposes, without fee, and without a written agreement is hereby granted, provided that the above copyright notice and subject to the full license file found in the root of this software deliverable. Permission to make commercial use of this software may be obtained by contacting:  USC Stevens Center for Innovation University of Southern California 1150 S. Olive Street, Suite 2300, Los Angeles, CA 90115, USA Email: accounting@stevens.usc.edu
+#
+# The full terms of this copyright and license should always be found in the root directory of this software deliverable as "license.txt" and if these terms are not found with this software, please contact the USC Stevens Center for the full license.
+#
+import numpy as np
+
+from mentor_classifier.feature_store import Featurizer, FeatureStore
+from mentor_classifier.nltk_preprocessor import NLTKPreprocessor
+from mentor_classifier.w2v import W2V
+from .helpers import FakeKeyedVectors
+
+
+def _w2v(file_name="fake.bin"):
+    return W2V(file_name, w2v_model=FakeKeyedVectors(["what", "is", "your", "name"]))
+
+
+def test_reuses_stored_features_across_runs(tmpdir):
+    path = str(tmpdir.join("features.db"))
+    w2v = _w2v()
+    questions = ["What is your name?", "what is your name", "What is your name?"]
+    store = FeatureStore(path)
+    featurizer = Featurizer(NLTKPreprocessor(), w2v, store)
+    expected = [featurizer.featurize(q) for q in questions]
+    store.close()
+    assert featurizer.get_stats() == dict(
+        questions=2, duplicates=1, hits=0, misses=2, hit_rate=0.0
+    )
+    store = FeatureStore(path)
+    featurizer = Featurizer(NLTKPreprocessor(), w2v, store)
+    for q, (tokens, vector, sequence) in zip(questions, expected):
+        actual_tokens, actual_vector, actual_sequence = featurizer.featurize(q)
+        assert actual_tokens == tokens
+        np.testing.assert_array_equal(actual_vector, vector)
+        np.testing.assert_array_equal(actual_sequence, sequence)
+    assert store.get_stats() == dict(hits=2, misses=0, hit_rate=1.0)
+    store.close()
+
+
+def test_featurizes_again_when_embedding_changes(tmpdir):
+    path = str(tmpdir.join("features.db"))
+    store = FeatureStore(path)
+    Featurizer(NLTKPreprocessor(), _w2v("a.bin"), store).featurize("your name")
+    Featurizer(NLTKPreprocessor(), _w2v("b.bin"), store).featurize("your name")
+    assert store.get_stats()["misses"] == 2
+    store.close()
+
+
+def test_evicts_least_recently_used_over_max_bytes(tmpdir):
+    path = str(tmpdir.join("features.db"))
+    w2v = _w2v()
+    store = FeatureStore(path, max_bytes=4000)
+    featurizer = Featurizer(NLTKPreprocessor(), w2v, store)
+    featurizer.featurize("what")
+    store.flush()
+    featurizer.featurize("is")
+    store.flush()
+    featurizer.featurize("your name")  # 3 words in all, about 3.6KB
+    store.close()
+    store = FeatureStore(path, max_bytes=4000)
+    featurizer = Featurizer(NLTKPreprocessor(), w2v, store)
+    for q in ["what", "is", "your name"]:
+        featurizer.featurize(q)
+    assert store.get_stats()["hits"] == 1
+    store.close()
@@ -0,0 +1,45 @@
+#
+# This software is Copyright ©️ 2020 The University of Southern California. All Rights Reserved.
+# Permission to use, copy, modify, and distribute this software and its documentation for educational, research and non-profit purposes, without fee, and without a written agreement is hereby granted, provided that the above copyright notice and subject to the full license file found in the root of this software deliverable. Permission to make commercial use of this software may be obtained by contacting:  USC Stevens Center for Innovation University of Southern California 1150 S. Olive Street, Suite 2300, Los Angeles, CA 90115, USA Email: accounting@stevens.usc.edu
+#
+# The full terms of this copyright and license should always be found in the root directory of this software deliverable as "license.txt" and if these terms are not found with this software, please contact the USC Stevens Center for the full license.
+#
+import pytest
+
+from mentor_classifier.fuzzy_index import FuzzyQuestionIndex
+from mentor_classifier.utils import sanitize_string
+
+QUESTIONS = {
+    "who are you and what do you do": "a1",
+    "what do you do": "a1",
+    "how do you spend most of your time off deployment": "a25",
+    "what is the navy doing to combat heavy alcohol use": "a32",
+    "what is the navy doing about alcohol": "a33",
+}
+
+
+@pytest.mark.parametrize(
+    "question,threshold,expected_answer_id",
+    [
+        ("Who are you and what do you do?", 0.8, "a1"),
+        ("Who are you, and what do yuo do?", 0.7, "a1"),
+        ("How do you spend most of you're time off deployment?", 0.8, "a25"),
+        ("How do you spend your time off deployment?", 0.8, "a25"),
+        ("How do you spend your time off deployment?", 0.85, None),
+        ("What is the navy doing?", 0.8, None),
+        ("Where are you from?", 0.5, None),
+        ("", 0.5, None),
+    ],
+)
+def test_it_finds_near_exact_questions(question, threshold, expected_answer_id):
+    index = FuzzyQuestionIndex(QUESTIONS)
+    match = index.find(sanitize_string(question), threshold)
+    assert (match[0] if match else None) == expected_answer_id
+    if match:
+        assert threshold <= match[1] <= 1.0
+
+
+def test_it_does_not_match_when_the_best_questions_have_different_answers():
+    index = FuzzyQuestionIndex({"what is your name": "a1", "what is your game": "a2"})
+    assert index.find("what is your fame", 0.5) is None
+    assert index.find("what is your name", 0.5) == ("a1", 1.0)
@@ -0,0 +1,40 @@
+#
+# This software is Copyright ©️ 2020 The University of Southern California. All Rights Reserved.
+# Permission to use, copy, modify, and distribute this software and its documentation for educational, research and non-profit purposes, without fee, and without a written agreement is hereby granted, provided that the above copyright notice and subject to the full license file found in the root of this software deliverable. Permission to make commercial use of this software may be obtained by contacting:  USC Stevens Center for Innovation University of Southern California 1150 S. Olive Street, Suite 2300, Los Angeles, CA 90115, USA Email: accounting@stevens.usc.edu
+#
+# The full terms of this copyright and license should always be found in the root directory of this software deliverable as "license.txt" and if these terms are not found with this software, please contact the USC Stevens Center for the full license.
+#
+import json
+import subprocess
+import sys
+
+import pytest
+
+HEAVY_MODULES = ["gensim", "h5py", "nltk", "pandas", "sklearn", "tensorflow"]
+
+
+def _heavy_modules_loaded_by(module: str):
+    out = subprocess.check_output(
+        [
+            sys.executable,
+            "-c",
+            f"import json, sys; import {module}; "
+            f"print(json.dumps([m for m in {HEAVY_MODULES} if m in sys.modules]))",
+        ]
+    )
+    return json.loads(out.decode("utf-8").strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize(
+    "module",
+    [
+        "mentor_classifier.checkpoints",
+        "mentor_classifier.mentor",
+        "mentor_classifier.classifiers",
+        "mentor_classifier.classifiers.arch.lstm_v1",
+        "mentor_classifier.classifiers.arch.lstm_v1.training",
+        "mentor_classifier.tools.checkpoint",
+    ],
+)
+def test_import_does_not_load_heavy_frameworks(module):
+    assert _heavy_modules_loaded_by(module) == []
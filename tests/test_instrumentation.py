@@ -0,0 +1,41 @@
+#
+# This software is Copyright ©️ 2020 The University of Southern California. All Rights Reserved.
+# Permission to use, copy, modify, and distribute this software and its documentation for educational, research and non-profit purposes, without fee, and without a written agreement is hereby granted, provided that the above copyright notice and subject to the full license file found in the root of this software deliverable. Permission to make commercial use of this software may be obtained by contacting:  USC Stevens Center for Innovation University of Southern California 1150 S. Olive Street, Suite 2300, Los Angeles, CA 90115, USA Email: accounting@stevens.usc.edu
+#
+# The full terms of this copyright and license should always be found in the root directory of this software deliverable as "license.txt" and if these terms are not found with this software, please contact the USC Stevens Center for the full license.
+#
+from mentor_classifier.instrumentation import (
+    Histogram,
+    InferenceObserver,
+    MetricsObserver,
+    MultiObserver,
+)
+
+
+def test_histogram_percentiles_are_bucket_bounds():
+    h = Histogram()
+    for ms in [0.5] * 90 + [3.0] * 9 + [100.0]:
+        h.record(ms)
+    snapshot = h.snapshot()
+    assert snapshot["count"] == 100
+    assert snapshot["max_ms"] == 100.0
+    assert snapshot["p50_ms"] == 0.64
+    assert snapshot["p95_ms"] == 5.12
+    assert snapshot["p99_ms"] == 5.12
+    assert h.percentile(100) == 100.0
+    assert sum(snapshot["buckets"].values()) == 100
+
+
+def test_metrics_observer_snapshot_and_reset():
+    observer = MetricsObserver()
+    other = InferenceObserver()
+    multi = MultiObserver([observer, other])
+    multi.on_stage("preprocess", 0.002, n=4)
+    multi.on_stage("preprocess", 0.001, n=1)
+    multi.on_count("oov_tokens", 3)
+    multi.on_count("oov_tokens")
+    snapshot = observer.snapshot()
+    assert snapshot["stages"]["preprocess"]["count"] == 2
+    assert snapshot["counters"] == dict(preprocess_questions=5, oov_tokens=4)
+    assert observer.reset() == snapshot
+    assert observer.snapshot() == dict(stages={}, counters={})
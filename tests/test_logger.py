@@ -0,0 +1,157 @@
+#
+# This software is Copyright ©️ 2020 The University of Southern California. All Rights Reserved.
+# Permission to use, copy, modify, and distribute this software and its documentation for educational, research and non-profit purposes, without fee, and without a written agreement is hereby granted, provided that the above copyright notice and subject to the full license file found in the root of this software deliverable. Permission to make commercial use of this software may be obtained by contacting:  USC Stevens Center for Innovation University of Southern California 1150 S. Olive Street, Suite 2300, Los Angeles, CA 90115, USA Email: accounting@stevens.usc.edu
+#
+# The full terms of this copyright and license should always be found in the root directory of this software deliverable as "license.txt" and if these terms are not found with this software, please contact the USC Stevens Center for the full license.
+#
+import os
+import queue
+from threading import Event, Thread
+import time
+
+import pytest
+
+from mentor_classifier.logger import (
+    BufferedLogWriter,
+    Logger,
+    QUESTION_ANSWER_LOG_HEADER,
+    set_question_answer_log,
+    _to_csv,
+)
+from .helpers import FakeMentor
+
+
+def test_logger_writes_user_ids_and_data_on_one_line(tmpdir):
+    path = os.path.join(tmpdir, "QuestionAnswerLog.csv")
+    writer = BufferedLogWriter(
+        path, header=_to_csv(QUESTION_ANSWER_LOG_HEADER), rotate_bytes=1
+    )
+    previous = set_question_answer_log(writer)
+    try:
+        # the ids and the data may be logged from different threads
+        log_user_id = Thread(target=Logger.logUserID, args=("user1", "session1"))
+        log_user_id.start()
+        log_user_id.join()
+        writer.flush()
+        Logger.logData(
+            FakeMentor("clint"), "who are you?", "a1", "a2", "a2", "v1", 0.5, -1.2
+        )
+    finally:
+        set_question_answer_log(previous)
+        writer.close()
+    with open(path, newline="") as f:
+        lines = f.read().split("\r\n")
+    assert lines[0] == ",".join(QUESTION_ANSWER_LOG_HEADER)
+    assert lines[1].startswith(
+        "user1,session1,clint,who are you?,a1,a2,a2,v1,0.5,-1.2,"
+    )
+    assert lines[2:] == [""]
+    # the file was big enough to rotate after the ids, but not until the line was finished
+    assert os.listdir(tmpdir) == ["QuestionAnswerLog.csv"]
+    assert writer.get_stats()["rotations"] == 0
+
+
+def test_it_flushes_everything_on_close(tmpdir):
+    path = os.path.join(tmpdir, "log.csv")
+    writer = BufferedLogWriter(path, header="h\n", flush_interval=60, batch_size=7)
+    for i in range(100):
+        assert writer.write(f"{i}\n")
+    writer.close()
+    with open(path) as f:
+        assert f.read() == "h\n" + "".join(f"{i}\n" for i in range(100))
+    assert writer.get_stats() == dict(written=100, dropped=0, rotations=0, queued=0)
+    assert not writer.write("late\n")
+    assert writer.get_stats()["dropped"] == 1
+
+
+def test_it_rotates_and_drops_when_the_queue_is_full(tmpdir, monkeypatch):
+    path = os.path.join(tmpdir, "log.csv")
+    writer = BufferedLogWriter(path, max_queue_size=1, rotate_bytes=1)
+    rotating = Event()
+    release = Event()
+    replace = os.replace
+
+    def stalled_replace(src, dst):
+        rotating.set()
+        release.wait()
+        replace(src, dst)
+
+    monkeypatch.setattr("mentor_classifier.logger.os.replace", stalled_replace)
+    assert writer.write("a\n")
+    writer.flush()
+    assert writer.write("b\n")
+    rotating.wait()
+    assert writer.write("c\n")
+    assert not writer.write("d\n")
+    assert not writer.write("e\n")
+    release.set()
+    writer.close()
+    assert writer.get_stats() == dict(written=3, dropped=2, rotations=2, queued=0)
+    contents = []
+    for name in sorted(os.listdir(tmpdir)):
+        with open(os.path.join(tmpdir, name)) as f:
+            contents.append(f.read())
+    assert sorted(contents) == ["a\n", "b\n", "c\n"]
+
+
+def _stall_rotation(monkeypatch):
+    rotating = Event()
+    release = Event()
+    replace = os.replace
+
+    def stalled_replace(src, dst):
+        rotating.set()
+        release.wait()
+        replace(src, dst)
+
+    monkeypatch.setattr("mentor_classifier.logger.os.replace", stalled_replace)
+    return rotating, release
+
+
+def test_flush_times_out_waiting_for_room_in_a_full_queue(tmpdir, monkeypatch):
+    writer = BufferedLogWriter(
+        os.path.join(tmpdir, "log.csv"), max_queue_size=1, rotate_bytes=1
+    )
+    rotating, release = _stall_rotation(monkeypatch)
+    writer.write("a\n")
+    writer.flush()
+    writer.write("b\n")
+    rotating.wait()
+    assert writer.write("c\n")
+    started = time.time()
+    with pytest.raises(queue.Empty):
+        writer.flush(timeout=0.2)
+    assert time.time() - started < 1.0
+    release.set()
+    writer.close()
+    assert writer.get_stats()["written"] == 3
+
+
+def test_lines_queued_after_the_writer_stops_are_counted_as_dropped(
+    tmpdir, monkeypatch
+):
+    writer = BufferedLogWriter(
+        os.path.join(tmpdir, "log.csv"), batch_size=1, rotate_bytes=1
+    )
+    rotating, release = _stall_rotation(monkeypatch)
+    writer.write("a\n")
+    writer.flush()
+    writer.write("b\n")
+    rotating.wait()
+    closing = Thread(target=writer.close)
+    closing.start()
+    while writer.get_stats()["queued"] == 0:
+        time.sleep(0.01)
+    # as if a write had passed the closed check just before close
+    writer._BufferedLogWriter__queue.put("late\n")
+    release.set()
+    closing.join()
+    assert writer.get_stats() == dict(written=2, dropped=1, rotations=1, queued=0)
+
+
+def test_flush_returns_once_closed(tmpdir):
+    writer = BufferedLogWriter(os.path.join(tmpdir, "log.csv"))
+    writer.write("a\n")
+    writer.close()
+    writer.flush()
+    writer.flush(timeout=0.1)
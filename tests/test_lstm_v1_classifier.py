@@ -0,0 +1,169 @@
+#
+# This software is Copyright ©️ 2020 The University of Southern California. All Rights Reserved.
+# Permission to use, copy, modify, and distribute this software and its documentation for educational, research and non-profit purposes, without fee, and without a written agreement is hereby granted, provided that the above copyright notice and subject to the full license file found in the root of this software deliverable. Permission to make commercial use of this software may be obtained by contacting:  USC Stevens Center for Innovation University of Southern California 1150 S. Olive Street, Suite 2300, Los Angeles, CA 90115, USA Email: accounting@stevens.usc.edu
+#
+# The full terms of this copyright and license should always be found in the root directory of this software deliverable as "license.txt" and if these terms are not found with this software, please contact the USC Stevens Center for the full license.
+#
+import numpy as np
+import pytest
+
+from mentor_classifier.classifiers import Classifier
+from mentor_classifier.classifiers.arch import lstm_v1
+from mentor_classifier.classifiers.arch.lstm_v1 import LSTMClassifier, _top_k
+from mentor_classifier.instrumentation import InferenceObserver
+from mentor_classifier.mentor import Mentor
+from mentor_classifier.nltk_preprocessor import NLTKPreprocessor
+from mentor_classifier.utils import sanitize_string
+from .helpers import write_lstm_v1_checkpoint
+
+QUESTIONS = [
+    "What do you do?",
+    "what do you do",
+    "Tell me about your time off deployment",
+    "Why did you join?",
+    "zzz qqq",
+    "",
+]
+
+
+class _RecordingObserver(InferenceObserver):
+    def __init__(self):
+        self.stages = []
+        self.counts = {}
+
+    def on_stage(self, stage, seconds, n=1):
+        assert seconds >= 0
+        self.stages.append((stage, n))
+
+    def on_count(self, name, n=1):
+        self.counts[name] = self.counts.get(name, 0) + n
+
+
+def _classifier(tmpdir, **kwargs):
+    # the checkpoint is pickled with the joblib of the sklearn version the repo targets
+    pytest.importorskip("sklearn.externals.joblib")
+    mentor = Mentor("mentor_01", mentor_data_root="tests/resources/mentors")
+    preprocessor = NLTKPreprocessor()
+    words = sorted(
+        {
+            w
+            for q in list(mentor.question_ids) + QUESTIONS
+            for w in preprocessor.transform(q)
+        }
+    )
+    checkpoint = str(tmpdir.join("checkpoint"))
+    write_lstm_v1_checkpoint(checkpoint, mentor, words, **kwargs)
+    return LSTMClassifier(mentor, checkpoint, topic_model_backend="numpy")
+
+
+def test_get_answers_matches_get_answer_for_each_question(tmpdir):
+    classifier = _classifier(tmpdir)
+    for canned_question_match_disabled in (False, True):
+        batched = classifier.get_answers(QUESTIONS, canned_question_match_disabled)
+        one_at_a_time = [
+            classifier.get_answer(q, canned_question_match_disabled) for q in QUESTIONS
+        ]
+        assert [a[:2] for a in batched] == [a[:2] for a in one_at_a_time]
+        # a batch goes through the same matrix products, which may round differently
+        assert [a[2] for a in batched] == pytest.approx([a[2] for a in one_at_a_time])
+
+
+def test_classifiers_that_only_implement_get_answer_can_answer_batches():
+    class _OneAtATime(Classifier):
+        def get_answer(self, question, canned_question_match_disabled=False):
+            return question, question.upper(), 0.5
+
+        def get_classifier_id(self):
+            return "one_at_a_time"
+
+    assert _OneAtATime().get_answers(["a", "b"]) == [("a", "A", 0.5), ("b", "B", 0.5)]
+
+
+def test_top_k_picks_the_highest_scores_in_order():
+    scores = np.array([[0.1, 0.9, -0.5, 0.3], [2.0, -1.0, 0.0, 1.0]])
+    assert _top_k(scores, 1).tolist() == [[1], [0]]
+    assert _top_k(scores, 3).tolist() == [[1, 3, 0], [0, 3, 2]]
+    # k beyond the number of answers returns them all
+    assert _top_k(scores, 10).tolist() == [[1, 3, 0, 2], [0, 3, 2, 1]]
+
+
+def test_top_k_breaks_ties_by_lowest_index():
+    scores = np.array([[0.5, 0.9, 0.9, 0.1, 0.9]])
+    assert _top_k(scores, 1).tolist() == [[1]]
+    assert _top_k(scores, 3).tolist() == [[1, 2, 4]]
+    assert _top_k(scores, 5).tolist() == [[1, 2, 4, 0, 3]]
+
+
+def test_answer_candidates_are_best_first_and_start_with_the_answer(tmpdir):
+    classifier = _classifier(tmpdir)
+    n_answers = len(classifier.logistic_model.classes_)
+    for q in QUESTIONS:
+        candidates = classifier.get_answer_candidates(
+            q, k=3, canned_question_match_disabled=True
+        )
+        assert len(candidates) == 3
+        scores = [c[2] for c in candidates]
+        assert scores == sorted(scores, reverse=True)
+        answer = classifier.get_answer(q, canned_question_match_disabled=True)
+        if answer[0] != "_OFF_TOPIC_":
+            assert answer[:2] == candidates[0][:2]
+        assert len(classifier.get_answer_candidates(q, k=100)) in (1, n_answers)
+    # a canned question's answer comes alone
+    assert classifier.get_answer_candidates("What do you do?", k=3) == [
+        classifier.get_answer("What do you do?")
+    ]
+
+
+def test_binary_answer_confidence_is_the_signed_decision(tmpdir):
+    mentor = Mentor("mentor_01", mentor_data_root="tests/resources/mentors")
+    answers = sorted(set(mentor.ids_answers.values()))[:2]
+    classifier = _classifier(tmpdir, answers=answers)
+    for q in QUESTIONS:
+        first, second = classifier.get_answer_candidates(
+            q, k=2, canned_question_match_disabled=True
+        )
+        assert first[2] == -second[2] >= 0
+        confidence = classifier.get_answer(q, canned_question_match_disabled=True)[2]
+        # the decision is the score of the second class, so it's negative when the first class wins
+        assert confidence == (first[2] if first[1] == answers[1] else -first[2])
+
+
+def test_it_reports_stages_and_counts_to_an_observer(tmpdir):
+    classifier = _classifier(tmpdir)
+    n_off_topic = sum(
+        1 for a in classifier.get_answers(QUESTIONS) if a[0] == "_OFF_TOPIC_"
+    )
+    observer = _RecordingObserver()
+    classifier.set_observer(observer)
+    classifier.get_answers(QUESTIONS)
+    n_canned = sum(
+        1 for q in QUESTIONS if sanitize_string(q) in classifier.mentor.question_ids
+    )
+    n_model = len(QUESTIONS) - n_canned
+    assert observer.stages == [
+        ("sanitize", len(QUESTIONS)),
+        ("preprocess", n_model),
+        ("w2v", n_model),
+        ("pad", n_model),
+        ("topic_model", n_model),
+        ("ridge", n_model),
+    ]
+    assert observer.counts["questions"] == len(QUESTIONS)
+    assert observer.counts["canned_hits"] == n_canned
+    assert observer.counts["fuzzy_hits"] == 0
+    assert observer.counts["off_topic"] == n_off_topic
+    assert observer.counts["tokens"] >= observer.counts["oov_tokens"]
+    # candidates count off topic questions the same way get_answer does
+    observer.counts.clear()
+    for q in QUESTIONS:
+        classifier.get_answer_candidates(q, k=2)
+    assert observer.counts["off_topic"] == n_off_topic
+
+
+def test_it_does_not_time_anything_without_an_observer(tmpdir, monkeypatch):
+    classifier = _classifier(tmpdir)
+    expected = classifier.get_answers(QUESTIONS)
+    # any use of the clock would raise AttributeError
+    monkeypatch.setattr(lstm_v1, "time", object())
+    assert classifier.get_answers(QUESTIONS) == expected
+    assert classifier.get_answer_candidates(QUESTIONS[2], k=2)
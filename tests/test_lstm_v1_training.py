@@ -0,0 +1,79 @@
+#
+# This software is Copyright ©️ 2020 The University of Southern California. All Rights Reserved.
+# Permission to use, copy, modify, and distribute this software and its documentation for educational, research and non-profit purposes, without fee, and without a written agreement is hereby granted, provided that the above copyright notice and subject to the full license file found in the root of this software deliverable. Permission to make commercial use of this software may be obtained by contacting:  USC Stevens Center for Innovation University of Southern California 1150 S. Olive Street, Suite 2300, Los Angeles, CA 90115, USA Email: accounting@stevens.usc.edu
+#
+# The full terms of this copyright and license should always be found in the root directory of this software deliverable as "license.txt" and if these terms are not found with this software, please contact the USC Stevens Center for the full license.
+#
+import numpy as np
+
+from mentor_classifier.classifiers.arch.lstm_v1.training import (
+    find_changed_rows,
+    hash_training_row,
+    load_fused_unfused,
+    select_warm_start_samples,
+)
+
+
+def _load_fused_unfused_per_sample(train_data, new_vectors):
+    # how fused features were built before topic vectors were predicted in one batch
+    x_train_fused = []
+    x_train_unfused = np.asarray([train_data[i][1] for i in range(len(train_data))])
+    y_train_unfused = [train_data[i][3] for i in range(len(train_data))]
+    for i in range(0, len(train_data)):
+        x_train_fused.append(np.concatenate((train_data[i][1], new_vectors[i][1])))
+    x_train_fused = np.asarray(x_train_fused)
+    y_train_fused = [train_data[i][3] for i in range(len(train_data))]
+    return x_train_fused, y_train_fused, x_train_unfused, y_train_unfused
+
+
+def test_fused_features_are_unchanged_by_batched_topic_vectors():
+    rng = np.random.RandomState(0)
+    n_questions, n_topics = 7, 4
+    train_vectors = [
+        [
+            f"question {i}",
+            rng.randn(300).astype("float32").tolist(),
+            [0] * n_topics,
+            f"answer {i % 3}",
+        ]
+        for i in range(n_questions)
+    ]
+    topic_vectors = rng.rand(n_questions, n_topics).astype("float32")
+    new_vectors = [
+        [train_vectors[i][0], topic_vectors[i].tolist()] for i in range(n_questions)
+    ]
+    expected = _load_fused_unfused_per_sample(train_vectors, new_vectors)
+    actual = load_fused_unfused(train_vectors, topic_vectors)
+    np.testing.assert_array_equal(actual[0], expected[0])
+    assert actual[0].dtype == expected[0].dtype
+    assert actual[1] == expected[1]
+    np.testing.assert_array_equal(actual[2], expected[2])
+    assert actual[3] == expected[3]
+
+
+def test_finds_rows_changed_since_previous_training():
+    previous = {
+        "a1": hash_training_row("Who are you?", "Background", "I am a mentor"),
+        "a2": hash_training_row("What do you do?", "JobSpecific", "I sail"),
+        "a3": hash_training_row("Where are you from?", "Background", "LA"),
+    }
+    current = {
+        "a1": hash_training_row("Who are you?", "Background", "I'm a mentor"),
+        "a2": hash_training_row(
+            "What do you do?\nWhat's your job?", "JobSpecific", "I sail"
+        ),
+        "a4": hash_training_row("Why the navy?", "Navy", "Travel"),
+    }
+    assert find_changed_rows(previous, current) == dict(
+        added=["a4"], removed=["a3"], inputs_changed=["a2"], answer_changed=["a1"]
+    )
+
+
+def test_warm_start_samples_all_changed_and_some_unchanged():
+    changed = np.zeros(100, dtype=bool)
+    changed[[3, 50]] = True
+    samples = select_warm_start_samples(changed, np.random.RandomState(0))
+    assert len(samples) == 2 + 32
+    assert {3, 50} <= set(samples)
+    assert len(set(samples)) == len(samples)
+    assert list(samples) == sorted(samples)
@@ -4,6 +4,7 @@
 #
 # The full terms of this copyright and license should always be found in the root directory of this software deliverable as "license.txt" and if these terms are not found with this software, please contact the USC Stevens Center for the full license.
 #
+import os
 from os import path
 from unittest.mock import patch
 
@@ -305,3 +306,96 @@ def test_it_raises_exception_on_missing_mentor_dir():
         MentorRootNotFoundError, match=r".*/some/invalid/path.*some_mentor_id.*"
     ):
         Mentor("some_mentor_id", mentor_data_root="/some/invalid/path")
+
+
+def test_it_reads_each_csv_once(tmpdir):
+    from mentor_classifier import mentor as mentor_module
+    from mentor_classifier.tools.benchmark import generate_mentor
+
+    m = generate_mentor(str(tmpdir), "mentor_generated", 50)
+    with patch.object(
+        mentor_module, "_read_csv_columns", wraps=mentor_module._read_csv_columns
+    ) as read_csv_columns:
+        m.load()
+    paths = [c[0][0] for c in read_csv_columns.call_args_list]
+    assert sorted(path.basename(p) for p in paths) == [
+        "classifier_data.csv",
+        "utterance_data.csv",
+    ]
+    assert len(m.ids_answers) == 50
+    assert sum(len(s) for s in m.suggestions.values()) >= len(m.question_ids)
+
+
+def test_it_loads_from_snapshot_until_mentor_data_changes(tmpdir):
+    from mentor_classifier import mentor as mentor_module
+    from mentor_classifier.tools.benchmark import generate_mentor
+
+    mentor_root = str(tmpdir.join("mentors"))
+    snapshot_root = str(tmpdir.join("snapshots"))
+    generated = generate_mentor(mentor_root, "mentor_generated", 20)
+    m = Mentor("mentor_generated", mentor_root, snapshot_root=snapshot_root)
+    assert m.to_dict() == generated.to_dict()
+    with patch.object(
+        mentor_module, "_read_csv_columns", wraps=mentor_module._read_csv_columns
+    ) as read_csv_columns:
+        # unchanged
+        from_snapshot = Mentor(
+            "mentor_generated", mentor_root, snapshot_root=snapshot_root
+        )
+        assert from_snapshot.to_dict() == m.to_dict()
+        assert from_snapshot.suggestions == m.suggestions
+        assert read_csv_columns.call_count == 0
+        # touched, but the same content
+        classifier_data = m.mentor_data_path("classifier_data.csv")
+        os.utime(classifier_data, ns=(0, 0))
+        Mentor("mentor_generated", mentor_root, snapshot_root=snapshot_root)
+        assert read_csv_columns.call_count == 0
+        # edited
+        with open(classifier_data, "a") as f:
+            f.write("mentor_generated_new,Background,New answer,New question?\n")
+        edited = Mentor("mentor_generated", mentor_root, snapshot_root=snapshot_root)
+        assert read_csv_columns.call_count == 2
+        assert edited.ids_answers["mentor_generated_new"] == "New answer"
+    assert os.listdir(snapshot_root) == [path.basename(m.snapshot_path())]
+
+
+def test_it_builds_the_fuzzy_index_on_first_use(tmpdir):
+    from mentor_classifier import mentor as mentor_module
+    from mentor_classifier.tools.benchmark import generate_mentor
+
+    with patch.object(
+        mentor_module, "FuzzyQuestionIndex", wraps=mentor_module.FuzzyQuestionIndex
+    ) as fuzzy_index:
+        m = generate_mentor(str(tmpdir), "mentor_generated", 20)
+        n_bytes = m.estimate_memory_bytes()
+        assert fuzzy_index.call_count == 0
+        question = next(iter(m.question_ids))
+        assert m.get_fuzzy_index().find(question, 0.9)[0] == m.question_ids[question]
+        assert m.get_fuzzy_index() is m.get_fuzzy_index()
+        assert fuzzy_index.call_count == 1
+    assert m.estimate_memory_bytes() > n_bytes
+
+
+def test_it_keeps_the_dtypes_of_numeric_ids(tmpdir):
+    import pandas as pd
+
+    data_root = tmpdir.join("mentor_numeric", "data")
+    os.makedirs(str(data_root))
+    classifier_data = str(data_root.join("classifier_data.csv"))
+    with open(classifier_data, "w") as f:
+        f.write(
+            "ID,topics,text,question\n"
+            '1,About Me,I am a mentor.,"Who are you?\nWhat is your name?"\n'
+            "2,Background,,Where are you from?\n"
+        )
+    with open(str(data_root.join("utterance_data.csv")), "w") as f:
+        f.write("ID,utterance,situation\n10,Hello.,_INTRO_\n")
+    m = Mentor("mentor_numeric", str(tmpdir))
+    # the same values as a row of the DataFrame, as training reads them
+    corpus = pd.read_csv(classifier_data).fillna("")
+    ids = [corpus.iloc[i]["ID"] for i in range(len(corpus))]
+    assert list(m.ids_answers) == ids
+    assert [type(id) for id in m.ids_answers] == [type(id) for id in ids]
+    assert m.ids_answers == {1: "I am a mentor.", 2: ""}
+    assert m.question_ids["who are you"] == 1
+    assert m.utterances_by_type == {"_INTRO_": [(10, "Hello.")]}
@@ -0,0 +1,76 @@
+#
+# This software is Copyright ©️ 2020 The University of Southern California. All Rights Reserved.
+# Permission to use, copy, modify, and distribute this software and its documentation for educational, research and non-profit purposes, without fee, and without a written agreement is hereby granted, provided that the above copyright notice and subject to the full license file found in the root of this software deliverable. Permission to make commercial use of this software may be obtained by contacting:  USC Stevens Center for Innovation University of Southern California 1150 S. Olive Street, Suite 2300, Los Angeles, CA 90115, USA Email: accounting@stevens.usc.edu
+#
+# The full terms of this copyright and license should always be found in the root directory of this software deliverable as "license.txt" and if these terms are not found with this software, please contact the USC Stevens Center for the full license.
+#
+import csv
+import os
+
+from mentor_classifier.metrics import Metrics, read_test_set
+from mentor_classifier.utils import sanitize_string
+from .helpers import FakeClassifier
+
+TEST_DATA = [
+    ["ID", "text", "Who are you?", "What do you do?", "Why the Navy?", "Hm?"],
+    ["a1", "I'm a mentor.", "i", "", "", ""],
+    ["a2", "I sail ships.", " R ", "I", "", ""],
+    ["a3", "To travel!", "", "x", "i.", ""],
+]
+
+
+def _read_test_data_per_cell(file, num):
+    # how test sets were read before read_test_set
+    test_data = list(csv.reader(open(file)))
+    numrows = len(test_data)
+    numcols = len(test_data[0])
+    if num is None or num > numcols - 2:
+        num = numcols - 2
+    user_questions = {}
+    for c in range(0, num):
+        user_question = sanitize_string(test_data[0][c + 2])
+        for r in range(1, numrows):
+            match = sanitize_string(test_data[r][c + 2])
+            if match == "i" or match == "r":
+                answer = sanitize_string(test_data[r][1])
+                try:
+                    user_questions[user_question].append(answer)
+                except KeyError:
+                    user_questions[user_question] = [answer]
+    return user_questions
+
+
+def _write_test_set(tmpdir):
+    path = tmpdir.join("checkpoint", "tests", "mentor_01", "test_set.csv")
+    os.makedirs(os.path.dirname(str(path)))
+    with open(str(path), "w", newline="") as f:
+        csv.writer(f).writerows(TEST_DATA)
+    return str(path)
+
+
+def test_read_test_set_is_unchanged(tmpdir):
+    path = _write_test_set(tmpdir)
+    for num in [None, 1, 2, 10]:
+        assert read_test_set(path, num) == _read_test_data_per_cell(path, num)
+    assert read_test_set(path) is read_test_set(path)
+
+
+def test_evaluate_reports_accuracy_latency_and_results(tmpdir, monkeypatch):
+    _write_test_set(tmpdir)
+    monkeypatch.chdir(str(tmpdir))
+    classifier = FakeClassifier(
+        answers={
+            q: ("a2", "I sail ships.")
+            for q in ("who are you", "what do you do", "why the navy")
+        }
+    )
+    report = Metrics().evaluate(classifier, "test_set.csv", batch_size=2)
+    assert classifier.batches == [["who are you", "what do you do"], ["why the navy"]]
+    assert report["questions"] == 3
+    assert report["correct"] == 2
+    assert report["accuracy"] == 2 / 3
+    assert [r["correct"] for r in report["results"]] == [True, True, False]
+    assert report["results"][2]["expected"] == ["to travel"]
+    assert set(report["latency_ms"]) == {"p50", "p95", "p99"}
+    assert report["throughput"] > 0
+    assert Metrics().test_accuracy(classifier, "test_set.csv") == 2 / 3
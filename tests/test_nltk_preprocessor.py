@@ -0,0 +1,62 @@
+#
+# This software is Copyright ©️ 2020 The University of Southern California. All Rights Reserved.
+# Permission to use, copy, modify, and distribute this software and its documentation for educational, research and non-profit purposes, without fee, and without a written agreement is hereby granted, provided that the above copyright notice and subject to the full license file found in the root of this software deliverable. Permission to make commercial use of this software may be obtained by contacting:  USC Stevens Center for Innovation University of Southern California 1150 S. Olive Street, Suite 2300, Los Angeles, CA 90115, USA Email: accounting@stevens.usc.edu
+#
+# The full terms of this copyright and license should always be found in the root directory of this software deliverable as "license.txt" and if these terms are not found with this software, please contact the USC Stevens Center for the full license.
+#
+import csv
+from glob import glob
+from os import path
+
+import nltk
+import pytest
+
+from mentor_classifier.nltk_preprocessor import NLTKPreprocessor
+
+
+def _has_pos_tagger() -> bool:
+    try:
+        nltk.pos_tag(["test"])
+        return True
+    except LookupError:
+        return False
+
+
+def _corpus_questions():
+    questions = []
+    for csv_path in sorted(
+        glob(path.join(".", "tests", "resources", "mentors", "*", "data", "*.csv"))
+    ):
+        with open(csv_path) as f:
+            for row in csv.reader(f):
+                for cell in row:
+                    questions.extend(q for q in cell.split("\n") if q)
+    return questions
+
+
+@pytest.mark.skipif(not _has_pos_tagger(), reason="nltk pos tagger not installed")
+def test_transform_without_pos_tagging_matches_pos_tagged_output():
+    questions = _corpus_questions()
+    assert len(questions) > 0
+    tagged = NLTKPreprocessor(pos_tag=True)
+    fast = NLTKPreprocessor()
+    for question in questions:
+        assert fast.transform(question) == tagged.transform(question)
+
+
+@pytest.mark.parametrize(
+    "question,expected",
+    [
+        (
+            "Who are you and what do you do?",
+            ["who", "are", "you", "and", "what", "do", "you", "do"],
+        ),
+        (
+            "What's the Navy doing, ... running?",
+            ["what", "s", "the", "navi", "do", "run"],
+        ),
+        ("", []),
+    ],
+)
+def test_transform_tokenizes_lowercases_and_stems(question, expected):
+    assert NLTKPreprocessor().transform(question) == expected
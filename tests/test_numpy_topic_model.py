@@ -0,0 +1,48 @@
+#
+# This software is Copyright ©️ 2020 The University of Southern California. All Rights Reserved.
+# Permission to use, copy, modify, and distribute this software and its documentation for educational, research and non-profit purposes, without fee, and without a written agreement is hereby granted, provided that the above copyright notice and subject to the full license file found in the root of this software deliverable. Permission to make commercial use of this software may be obtained by contacting:  USC Stevens Center for Innovation University of Southern California 1150 S. Olive Street, Suite 2300, Los Angeles, CA 90115, USA Email: accounting@stevens.usc.edu
+#
+# The full terms of this copyright and license should always be found in the root directory of this software deliverable as "license.txt" and if these terms are not found with this software, please contact the USC Stevens Center for the full license.
+#
+import numpy as np
+import pytest
+
+keras = pytest.importorskip("tensorflow.keras")
+
+from mentor_classifier.classifiers.arch.lstm_v1 import pad_lstm_vectors  # noqa: E402
+from mentor_classifier.classifiers.arch.lstm_v1.numpy_topic_model import (  # noqa: E402
+    NumpyTopicModel,
+)
+
+
+def _topic_model(nb_each_sample, nb_features, nb_classes):
+    # same architecture as TrainLSTMClassifier builds, but smaller
+    topic_model = keras.models.Sequential()
+    topic_model.add(
+        keras.layers.LSTM(
+            nb_features,
+            input_shape=(nb_each_sample, nb_features),
+            dropout=0.5,
+            recurrent_dropout=0.1,
+        )
+    )
+    topic_model.add(keras.layers.Dropout(0.5))
+    topic_model.add(keras.layers.Dense(nb_classes))
+    topic_model.add(keras.layers.Activation("softmax"))
+    topic_model.compile(loss="categorical_crossentropy", optimizer="adam")
+    return topic_model
+
+
+def test_it_matches_keras_predict(tmpdir):
+    topic_model = _topic_model(25, 300, 4)
+    h5_path = str(tmpdir.join("lstm_topic_model.h5"))
+    topic_model.save(h5_path)
+    rng = np.random.RandomState(1)
+    lstm_vectors = [rng.randn(n, 300).astype("float32") for n in [1, 5, 25, 30, 0, 12]]
+    x = pad_lstm_vectors(lstm_vectors)
+    np.testing.assert_allclose(
+        NumpyTopicModel.load(h5_path).predict(x),
+        topic_model.predict(x),
+        rtol=1e-4,
+        atol=1e-5,
+    )
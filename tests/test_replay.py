@@ -0,0 +1,171 @@
+#
+# This software is Copyright ©️ 2020 The University of Southern California. All Rights Reserved.
+# Permission to use, copy, modify, and distribute this software and its documentation for educational, research and non-profit purposes, without fee, and without a written agreement is hereby granted, provided that the above copyright notice and subject to the full license file found in the root of this software deliverable. Permission to make commercial use of this software may be obtained by contacting:  USC Stevens Center for Innovation University of Southern California 1150 S. Olive Street, Suite 2300, Los Angeles, CA 90115, USA Email: accounting@stevens.usc.edu
+#
+# The full terms of this copyright and license should always be found in the root directory of this software deliverable as "license.txt" and if these terms are not found with this software, please contact the USC Stevens Center for the full license.
+#
+import os
+import time
+
+import pytest
+
+from mentor_classifier.logger import (
+    BufferedLogWriter,
+    Logger,
+    QUESTION_ANSWER_LOG_HEADER,
+    set_question_answer_log,
+    _to_csv,
+)
+from mentor_classifier.tools.replay import (
+    QuestionAnswerLog,
+    read_question_answer_log,
+    replay,
+)
+from .helpers import FakeClassifier, FakeMentor
+
+
+def _classifier(answers):
+    return FakeClassifier(answers={q: (a, f"text of {a}") for q, a in answers.items()})
+
+
+def _write_log(path, rows):
+    writer = BufferedLogWriter(path, header=_to_csv(QUESTION_ANSWER_LOG_HEADER))
+    previous = set_question_answer_log(writer)
+    try:
+        for user_ids, mentor, question, answer in rows:
+            if user_ids:
+                Logger.logUserID(*user_ids)
+            Logger.logData(FakeMentor(mentor), question, "", answer, answer, "", 0, 0)
+    finally:
+        set_question_answer_log(previous)
+        writer.close()
+
+
+def test_it_reads_logged_questions_with_and_without_user_ids(tmpdir):
+    path = os.path.join(tmpdir, "QuestionAnswerLog.csv")
+    _write_log(
+        path,
+        [
+            (("u1", "s1"), "clint", "who are you?", "a1"),
+            (None, "dan", 'what is "it", then?\nreally', "text of a2"),
+        ],
+    )
+    records = list(read_question_answer_log([path]))
+    assert [
+        (r["user_id"], r["session_id"], r["mentor"], r["question"]) for r in records
+    ] == [
+        ("u1", "s1", "clint", "who are you?"),
+        ("", "", "dan", 'what is "it", then?\nreally'),
+    ]
+    assert [r["classifier_answer"] for r in records] == ["a1", "text of a2"]
+
+
+def test_question_answer_log_reads_the_files_on_every_pass(tmpdir):
+    path = os.path.join(tmpdir, "QuestionAnswerLog.csv")
+    _write_log(path, [(None, "clint", "q1", "a1"), (None, "dan", "q2", "a2")])
+    log = QuestionAnswerLog([path], mentors=["dan"])
+    assert [r["question"] for r in log] == ["q2"]
+    assert [r["question"] for r in log] == ["q2"]
+
+
+class _CountingLog(object):
+    def __init__(self, records):
+        self.records = records
+        self.read = 0
+
+    def __iter__(self):
+        for record in self.records:
+            self.read += 1
+            yield record
+
+
+def test_replay_streams_the_questions_after_a_first_pass_for_mentors():
+    log = _CountingLog([dict(mentor=f"m{i % 3}", question="q1") for i in range(100)])
+    created = []
+    read_at_first_answer = []
+
+    class _Classifier(FakeClassifier):
+        def get_answer(self, question, canned_question_match_disabled=False):
+            if not read_at_first_answer:
+                read_at_first_answer.append(log.read)
+            return super().get_answer(question, canned_question_match_disabled)
+
+    def get_classifier(mentor_id):
+        created.append(mentor_id)
+        return _Classifier(answers=dict(q1=("a1", "text of a1")))
+
+    report = replay(log, get_classifier, limit=50)
+    assert sorted(created) == ["m0", "m1", "m2"]
+    assert report["questions"] == 50
+    # the first pass reads up to the limit, the second only a question or two ahead
+    assert read_at_first_answer[0] <= 50 + 2
+    with pytest.raises(Exception, match="iterator"):
+        replay(iter(log.records), get_classifier)
+
+
+def test_replay_reports_diffs_errors_and_latencies_per_mentor():
+    records = [
+        dict(mentor="clint", question="q1", classifier_answer="a1"),
+        dict(mentor="clint", question="q2", classifier_answer="text of a2"),
+        dict(mentor="clint", question="q3", classifier_answer="a1"),
+        dict(mentor="clint", question="unknown", classifier_answer="a1"),
+        dict(mentor="dan", question="q1", classifier_answer=""),
+        dict(mentor="nobody", question="q1", classifier_answer="a1"),
+        dict(mentor="dan", question="q1", classifier_answer="ignored"),
+    ]
+    classifiers = {
+        "clint": _classifier(dict(q1="a1", q2="a2", q3="a3")),
+        "dan": _classifier(dict(q1="a1")),
+    }
+    created = []
+
+    def get_classifier(mentor_id):
+        created.append(mentor_id)
+        return classifiers[mentor_id]
+
+    report = replay(records, get_classifier, concurrency=3, limit=6)
+    assert sorted(created) == ["clint", "dan", "nobody"]
+    assert report["questions"] == 6
+    assert report["errors"] == 2
+    assert report["compared"] == 3
+    assert report["diffs"] == 1
+    assert report["diff_samples"] == [
+        dict(
+            mentor="clint",
+            question="q3",
+            logged="a1",
+            answer_id="a3",
+            answer="text of a3",
+        )
+    ]
+    assert report["mentors"]["clint"]["diff_rate"] == 1 / 3
+    assert report["mentors"]["dan"]["questions"] == 1
+    assert report["mentors"]["nobody"]["errors"] == 1
+    assert report["throughput"] > 0
+
+
+def test_replay_sends_at_the_given_rate():
+    records = [dict(mentor="clint", question="q1")] * 5
+    started = time.perf_counter()
+    report = replay(
+        records, lambda m: _classifier(dict(q1="a1")), rate=50.0, concurrency=2
+    )
+    assert time.perf_counter() - started >= 4 / 50.0
+    assert report["questions"] == 5
+    assert report["compared"] == 0
+
+
+def test_replay_loads_classifiers_before_timing_questions():
+    records = [
+        dict(mentor=mentor, question="q1") for mentor in ("clint", "dan", "clint")
+    ]
+
+    def get_classifier(mentor_id):
+        time.sleep(0.2)
+        return _classifier(dict(q1="a1"))
+
+    report = replay(records, get_classifier, rate=100.0, concurrency=3)
+    assert report["questions"] == 3
+    assert report["load_seconds"] >= 0.4
+    assert report["latency_ms"]["p99"] < 200
+    assert report["throughput"] > 3 / 0.4
@@ -0,0 +1,201 @@
+#
+# This software is Copyright ©️ 2020 The University of Southern California. All Rights Reserved.
+# Permission to use, copy, modify, and distribute this software and its documentation for educational, research and non-profit purposes, without fee, and without a written agreement is hereby granted, provided that the above copyright notice and subject to the full license file found in the root of this software deliverable. Permission to make commercial use of this software may be obtained by contacting:  USC Stevens Center for Innovation University of Southern California 1150 S. Olive Street, Suite 2300, Los Angeles, CA 90115, USA Email: accounting@stevens.usc.edu
+#
+# The full terms of this copyright and license should always be found in the root directory of this software deliverable as "license.txt" and if these terms are not found with this software, please contact the USC Stevens Center for the full license.
+#
+import csv
+import json
+from multiprocessing.pool import ThreadPool
+import os
+import shutil
+
+import pytest
+
+from mentor_classifier.classifiers import checkpoint_path, register_classifier_factory
+from mentor_classifier.classifiers.training import (
+    ClassifierTraining,
+    ClassifierTrainingFactory,
+    register_classifier_training_factory,
+)
+from mentor_classifier.checkpoints import MANIFEST_FILE_NAME
+from mentor_classifier.tools import checkpoint as checkpoint_tool
+from .helpers import FakeClassifier, FakeClassifierFactory
+
+ARCH = "fake_training_arch"
+
+
+class _FakeTraining(ClassifierTraining):
+    def __init__(self, mentor, trained):
+        self.mentor = mentor
+        self.trained = trained
+
+    def train(self):
+        self.trained.append(self.mentor.id)
+        if self.mentor.id == "bad":
+            raise Exception("bad mentor")
+        return [1.0], 0.75
+
+    def save(self, to_path=None):
+        os.makedirs(to_path, exist_ok=True)
+        with open(os.path.join(to_path, "model.txt"), "w") as f:
+            f.write(self.mentor.id)
+
+    def get_report(self):
+        return dict(mode="full")
+
+
+class _FakeTrainingFactory(ClassifierTrainingFactory):
+    def __init__(self):
+        self.trained = []
+        self.prepared = []
+
+    def create(self, checkpoint, mentors, **kwargs):
+        return _FakeTraining(mentors, self.trained)
+
+    def prepare_checkpoint(self, checkpoint):
+        self.prepared.append(checkpoint)
+
+
+@pytest.fixture
+def factory():
+    fac = _FakeTrainingFactory()
+    register_classifier_training_factory(ARCH, fac)
+    return fac
+
+
+def _mentor_root(tmpdir, sizes):
+    # copies of mentor_01, each with classifier_data.csv padded to a different size
+    root = str(tmpdir.join("mentors"))
+    for mentor_id, padding in sizes.items():
+        data = os.path.join(root, mentor_id, "data")
+        shutil.copytree("tests/resources/mentors/mentor_01/data", data)
+        with open(os.path.join(data, "classifier_data.csv"), "a") as f:
+            f.write("\n" * padding)
+    return root
+
+
+def _train(tmpdir, monkeypatch, sizes, workers=1):
+    monkeypatch.setenv("ARCH", ARCH)
+    monkeypatch.setenv("CHECKPOINT", "cp1")
+    monkeypatch.setenv("CHECKPOINT_ROOT", str(tmpdir.join("checkpoint")))
+    monkeypatch.setenv("MENTOR_ROOT", _mentor_root(tmpdir, sizes))
+    monkeypatch.setenv("TRAIN_WORKERS", str(workers))
+    monkeypatch.delenv("MENTOR", raising=False)
+    monkeypatch.delenv("PREVIOUS_CHECKPOINT", raising=False)
+    checkpoint_tool.train()
+    cp = str(tmpdir.join("checkpoint", "classifiers", ARCH, "cp1"))
+    with open(os.path.join(cp, "train_summary.json")) as f:
+        return cp, json.load(f)
+
+
+def test_train_mentor_reports_success_and_failure(tmpdir, factory):
+    root = _mentor_root(tmpdir, dict(good=0, bad=0))
+    cp = str(tmpdir.join("cp"))
+    good = checkpoint_tool._train_mentor(ARCH, cp, root, "good", {})
+    assert good["status"] == "success"
+    assert good["accuracy"] == 0.75
+    assert good["report"] == dict(mode="full")
+    assert os.path.isfile(os.path.join(cp, "good", "model.txt"))
+    bad = checkpoint_tool._train_mentor(ARCH, cp, root, "bad", {})
+    assert bad["status"] == "failure"
+    assert bad["error"] == "bad mentor"
+
+
+def test_train_trains_largest_mentors_first_and_writes_summary(
+    tmpdir, monkeypatch, factory
+):
+    cp, summary = _train(tmpdir, monkeypatch, dict(small=0, large=200, medium=100))
+    assert factory.prepared == [cp]
+    assert factory.trained == ["large", "medium", "small"]
+    assert [(m["mentor"], m["status"]) for m in summary["mentors"]] == [
+        ("large", "success"),
+        ("medium", "success"),
+        ("small", "success"),
+    ]
+    with open(os.path.join(cp, MANIFEST_FILE_NAME)) as f:
+        assert sorted(json.load(f)["mentors"]) == ["large", "medium", "small"]
+
+
+def test_train_in_a_worker_pool(tmpdir, monkeypatch, factory):
+    pools = []
+
+    class _Context(object):
+        def Pool(self, processes, initializer, initargs):
+            # threads stand in for the spawned processes, which couldn't see the fake arch
+            pools.append((processes, initargs))
+            return ThreadPool(processes, initializer, initargs)
+
+    monkeypatch.setattr(
+        checkpoint_tool.multiprocessing, "get_context", lambda method: _Context()
+    )
+    monkeypatch.setattr(checkpoint_tool, "_init_training_worker", lambda n: None)
+    monkeypatch.setenv("TRAIN_THREADS_PER_WORKER", "3")
+    cp, summary = _train(tmpdir, monkeypatch, dict(a=0, b=10, c=20), workers=2)
+    assert pools == [(2, (3,))]
+    assert sorted(factory.trained) == ["a", "b", "c"]
+    assert summary["workers"] == 2
+    assert all(m["status"] == "success" for m in summary["mentors"])
+
+
+def test_train_exits_with_an_error_after_the_summary_if_a_mentor_fails(
+    tmpdir, monkeypatch, factory
+):
+    with pytest.raises(SystemExit) as exit_info:
+        _train(tmpdir, monkeypatch, dict(good=0, bad=10))
+    assert exit_info.value.code == 1
+    assert sorted(factory.trained) == ["bad", "good"]
+    cp = str(tmpdir.join("checkpoint", "classifiers", ARCH, "cp1"))
+    with open(os.path.join(cp, "train_summary.json")) as f:
+        statuses = {m["mentor"]: m["status"] for m in json.load(f)["mentors"]}
+    assert statuses == dict(bad="failure", good="success")
+    assert os.path.isfile(os.path.join(cp, MANIFEST_FILE_NAME))
+
+
+def test_test_evaluates_every_mentor_in_the_checkpoint_in_a_process_pool(
+    tmpdir, monkeypatch
+):
+    arch = "fake_test_arch"
+    register_classifier_factory(
+        arch,
+        FakeClassifierFactory(
+            lambda checkpoint, mentors: FakeClassifier(
+                answers={"who are you": ("a1", "I'm a mentor.")}, mentor_id=mentors
+            )
+        ),
+    )
+    checkpoint_root = str(tmpdir.join("checkpoint"))
+    for d in ("m1", "m2", "w2v_stems"):
+        os.makedirs(os.path.join(checkpoint_path(checkpoint_root, arch, "cp1"), d))
+    for m in ("m1", "m2"):
+        test_set = tmpdir.join("checkpoint", "tests", m, "test_set.csv")
+        os.makedirs(os.path.dirname(str(test_set)))
+        with open(str(test_set), "w", newline="") as f:
+            csv.writer(f).writerows(
+                [["ID", "text", "Who are you?"], ["a1", "I'm a mentor.", "i"]]
+            )
+    pools = []
+
+    class _Context(object):
+        def Pool(self, processes):
+            # threads stand in for the spawned processes, which couldn't see the fake arch
+            pools.append(processes)
+            return ThreadPool(processes)
+
+    monkeypatch.setattr(
+        checkpoint_tool.multiprocessing, "get_context", lambda method: _Context()
+    )
+    monkeypatch.chdir(str(tmpdir))
+    monkeypatch.setenv("ARCH", arch)
+    monkeypatch.setenv("CHECKPOINT_ROOT", checkpoint_root)
+    monkeypatch.setenv("TEST_SET", "test_set.csv")
+    monkeypatch.setenv("TEST_WORKERS", "2")
+    monkeypatch.setenv("TEST_REPORT", str(tmpdir.join("report.json")))
+    monkeypatch.delenv("CHECKPOINT", raising=False)
+    monkeypatch.delenv("MENTOR", raising=False)
+    monkeypatch.delenv("FUZZY_MATCH_THRESHOLD", raising=False)
+    checkpoint_tool.test()
+    assert pools == [2]
+    with open(str(tmpdir.join("report.json"))) as f:
+        reports = json.load(f)["reports"]
+    assert [(r["mentor"], r["accuracy"]) for r in reports] == [("m1", 1.0), ("m2", 1.0)]
@@ -0,0 +1,79 @@
+#
+# This software is Copyright ©️ 2020 The University of Southern California. All Rights Reserved.
+# Permission to use, copy, modify, and distribute this software and its documentation for educational, research and non-profit purposes, without fee, and without a written agreement is hereby granted, provided that the above copyright notice and subject to the full license file found in the root of this software deliverable. Permission to make commercial use of this software may be obtained by contacting:  USC Stevens Center for Innovation University of Southern California 1150 S. Olive Street, Suite 2300, Los Angeles, CA 90115, USA Email: accounting@stevens.usc.edu
+#
+# The full terms of this copyright and license should always be found in the root directory of this software deliverable as "license.txt" and if these terms are not found with this software, please contact the USC Stevens Center for the full license.
+#
+import csv
+import os
+
+from mentor_classifier.tools.w2v import compare_accuracy, save_checkpoint_stem_tables
+from mentor_classifier.w2v import (
+    W2V,
+    _array_precision,
+    save_stem_table,
+    stem_table_path,
+    stem_table_precision_path,
+)
+from .helpers import FakeClassifier, FakeKeyedVectors
+
+TEST_DATA = [
+    ["ID", "text", "Who are you?", "What do you do?"],
+    ["a1", "I'm a mentor.", "i", ""],
+    ["a2", "I sail ships.", "", "i"],
+]
+
+
+class _FakeFactory:
+    def __init__(self):
+        self.created = []
+
+    def create(self, mentor, w2v_precision=None, **kwargs):
+        self.created.append((mentor, w2v_precision))
+        if w2v_precision == "int8":
+            answers = {
+                "who are you": "I sail ships.",
+                "what do you do": "I sail ships.",
+            }
+        else:
+            answers = {
+                "who are you": "I'm a mentor.",
+                "what do you do": "I sail ships.",
+            }
+        return FakeClassifier(
+            answers={q: (a, a) for q, a in answers.items()}, mentor_id=mentor
+        )
+
+
+def test_compare_accuracy_tests_each_precision_against_float32(tmpdir, monkeypatch):
+    for mentor in ("clint", "dan"):
+        path = tmpdir.join("checkpoint", "tests", mentor, "test_set.csv")
+        os.makedirs(os.path.dirname(str(path)))
+        with open(str(path), "w", newline="") as f:
+            csv.writer(f).writerows(TEST_DATA)
+    monkeypatch.chdir(str(tmpdir))
+    factory = _FakeFactory()
+    report = compare_accuracy(
+        factory, ["clint", "dan"], "test_set.csv", ["float16", "int8"]
+    )
+    assert sorted(factory.created) == [
+        (m, p) for m in ("clint", "dan") for p in ("float16", "float32", "int8")
+    ]
+    assert report["mentors"]["clint"] == dict(float32=1.0, float16=1.0, int8=0.5)
+    assert report["precisions"] == dict(
+        float32=dict(accuracy=1.0, accuracy_delta=0.0),
+        float16=dict(accuracy=1.0, accuracy_delta=0.0),
+        int8=dict(accuracy=0.5, accuracy_delta=-0.5),
+    )
+
+
+def test_save_checkpoint_stem_tables_converts_the_stem_table_to_each_precision(tmpdir):
+    checkpoint = str(tmpdir.join("checkpoint"))
+    assert save_checkpoint_stem_tables(checkpoint, ["int8"]) == []
+    table_path = stem_table_path(checkpoint)
+    save_stem_table(W2V("fake.bin", w2v_model=FakeKeyedVectors(["cat"])), table_path)
+    assert save_checkpoint_stem_tables(checkpoint, ["float16", "int8"]) == [
+        stem_table_precision_path(table_path, p) for p in ("float16", "int8")
+    ]
+    assert _array_precision(stem_table_precision_path(table_path, "int8")) == "int8"
+    assert os.listdir(checkpoint) == ["w2v_stems"]
@@ -0,0 +1,259 @@
+#
+# This software is Copyright ©️ 2020 The University of Southern California. All Rights Reserved.
+# Permission to use, copy, modify, and distribute this software and its documentation for educational, research and non-profit purposes, without fee, and without a written agreement is hereby granted, provided that the above copyright notice and subject to the full license file found in the root of this software deliverable. Permission to make commercial use of this software may be obtained by contacting:  USC Stevens Center for Innovation University of Southern California 1150 S. Olive Street, Suite 2300, Los Angeles, CA 90115, USA Email: accounting@stevens.usc.edu
+#
+# The full terms of this copyright and license should always be found in the root directory of this software deliverable as "license.txt" and if these terms are not found with this software, please contact the USC Stevens Center for the full license.
+#
+import os
+
+import numpy as np
+import pytest
+
+from mentor_classifier.nltk_preprocessor import NLTKPreprocessor
+from mentor_classifier import w2v as w2v_module
+from mentor_classifier.w2v import (
+    W2V,
+    W2V_ROOT_DEFAULT,
+    _ArrayVectors,
+    _array_precision,
+    find_stem_table,
+    find_w2v,
+    quantize_vectors,
+    save_quantized_w2v,
+    save_stem_table,
+    save_stem_table_precision,
+    stem_table_precision_path,
+)
+from .helpers import FakeKeyedVectors
+
+
+def test_stem_table_gives_same_vectors_as_full_model(tmpdir):
+    full = W2V(
+        "fake.bin",
+        w2v_model=FakeKeyedVectors(
+            ["run", "running", "Runs", "happy", "happi", "New_York", "cats", "cat"]
+        ),
+    )
+    table_path = str(tmpdir.join("w2v_stems"))
+    save_stem_table(full, table_path)
+    stems = find_stem_table(table_path)
+    assert stems.get_w2v_file_name() == "fake.bin"
+    assert sorted(stems.get_words()) == [
+        "cat",
+        "cats",
+        "happi",
+        "happy",
+        "run",
+        "running",
+    ]
+    question = NLTKPreprocessor().transform("Running, happy cats in New York?")
+    expected_vector, expected_lstm_vector = full.w2v_for_question(question)
+    actual_vector, actual_lstm_vector = stems.w2v_for_question(question)
+    np.testing.assert_array_equal(actual_vector, expected_vector)
+    np.testing.assert_array_equal(actual_lstm_vector, expected_lstm_vector)
+
+
+def test_stem_table_keeps_keys_that_stem_to_something_else(tmpdir):
+    # Porter stemming isn't idempotent: 'recurses' -> 'recurs' but 'recurs' -> 'recur'
+    full = W2V("fake.bin", w2v_model=FakeKeyedVectors(["recurs", "compos", "run"]))
+    table_path = str(tmpdir.join("w2v_stems"))
+    save_stem_table(full, table_path)
+    stems = find_stem_table(table_path)
+    question = NLTKPreprocessor().transform("it recurses while composing")
+    assert question == ["it", "recurs", "while", "compos"]
+    np.testing.assert_array_equal(
+        stems.w2v_for_question(question)[0], full.w2v_for_question(question)[0]
+    )
+
+
+def test_stem_table_is_rebuilt_when_the_binary_changes(tmpdir):
+    bin_path = tmpdir.join("fake.bin")
+    bin_path.write("v1")
+    table_path = str(tmpdir.join("w2v_stems"))
+    first = W2V("fake.bin", str(tmpdir), w2v_model=FakeKeyedVectors(["cat"]))
+    save_stem_table(first, table_path)
+    loaded = _ArrayVectors(table_path)
+    bin_path.write("version 2")
+    second = W2V("fake.bin", str(tmpdir), w2v_model=FakeKeyedVectors(["cat"]))
+    save_stem_table(second, table_path)
+    np.testing.assert_array_equal(
+        _ArrayVectors(table_path)["cat"], second.get_vector("cat")
+    )
+    # the old table was moved aside, not rewritten under a process that mapped it
+    np.testing.assert_array_equal(loaded["cat"], first.get_vector("cat"))
+    assert sorted(os.listdir(str(tmpdir))) == ["fake.bin", "w2v_stems"]
+
+
+def test_a_stem_table_saved_by_another_process_first_wins(tmpdir, monkeypatch):
+    table_path = str(tmpdir.join("w2v_stems"))
+    other = W2V("fake.bin", w2v_model=FakeKeyedVectors(["cat"]))
+    rename = os.rename
+
+    def rename_after_another_process(src, dst):
+        if dst == table_path and not os.path.exists(table_path):
+            monkeypatch.setattr(w2v_module.os, "rename", rename)
+            save_stem_table(other, table_path)
+        rename(src, dst)
+
+    monkeypatch.setattr(w2v_module.os, "rename", rename_after_another_process)
+    save_stem_table(W2V("fake.bin", w2v_model=FakeKeyedVectors(["cat"])), table_path)
+    np.testing.assert_array_equal(
+        _ArrayVectors(table_path)["cat"], other.get_vector("cat")
+    )
+    assert os.listdir(str(tmpdir)) == ["w2v_stems"]
+
+
+def test_quantize_vectors_scales_int8_per_row():
+    vectors = np.array([[0.5, -1.0, 0.25], [0.0, 0.0, 0.0], [100.0, 50.0, -25.0]])
+    quantized, scales = quantize_vectors(vectors, "int8")
+    assert quantized.dtype == np.int8
+    assert quantized.tolist() == [[64, -127, 32], [0, 0, 0], [127, 64, -32]]
+    np.testing.assert_allclose(
+        quantized * scales[:, np.newaxis], vectors, atol=np.max(scales) / 2
+    )
+    quantized, scales = quantize_vectors(vectors, "float16")
+    assert quantized.dtype == np.float16
+    assert scales is None
+
+
+@pytest.mark.parametrize("precision,max_bytes", [("float16", 2), ("int8", 1)])
+def test_quantized_vectors_are_close_to_full_model(tmpdir, precision, max_bytes):
+    words = ["run", "happi", "cat", "dog"]
+    full = W2V("fake.bin", w2v_model=FakeKeyedVectors(words))
+    path = save_quantized_w2v(full, precision, str(tmpdir.join(precision)))
+    quantized = W2V("fake.bin", w2v_model=_ArrayVectors(path))
+    assert quantized.get_precision() == precision
+    assert quantized.get_version() == "fake.bin:_ArrayVectors:" + precision
+    assert (
+        os.path.getsize(os.path.join(path, "vectors.npy"))
+        < 128 + len(words) * 300 * max_bytes + 1
+    )
+    expected_vector, expected_lstm_vector = full.w2v_for_question(["cat", "x", "run"])
+    actual_vector, actual_lstm_vector = quantized.w2v_for_question(["cat", "x", "run"])
+    assert actual_vector.dtype == np.float32
+    np.testing.assert_allclose(actual_vector, expected_vector, atol=0.02)
+    np.testing.assert_allclose(actual_lstm_vector, expected_lstm_vector, atol=0.01)
+    # a stem table saved from quantized vectors keeps them exactly
+    table_path = str(tmpdir.join(f"w2v_stems_{precision}"))
+    save_stem_table(quantized, table_path)
+    stems = find_stem_table(table_path)
+    assert stems.get_precision() == precision
+    np.testing.assert_array_equal(
+        stems.w2v_for_question(["cat"])[0], quantized.w2v_for_question(["cat"])[0]
+    )
+    # or converts them inside the table's dir when asked for another precision
+    save_stem_table_precision(table_path, "float32")
+    assert find_stem_table(table_path, precision="float32").get_precision() == "float32"
+    assert _array_precision(stem_table_precision_path(table_path, "float32")) == (
+        "float32"
+    )
+
+
+def test_stem_tables_are_converted_to_other_precisions_on_disk(tmpdir):
+    full = W2V("fake.bin", w2v_model=FakeKeyedVectors(["run", "cat", "dog"]))
+    table_path = str(tmpdir.join("w2v_stems"))
+    save_stem_table(full, table_path)
+    int8_path = save_stem_table_precision(table_path, "int8")
+    assert int8_path == stem_table_precision_path(table_path, "int8")
+    assert os.path.dirname(int8_path) == table_path
+    assert _array_precision(int8_path) == "int8"
+    stems = find_stem_table(table_path, precision="int8")
+    assert stems.get_precision() == "int8"
+    # the same vectors as quantizing the full model
+    quantized = W2V(
+        "fake.bin",
+        w2v_model=_ArrayVectors(
+            save_quantized_w2v(full, "int8", str(tmpdir.join("full.int8")))
+        ),
+    )
+    np.testing.assert_array_equal(stems.get_vector("cat"), quantized.get_vector("cat"))
+    # converted once per version of the table
+    modified = os.path.getmtime(os.path.join(int8_path, "vectors.npy"))
+    assert save_stem_table_precision(table_path, "int8") == int8_path
+    assert os.path.getmtime(os.path.join(int8_path, "vectors.npy")) == modified
+    assert save_stem_table_precision(table_path, "float32") == table_path
+
+
+def test_serving_a_stem_table_at_another_precision_writes_nothing(tmpdir):
+    checkpoint = str(tmpdir.join("checkpoint"))
+    table_path = os.path.join(checkpoint, "w2v_stems")
+    save_stem_table(
+        W2V("fake.bin", w2v_model=FakeKeyedVectors(["run", "cat", "dog"])), table_path
+    )
+    before = sorted(os.listdir(checkpoint)), sorted(os.listdir(table_path))
+    stems = find_stem_table(table_path, precision="float16")
+    assert stems.get_precision() == "float16"
+    assert (sorted(os.listdir(checkpoint)), sorted(os.listdir(table_path))) == before
+
+
+def test_w2v_loads_quantized_vectors_saved_from_the_binary(tmpdir, monkeypatch):
+    w2v_root = str(tmpdir)
+    binary_path = os.path.join(w2v_root, "fake.bin")
+    with open(binary_path, "wb") as f:
+        f.write(b"fake")
+    keyed_vectors = FakeKeyedVectors(["run", "cat"])
+    loaded = []
+
+    def load_w2v_model(w2v_path, mmap):
+        loaded.append(w2v_path)
+        return keyed_vectors
+
+    monkeypatch.setattr(w2v_module, "_load_w2v_model", load_w2v_model)
+    w2v = W2V("fake.bin", w2v_root=w2v_root, precision="float16")
+    assert w2v.get_precision() == "float16"
+    assert loaded == [binary_path]
+    np.testing.assert_allclose(w2v.get_vector("cat"), keyed_vectors["cat"], atol=0.001)
+    # the saved vectors are reused until the binary changes
+    W2V("fake.bin", w2v_root=w2v_root, precision="float16")
+    assert loaded == [binary_path]
+    st = os.stat(binary_path)
+    os.utime(binary_path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 10))
+    W2V("fake.bin", w2v_root=w2v_root, precision="float16")
+    assert loaded == [binary_path, binary_path]
+
+
+def test_w2v_root_defaults_to_env_then_checkpoint(tmpdir, monkeypatch):
+    monkeypatch.delenv("W2V_ROOT", raising=False)
+    assert W2V("fake.bin", w2v_model=object()).get_w2v_path() == os.path.join(
+        W2V_ROOT_DEFAULT, "fake.bin"
+    )
+    monkeypatch.setenv("W2V_ROOT", str(tmpdir))
+    assert W2V("fake.bin", w2v_model=object()).get_w2v_path() == str(
+        tmpdir.join("fake.bin")
+    )
+    assert W2V(
+        "fake.bin", w2v_root="/other", w2v_model=object()
+    ).get_w2v_path() == os.path.join("/other", "fake.bin")
+
+
+def test_find_w2v_shares_one_memory_mapped_model(tmpdir, monkeypatch):
+    pytest.importorskip("gensim")
+    from mentor_classifier.tools.benchmark import generate_w2v
+
+    w2v_root = str(tmpdir.join("vector_models"))
+    binary_path = os.path.join(w2v_root, "fake.bin")
+    words = generate_w2v(binary_path, n_words=50)
+    conversions = []
+    convert_to_native = w2v_module._convert_to_native
+
+    def counting_convert_to_native(w2v_path, native_path):
+        conversions.append(w2v_path)
+        convert_to_native(w2v_path, native_path)
+
+    monkeypatch.setattr(w2v_module, "_convert_to_native", counting_convert_to_native)
+    w2v = find_w2v("fake.bin", w2v_root=w2v_root, precision="float32")
+    assert conversions == [binary_path]
+    assert os.path.exists(binary_path + ".kv")
+    assert find_w2v("fake.bin", w2v_root=w2v_root, precision="float32") is w2v
+    monkeypatch.setenv("W2V_ROOT", w2v_root)
+    assert find_w2v("fake.bin", precision="float32") is w2v
+    # the native model is reused by other processes (here a new W2V) until the binary changes
+    reloaded = W2V("fake.bin", w2v_root=w2v_root, precision="float32")
+    assert conversions == [binary_path]
+    np.testing.assert_array_equal(
+        reloaded.get_vector(words[0]), w2v.get_vector(words[0])
+    )
+    st = os.stat(binary_path)
+    os.utime(binary_path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 10))
+    W2V("fake.bin", w2v_root=w2v_root, precision="float32")
+    assert conversions == [binary_path, binary_path]